@@ -0,0 +1,50 @@
+"""
+Builds the default DATABASES entry from the environment.
+
+DB_ENGINE selects a profile:
+
+  sqlite (default)  SQLITE_PATH (db.sqlite3 in the project), SQLITE_TIMEOUT:
+                    seconds a writer waits for the lock (default 20). Uses
+                    the tuned backend in expenses.backends.sqlite3.
+  postgresql        DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT. Set
+                    DB_POOLER=pgbouncer behind a transaction-pooling
+                    PgBouncer, which cannot keep server-side cursors open.
+
+Both keep connections open for DB_CONN_MAX_AGE seconds (default 60; 0
+closes them after every request) and check a reused connection is still
+alive before handing it to a request.
+"""
+
+DEFAULT_CONN_MAX_AGE = 60
+DEFAULT_SQLITE_TIMEOUT = 20
+
+
+def database_config(environ, base_dir):
+    engine = environ.get('DB_ENGINE', 'sqlite').lower()
+    common = {
+        'CONN_MAX_AGE': int(environ.get('DB_CONN_MAX_AGE', DEFAULT_CONN_MAX_AGE)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if engine in ('postgres', 'postgresql'):
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': environ.get('DB_NAME', 'expenses'),
+            'USER': environ.get('DB_USER', ''),
+            'PASSWORD': environ.get('DB_PASSWORD', ''),
+            'HOST': environ.get('DB_HOST', ''),
+            'PORT': environ.get('DB_PORT', ''),
+            'OPTIONS': {'connect_timeout': 5},
+            'DISABLE_SERVER_SIDE_CURSORS': environ.get('DB_POOLER', '').lower() == 'pgbouncer',
+            **common,
+        }
+    if engine != 'sqlite':
+        raise ValueError(f"Unknown DB_ENGINE '{engine}': use 'sqlite' or 'postgresql'.")
+    return {
+        'ENGINE': 'expenses.backends.sqlite3',
+        'NAME': environ.get('SQLITE_PATH', base_dir / 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': float(environ.get('SQLITE_TIMEOUT', DEFAULT_SQLITE_TIMEOUT)),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        **common,
+    }
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -30,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'expenses.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,12 +65,10 @@ WSGI_APPLICATION = 'django_expense_tracker.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# SQLite (WAL, busy timeout) unless DB_ENGINE=postgresql; see database.py for the variables
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ, BASE_DIR),
 }
 
 
@@ -124,4 +125,24 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get('EMAIL_USER')  # Securely read from environment variable
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASS') # Securely read from environment variable
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Expenses app
+EXPENSES_PAGE_SIZE = 25  # rows per dashboard page / "load more" request
+# Cache holding computed report pages and each user's category list. Both are
+# invalidated by writing to the cache, so with more than one server process it
+# must be a shared backend (Redis, Memcached, database); the local-memory
+# default only suits a single process.
+EXPENSES_CACHE_ALIAS = 'default'
+EXPENSES_REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Per-request query/timing instrumentation (see expenses/instrumentation.py).
+# Off by default: raise SAMPLE_RATE to instrument a fraction of requests, e.g.
+# 0.05 for one in twenty. SERVER_TIMING adds the timings to the responses of
+# sampled requests; it shows query counts to clients, so enable it knowingly.
+EXPENSES_INSTRUMENTATION = {
+    'SAMPLE_RATE': 0.0,
+    'DUPLICATE_THRESHOLD': 3,
+    'SERVER_TIMING': False,
+    'LOG': True,
+}
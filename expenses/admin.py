@@ -1,17 +1,134 @@
+from django import forms
 from django.contrib import admin
-from .models import Category, Expense
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+from . import columnar, exports, search
+from .models import Category, Expense, RecurringExpense
+from .pagination import EstimatedCountPaginator
 
 # Register your models here.
 
+# The expense table grows to millions of rows, so its admin pages avoid what
+# scales with it: related objects are joined rather than fetched per row,
+# user and category filters search instead of listing every choice, the
+# changelist count stops at a limit (see pagination.EstimatedCountPaginator)
+# and the date hierarchy is built from index seeks (see
+# templatetags/expenses_admin.py).
+
+ADMIN_CSV_HEADER = ['Date', 'User', 'Description', 'Category', 'Amount']
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    A list filter for a foreign key that searches the related model's admin,
+    like autocomplete_fields, instead of listing every related object.
+    """
+    template = 'admin/expenses/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.attname}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.admin_site = model_admin.admin_site
+        self.widget_id = f'autocomplete-filter-{field_path}'
+
+    def rendered_widget(self):
+        # Only the chosen object, if any, is read to render the widget
+        choice = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(), required=False,
+            widget=AutocompleteSelect(self.field, self.admin_site, attrs={'id': self.widget_id, 'style': 'width: 100%'}),
+        )
+        return choice.widget.render(self.lookup_kwarg, self.lookup_val)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+
+
+class AutocompleteFilterMedia:
+    """Adds the autocomplete widget's scripts and styles to a changelist using AutocompleteFilter."""
+
+    @property
+    def media(self):
+        field = self.model._meta.get_field('user')
+        return super().media + AutocompleteSelect(field, self.admin_site).media
+
+
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(AutocompleteFilterMedia, admin.ModelAdmin):
     list_display=('name','user')
-    list_filter=('user',)
+    list_filter=(('user', AutocompleteFilter),)
+    list_select_related = ('user',)
     search_fields=('name',)
+    autocomplete_fields = ('user',)
+
+    def get_queryset(self, request):
+        # __str__ shows the owner, also in other admins' category autocompletes
+        return super().get_queryset(request).select_related('user')
+
 
 @admin.register(Expense)
-class ExpenseAdmin(admin.ModelAdmin):
-    list_display = ('amount','category','user','date')
-    list_filter = ('user','category','date')
+class ExpenseAdmin(AutocompleteFilterMedia, admin.ModelAdmin):
+    list_display = ('amount','category_name','user','date')
+    list_filter = (('user', AutocompleteFilter), ('category', AutocompleteFilter), 'date')
+    list_select_related = ('user', 'category')
     search_fields = ("description", 'category__name')
-    date_hierarchy = 'date'
\ No newline at end of file
+    date_hierarchy = 'date'
+    autocomplete_fields = ('user', 'category')
+    raw_id_fields = ('recurring',)
+    paginator = EstimatedCountPaginator
+    # The "N of M selected" total would be another COUNT(*) over the whole table
+    show_full_result_count = False
+    actions = ['export_csv', 'export_parquet']
+
+    @admin.display(description='category', ordering='category__name')
+    def category_name(self, expense):
+        return expense.category.name
+
+    def get_search_results(self, request, queryset, search_term):
+        # Descriptions are matched through the full-text index instead of a LIKE scan
+        if not search_term:
+            return queryset, False
+        by_category = queryset.filter(category__name__icontains=search_term)
+        return search.filter_matches(queryset, search_term) | by_category, False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if not columnar.pyarrow_available():
+            actions.pop('export_parquet', None)
+        return actions
+
+    @admin.action(description='Export selected expenses as CSV')
+    def export_csv(self, request, queryset):
+        rows = (
+            queryset.order_by('date', 'id')
+            .values_list('date', 'user__username', 'description', 'category__name', 'amount')
+            .iterator(chunk_size=exports.EXPORT_CHUNK_SIZE)
+        )
+        response = StreamingHttpResponse(exports.stream_csv(rows, header=ADMIN_CSV_HEADER), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="expenses.csv"'
+        return response
+
+    @admin.action(description='Export selected expenses as Parquet')
+    def export_parquet(self, request, queryset):
+        options = columnar.FORMATS[columnar.PARQUET]
+        response = StreamingHttpResponse(columnar.stream(queryset, columnar.PARQUET), content_type=options['content_type'])
+        response['Content-Disposition'] = f'attachment; filename="expenses.{options["extension"]}"'
+        return response
+
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ('amount', 'category', 'user', 'unit', 'interval', 'cron', 'next_date', 'is_active')
+    list_filter = ('is_active', 'unit')
+    list_select_related = ('user', 'category__user')
+    search_fields = ('description', 'category__name')
+    readonly_fields = ('next_date',)
+    autocomplete_fields = ('user', 'category')
@@ -0,0 +1,249 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Func, IntegerField
+from django.utils import timezone
+
+from . import categories, reportcache
+from .models import Expense, MonthlyCategoryTotal
+from .periods import period_filter
+
+# Spending insights: unusually large expenses and an end-of-month forecast
+# per category. A user's whole history is loaded as (date, category_id,
+# amount) NumPy columns with one query, and fit() derives per-category
+# parameters with vectorised code. The parameters are cached until the
+# user's history before the current month changes, so the report page
+# normally only pays for applying them to one month.
+#
+# NumPy is optional; without it insights() returns None and the report page
+# leaves the section out.
+
+ROLLING_WINDOW = 3  # months
+Z_THRESHOLD = 3.0
+MAX_ANOMALIES = 10
+
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class EpochDays(Func):
+    """A date as whole days since 1970-01-01, so rows skip the driver's date conversion."""
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="(%(expressions)s - DATE '1970-01-01')")
+
+    def as_sql(self, compiler, connection, template=None, **extra_context):
+        # Other backends return the date itself; _to_dates() handles both
+        return super().as_sql(compiler, connection, template=template or '%(expressions)s', **extra_context)
+
+
+def _to_dates(values):
+    import numpy as np
+
+    if values and not isinstance(values[0], int):
+        epoch = date(1970, 1, 1).toordinal()
+        values = [value.toordinal() - epoch for value in values]
+    return np.array(values, dtype=np.int64).astype('datetime64[D]')
+
+
+def load_history(user, before=None):
+    """
+    Returns (dates, category_ids, amounts) arrays for a user's expenses
+    before a date. Rows are read straight from the cursor, with dates as
+    numbers: converting a million rows to date and Decimal objects would take
+    far longer than the query.
+    """
+    import numpy as np
+
+    queryset = Expense.objects.filter(user=user)
+    if before:
+        queryset = queryset.filter(date__lt=before)
+    queryset = queryset.order_by().annotate(day=EpochDays('date')).values_list('category_id', 'amount', 'day')
+    # The compiled SQL lists annotations last, so 'day' goes last to match
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return (
+        _to_dates([row[2] for row in rows]),
+        np.array([row[0] for row in rows], dtype=np.int64),
+        np.array([row[1] for row in rows], dtype=np.float64),
+    )
+
+
+def fit(dates, category_ids, amounts, window=ROLLING_WINDOW):
+    """
+    Fits per-category parameters from history columns. Returns a dict of
+    arrays aligned with params['category_ids']:
+      log_mean, log_std  distribution of single expense amounts (log scale)
+      level, spread      rolling mean / std of the deseasonalised monthly
+                         totals over the last `window` months
+      seasonal           (categories x 12) index of each calendar month
+      profile            (categories x 31) share of a month's spend usually
+                         done by the end of each day
+    """
+    import numpy as np
+
+    categories, index = np.unique(category_ids, return_inverse=True)
+    count = len(categories)
+    if not count:
+        return {'category_ids': categories}
+
+    # Single expenses: spending is right-skewed, so work on the log scale
+    logs = np.log(np.maximum(amounts, 0.01))
+    n = np.bincount(index, minlength=count)
+    log_mean = np.bincount(index, logs, count) / n
+    log_std = np.sqrt(np.maximum(np.bincount(index, logs * logs, count) / n - log_mean ** 2, 0))
+
+    # Dense (categories x months) matrix of monthly totals, empty months being zero
+    month_starts = dates.astype('datetime64[M]')
+    months = month_starts.astype(np.int64)
+    first = months.min()
+    span = int(months.max() - first + 1)
+    totals = np.bincount(index * span + (months - first), amounts, count * span).reshape(count, span)
+
+    # Seasonal index per calendar month, once there are two years to compare
+    calendar = (first + np.arange(span)) % 12
+    seasonal = np.ones((count, 12))
+    if span >= 24:
+        onehot = np.eye(12)[calendar]
+        by_month = totals @ onehot / onehot.sum(axis=0)
+        overall = totals.mean(axis=1, keepdims=True)
+        seasonal = np.divide(by_month, overall, out=seasonal, where=overall > 0)
+
+    # Rolling statistics of the deseasonalised series via cumulative sums
+    adjusted = totals / np.where(seasonal[:, calendar] > 0, seasonal[:, calendar], 1)
+    window = min(window, span)
+    padded = np.pad(adjusted, ((0, 0), (1, 0)))
+    sums = np.cumsum(padded, axis=1)
+    squares = np.cumsum(padded ** 2, axis=1)
+    rolling_mean = (sums[:, window:] - sums[:, :-window]) / window
+    rolling_var = (squares[:, window:] - squares[:, :-window]) / window - rolling_mean ** 2
+
+    # Cumulative share of the month's spend by day of month
+    days = (dates - month_starts.astype('datetime64[D]')).astype(np.int64)
+    daily = np.bincount(index * 31 + days, amounts, count * 31).reshape(count, 31)
+    spent = daily.sum(axis=1, keepdims=True)
+    profile = np.divide(np.cumsum(daily, axis=1), spent, out=np.ones_like(daily), where=spent > 0)
+
+    return {
+        'category_ids': categories,
+        'count': n,
+        'log_mean': log_mean,
+        'log_std': log_std,
+        'level': rolling_mean[:, -1],
+        'spread': np.sqrt(np.maximum(rolling_var[:, -1], 0)),
+        'seasonal': seasonal,
+        'profile': profile,
+    }
+
+
+def get_params(user, today=None):
+    """
+    Returns fitted parameters for the history before the current month. They
+    are cached per history version, so this month's expenses, which the fit
+    leaves out, can change without a refit.
+    """
+    today = today or timezone.now().date()
+    month = date(today.year, today.month, 1)
+    cache = reportcache.get_cache()
+    key = f'expenses:analytics:{user.id}:{month:%Y-%m}'
+    version = reportcache.history_version(user.id)
+    params = cache.get(key, version=version)
+    if params is None:
+        params = fit(*load_history(user, before=month))
+        cache.set(key, params, timeout=reportcache.get_timeout(), version=version)
+    return params
+
+
+def find_anomalies(params, category_ids, amounts, threshold=Z_THRESHOLD):
+    """
+    Returns [(position, z_score, typical_amount)] for the amounts far above
+    their category's usual one, highest z-score first.
+    """
+    import numpy as np
+
+    fitted = params['category_ids']
+    if not len(amounts) or not len(fitted):
+        return []
+    category_ids = np.asarray(category_ids, dtype=np.int64)
+    position = np.minimum(np.searchsorted(fitted, category_ids), len(fitted) - 1)
+    # Categories without enough history are never flagged
+    known = (fitted[position] == category_ids) & (params['count'][position] >= 5)
+    std = params['log_std'][position]
+    logs = np.log(np.maximum(np.asarray(amounts, dtype=np.float64), 0.01))
+    z = np.divide(logs - params['log_mean'][position], std, out=np.zeros(len(logs)), where=known & (std > 0))
+    typical = np.exp(params['log_mean'][position])
+    flagged = np.flatnonzero(z >= threshold)
+    flagged = flagged[np.argsort(-z[flagged], kind='stable')][:MAX_ANOMALIES]
+    return [(int(i), round(float(z[i]), 1), Decimal(f'{typical[i]:.2f}')) for i in flagged]
+
+
+def forecast_month(params, spent, today, names):
+    """
+    Forecasts this month's total per category as what has been spent so far
+    plus the seasonal expectation for the part of the month still to come.
+    `spent` maps category ids to this month's spend so far, `names` to their names.
+    """
+    import numpy as np
+
+    results = []
+    calendar = today.month - 1
+    for i, category_id in enumerate(params['category_ids'].tolist()):
+        expected = params['level'][i] * params['seasonal'][i, calendar]
+        remaining = expected * (1 - params['profile'][i, today.day - 1])
+        so_far = float(spent.get(category_id, 0))
+        results.append({
+            'category': names.get(category_id, '?'),
+            'spent': so_far,
+            'forecast': so_far + float(np.maximum(remaining, 0)),
+            'typical': float(expected),
+            'spread': float(params['spread'][i]),
+        })
+    known = set(params['category_ids'].tolist())
+    for category_id, amount in spent.items():
+        if category_id not in known:
+            # No history yet: assume nothing more this month
+            results.append({'category': names.get(category_id, '?'), 'spent': float(amount),
+                            'forecast': float(amount), 'typical': None, 'spread': None})
+    results = [r for r in results if r['forecast'] or r['spent']]
+    return sorted(results, key=lambda r: -r['forecast'])
+
+
+def insights(user, period, today=None):
+    """
+    Returns {'anomalies', 'forecast'} for a report period, the forecast only
+    for the current month, or None when NumPy is not installed.
+    """
+    if not numpy_available():
+        return None
+    today = today or timezone.now().date()
+    params = get_params(user, today)
+    if not len(params['category_ids']):
+        return {'anomalies': [], 'forecast': []}
+
+    # Score plain columns; only the flagged expenses are loaded as objects
+    rows = list(Expense.objects.filter(user=user, **period_filter(period)).values_list('id', 'category_id', 'amount'))
+    flagged = find_anomalies(params, [row[1] for row in rows], [row[2] for row in rows])
+    anomalies = []
+    if flagged:
+        expenses = Expense.objects.select_related('category').in_bulk([rows[i][0] for i, _, _ in flagged])
+        anomalies = [(expenses[rows[i][0]], z, typical) for i, z, typical in flagged]
+
+    forecast = []
+    if period.start <= today < period.end:
+        spent = dict(
+            MonthlyCategoryTotal.objects.filter(user=user, month=period.start).values_list('category_id', 'total')
+        )
+        forecast = forecast_month(params, spent, today, dict(categories.user_categories(user.id)))
+    return {'anomalies': anomalies, 'forecast': forecast}
@@ -0,0 +1,263 @@
+import functools
+import hashlib
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.gzip import gzip_page
+
+from . import reportcache, rollups
+from .models import MAX_ID, Expense, MonthlyCategoryTotal
+
+# Read-only JSON API (v1) over the same aggregates the report pages use.
+#
+# Every endpoint takes an optional date range: `start` and `end` (YYYY-MM-DD,
+# inclusive) or `range=all`, and `fields` (comma separated) to keep only some
+# keys of each result. Responses carry an ETag derived from the user's data
+# version, so a client polling with If-None-Match gets a 304 without any
+# aggregation being run, and are gzipped when the client accepts it.
+
+API_VERSION = 1
+MAX_DAILY_DAYS = 366
+MAX_MONTHS = 1200
+DEFAULT_TOP_LIMIT = 10
+MAX_TOP_LIMIT = 100
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(f"'{name}' must be a date in YYYY-MM-DD format.")
+
+
+def date_range(params, default_start):
+    """
+    Returns the half-open (start, end) range requested, either bound possibly
+    None. Without parameters the range runs from default_start to today.
+    """
+    if params.get('range') == 'all':
+        return None, None
+    start, last = _parse_date(params, 'start'), _parse_date(params, 'end')
+    if start is None and last is None:
+        start, last = default_start, timezone.now().date()
+    if start and last and start > last:
+        raise ApiError("'start' must not be after 'end'.")
+    try:
+        return start, last + timedelta(days=1) if last else None
+    except OverflowError:
+        raise ApiError("'end' must be before 9999-12-31.")
+
+
+def _positive_int(value, maximum):
+    """`value` as an int between 1 and `maximum`, or None if it is anything else."""
+    # Not str.isdigit(), which also accepts digits such as '²' that int() rejects
+    if not re.fullmatch(r'[0-9]{1,19}', value):
+        return None
+    number = int(value)
+    return number if 0 < number <= maximum else None
+
+
+def _category_id(params):
+    value = params.get('category')
+    if not value:
+        return None
+    category_id = _positive_int(value, MAX_ID)
+    if category_id is None:
+        raise ApiError("'category' must be a category id.")
+    return category_id
+
+
+def select_fields(results, fields, allowed):
+    """Keeps only the requested keys of each result dict."""
+    if not fields:
+        return results
+    wanted = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in wanted if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(allowed)}.")
+    return [{field: result[field] for field in wanted} for result in results]
+
+
+def _bounds(start, end):
+    return {
+        'start': start.isoformat() if start else None,
+        'end': (end - timedelta(days=1)).isoformat() if end else None,
+    }
+
+
+def _months_before(day, months):
+    """The first day of the month `months` months before the one containing `day`."""
+    index = day.year * 12 + day.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_count(start, end):
+    """The number of months from the one containing `start` up to, but excluding, the one containing `end`."""
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def _money(value):
+    # SQLite sums decimals as floats
+    return str((value or Decimal('0')).quantize(rollups.CENT))
+
+
+def api_view(fields):
+    """
+    Turns `view(request) -> (bounds dict, results list)` into a GET-only,
+    session-authenticated endpoint with conditional GET, field selection and
+    gzip. `fields` lists the keys each result has.
+    """
+    def decorator(view):
+        @gzip_page
+        @functools.wraps(view)
+        def wrapper(request):
+            if request.method not in ('GET', 'HEAD'):
+                return error_response("Method not allowed.", 405)
+            if not request.user.is_authenticated:
+                return error_response("Authentication required.", 401)
+
+            # Defaults depend on today's date, so it is part of the version too
+            etag = quote_etag(hashlib.md5(repr((
+                API_VERSION, request.user.id, reportcache.data_version(request.user.id),
+                timezone.now().date(), request.path, sorted(request.GET.lists()),
+            )).encode()).hexdigest())
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                return not_modified
+
+            try:
+                bounds, results = view(request)
+                results = select_fields(results, request.GET.get('fields'), fields)
+            except ApiError as e:
+                return error_response(str(e), e.status)
+            response = JsonResponse(
+                {**bounds, 'results': results}, json_dumps_params={'separators': (',', ':')}
+            )
+            response['ETag'] = etag
+            # Per-user data that changes at any time: keep it, but always revalidate
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+@api_view(fields=['month', 'total', 'count'])
+def monthly_totals(request):
+    """Totals per calendar month, including empty months, over at most MAX_MONTHS. Defaults to the last 12 months."""
+    today = timezone.now().date()
+    start, end = date_range(request.GET, default_start=_months_before(today, 11))
+    rows = MonthlyCategoryTotal.objects.filter(user=request.user)
+    category_id = _category_id(request.GET)
+    if category_id:
+        rows = rows.filter(category_id=category_id)
+    # Buckets are whole months, so widen the range to month boundaries
+    try:
+        if start:
+            start = rollups.month_start(start)
+        if end:
+            end = rollups.next_month(end - timedelta(days=1))
+    except ValueError:
+        raise ApiError("'end' must be before December 9999.")
+    if start:
+        rows = rows.filter(month__gte=start)
+    if end:
+        rows = rows.filter(month__lt=end)
+    totals = {
+        row['month']: row
+        for row in rows.order_by().values('month').annotate(total=Sum('total'), count=Sum('count'))
+    }
+
+    results = []
+    month = start or min(totals, default=rollups.month_start(today))
+    try:
+        last = end or rollups.next_month(max(totals, default=today))
+    except ValueError:
+        last = date.max
+    # An open bound runs to the user's first or last month, which may be far away
+    if _month_count(month, last) > MAX_MONTHS:
+        raise ApiError(f"Monthly totals cover at most {MAX_MONTHS} months; narrow 'start' and 'end'.")
+    while month < last:
+        row = totals.get(month, {})
+        results.append({'month': f'{month:%Y-%m}', 'total': _money(row.get('total')), 'count': row.get('count', 0)})
+        month = rollups.next_month(month)
+    return _bounds(start, end), results
+
+
+@api_view(fields=['category_id', 'category', 'total', 'count'])
+def category_breakdown(request):
+    """Totals per category over any date range. Defaults to the current month."""
+    start, end = date_range(request.GET, default_start=rollups.month_start(timezone.now().date()))
+    totals = rollups.category_totals(request.user, start, end, category_id=_category_id(request.GET))
+    results = [
+        {'category_id': row['category_id'], 'category': row['category__name'],
+         'total': _money(row['total']), 'count': row['count']}
+        for row in totals
+    ]
+    return _bounds(start, end), results
+
+
+@api_view(fields=['date', 'total', 'count'])
+def daily_series(request):
+    """Totals per day, including empty days, over at most MAX_DAILY_DAYS. Defaults to the current month."""
+    start, end = date_range(request.GET, default_start=rollups.month_start(timezone.now().date()))
+    if start is None or end is None or (end - start).days > MAX_DAILY_DAYS:
+        raise ApiError(f"The daily series needs a 'start' and 'end' at most {MAX_DAILY_DAYS} days apart.")
+    expenses = Expense.objects.filter(user=request.user, date__gte=start, date__lt=end)
+    category_id = _category_id(request.GET)
+    if category_id:
+        expenses = expenses.filter(category_id=category_id)
+    totals = {
+        row['date']: row
+        for row in expenses.order_by().values('date').annotate(total=Sum('amount'), count=Count('id'))
+    }
+    results = []
+    for offset in range((end - start).days):
+        day = start + timedelta(days=offset)
+        row = totals.get(day, {})
+        results.append({'date': day.isoformat(), 'total': _money(row.get('total')), 'count': row.get('count', 0)})
+    return _bounds(start, end), results
+
+
+@api_view(fields=['id', 'date', 'description', 'category', 'amount'])
+def top_expenses(request):
+    """The largest expenses in a date range (`limit`, default 10). Defaults to the current month."""
+    start, end = date_range(request.GET, default_start=rollups.month_start(timezone.now().date()))
+    limit = _positive_int(request.GET.get('limit', str(DEFAULT_TOP_LIMIT)), MAX_TOP_LIMIT)
+    if limit is None:
+        raise ApiError(f"'limit' must be between 1 and {MAX_TOP_LIMIT}.")
+    expenses = Expense.objects.filter(user=request.user)
+    if start:
+        expenses = expenses.filter(date__gte=start)
+    if end:
+        expenses = expenses.filter(date__lt=end)
+    category_id = _category_id(request.GET)
+    if category_id:
+        expenses = expenses.filter(category_id=category_id)
+    rows = expenses.order_by('-amount', '-date', '-id').values_list(
+        'id', 'date', 'description', 'category__name', 'amount'
+    )[:limit]
+    results = [
+        {'id': id, 'date': day.isoformat(), 'description': description or '', 'category': category, 'amount': str(amount)}
+        for id, day, description, category, amount in rows
+    ]
+    return _bounds(start, end), results
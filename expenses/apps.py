@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ExpensesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "expenses"
+
+    def ready(self):
+        # Keep MonthlyCategoryTotal in sync with Expense writes
+        from . import signals  # noqa: F401
+        # SQLite drops the full-text search triggers whenever a migration rebuilds the expense table
+        from .search import ensure_index
+        post_migrate.connect(ensure_index, sender=self)
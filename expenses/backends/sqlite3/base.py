@@ -0,0 +1,53 @@
+from django.db.backends.sqlite3 import base
+
+# SQLite tuned for concurrent writers. Two extra OPTIONS are accepted next to
+# the sqlite3.connect() arguments (such as `timeout`, the busy timeout):
+#
+#   pragmas           run on every new connection; by default WAL, so readers
+#                     never block the writer, with synchronous=NORMAL, which
+#                     is safe in WAL mode, and a larger page cache
+#   transaction_mode  how atomic() begins a transaction. Django's plain BEGIN
+#                     takes the write lock only at the first write, and a
+#                     transaction that read first cannot wait for it: SQLite
+#                     fails it at once with "database is locked". IMMEDIATE
+#                     takes the lock up front, where the busy timeout applies.
+#
+# Django 5.1 supports both natively (init_command / transaction_mode).
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # negative: KiB, so 20 MB
+    'temp_store': 'MEMORY',
+    'mmap_size': 128 * 1024 * 1024,
+}
+DEFAULT_TRANSACTION_MODE = 'IMMEDIATE'
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    @property
+    def pragmas(self):
+        return {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', DEFAULT_TRANSACTION_MODE).upper()
+        if mode not in TRANSACTION_MODES:
+            raise ValueError(f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}, not '{mode}'.")
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
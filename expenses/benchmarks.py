@@ -0,0 +1,451 @@
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import OperationalError, connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, columnar, exports, jobs, reportcache, rollups
+from .emails import report_message
+from .models import Category, Expense, Job
+from .periods import resolve_period
+
+# Benchmark harness used by `manage.py benchmark`. Each case is timed over a
+# number of iterations after a warm-up; results are written as JSON so runs
+# from different commits can be compared with compare_results().
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def measure(fn, iterations=20, warmup=2):
+    """Times `fn` and returns latency percentiles (ms) and the queries it runs per call."""
+    for _ in range(warmup):
+        fn()
+    with CaptureQueriesContext(connection) as queries:
+        fn()
+    # Count now: the captured slice is read lazily and later requests reset the query log
+    query_count = len(queries)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'queries': query_count,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'iterations': iterations,
+    }
+
+
+def consume(response):
+    """Reads the whole body, so streaming responses are timed end to end."""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def view_cases(client, user):
+    """
+    Returns {name: callable} for the app's GET views, using the given
+    logged-in client. Left out: authentication (it would end the session),
+    the Google Drive views (they call Google) and views that only act on POST.
+    """
+    today = timezone.now().date()
+    period = resolve_period({}, today)
+    month = {'year': period.year, 'month': period.month}
+    first_page = client.get(reverse('dashboard'))
+    cursor = first_page.context['next_cursor'] if first_page.context else None
+    expense_id = Expense.objects.filter(user=user).order_by('-date', '-id').values_list('id', flat=True).first()
+    job = Job.objects.create(kind='email_report', user=user, payload=month, status=Job.SUCCEEDED)
+    year_to_date = {'start': today.replace(month=1, day=1).isoformat(), 'end': today.isoformat()}
+
+    def get(name, params=None, args=None):
+        def call():
+            response = client.get(reverse(name, args=args), params or {})
+            assert response.status_code in (200, 302), f"{name} returned {response.status_code}"
+            return consume(response)
+        return call
+
+    def render_email():
+        summary, total = rollups.category_summary(user, period)
+        return report_message(user, period, summary, total).message().as_bytes()
+
+    cases = {
+        'dashboard': get('dashboard'),
+        'expense_rows': get('expense_rows', {'cursor': cursor}),
+        'search': get('search', {'q': 'lunch'}),
+        'edit_expense': get('edit_expense', args=[expense_id]),
+        'budgets': get('budgets'),
+        'categories': get('categories'),
+        'report': get('report', month),
+        'trends': get('trends'),
+        'export_csv_month': get('export_csv', month),
+        'export_csv_all': get('export_csv', {'range': 'all'}),
+        'import_form': get('import_expenses'),
+        'email_report_enqueue': get('email_report', month),
+        'email_render': render_email,
+        'job_status': get('job_status', args=[job.id]),
+        'api_monthly_totals': get('api_monthly_totals'),
+        'api_category_breakdown': get('api_category_breakdown', year_to_date),
+        'api_daily_series': get('api_daily_series'),
+        'api_top_expenses': get('api_top_expenses', year_to_date),
+    }
+    if columnar.pyarrow_available():
+        cases['export_parquet_all'] = get('export_columnar', {'range': 'all'}, args=[columnar.PARQUET])
+    return cases
+
+
+def run_view_benchmarks(user, iterations=20, warmup=2, only=None):
+    client = Client()
+    client.force_login(user)
+    results = {}
+    for name, fn in view_cases(client, user).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(fn, iterations=iterations, warmup=warmup)
+    return results
+
+
+def synthetic_history(rows, categories=8, days=3650, seed=0):
+    """(dates, category_ids, amounts) arrays shaped like a real history, for timing analytics.fit()."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(timezone.now().date(), 'D')
+    dates = today - rng.integers(1, days, rows).astype('timedelta64[D]')
+    category_ids = rng.integers(1, categories + 1, rows)
+    amounts = np.round(rng.lognormal(5.5, 0.9, rows), 2)
+    return dates, category_ids, amounts
+
+
+def run_analytics_benchmarks(rows=1_000_000, iterations=5, warmup=1, seed=0, user=None):
+    """
+    Times analytics.fit() on `rows` synthetic expenses and, given a user with
+    stored expenses, the one-query history load and the report insights with
+    a cold (refit) and warm (cached) parameter cache.
+    """
+    history = synthetic_history(rows, seed=seed)
+    results = {'fit': measure(lambda: analytics.fit(*history), iterations=iterations, warmup=warmup)}
+    if user is not None:
+        period = resolve_period({}, timezone.now().date())
+
+        def cold():
+            reportcache.invalidate(user.id)
+            return analytics.insights(user, period)
+
+        results['load_history'] = measure(lambda: analytics.load_history(user), iterations=iterations, warmup=warmup)
+        results['insights_cold'] = measure(cold, iterations=iterations, warmup=warmup)
+        results['insights_warm'] = measure(
+            lambda: analytics.insights(user, period), iterations=iterations, warmup=warmup
+        )
+    return results
+
+
+class SlowEmailBackend(BaseEmailBackend):
+    """Discards messages after a delay per message, standing in for a distant SMTP server."""
+    latency = 0.05
+
+    def send_messages(self, email_messages):
+        time.sleep(self.latency * len(email_messages))
+        return len(email_messages)
+
+
+def throughput(samples, wall, concurrency):
+    """Summarises per-request latencies (ms) and the wall time (s) of a concurrent run."""
+    return {
+        'requests': len(samples),
+        'concurrency': concurrency,
+        'wall_ms': round(wall * 1000, 3),
+        'per_second': round(len(samples) / wall, 1),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+    }
+
+
+def _wsgi_load(session_key, path, requests, concurrency):
+    # One client per thread, as a threaded WSGI server would serve them
+    local = threading.local()
+
+    def call(_):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+            local.client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        started = time.perf_counter()
+        consume(local.client.get(path))
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = list(pool.map(call, range(requests)))
+    return throughput(samples, time.perf_counter() - started, concurrency)
+
+
+async def _asgi_load(session_key, path, requests, concurrency):
+    client = AsyncClient()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call():
+        # Like the ASGI handler, give each request its own thread for sync code
+        async with semaphore, ThreadSensitiveContext():
+            started = time.perf_counter()
+            response = await client.get(path)
+            if response.streaming and response.is_async:
+                async for _ in response.streaming_content:
+                    pass
+            else:
+                consume(response)
+            return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*(call() for _ in range(requests)))
+    return throughput(samples, time.perf_counter() - started, concurrency)
+
+
+def _queue_report_emails(user, count, period):
+    Job.objects.bulk_create([
+        Job(kind='email_report', user=user, payload={'year': period.year, 'month': period.month}, max_attempts=1)
+        for _ in range(count)
+    ])
+
+
+def run_concurrency_benchmarks(user, requests=100, concurrency=10, latency=0.05):
+    """
+    Serves `requests` report / CSV export requests `concurrency` at a time
+    through the WSGI path (a thread per request) and the ASGI path (one event
+    loop), then delivers as many report emails through a backend that takes
+    `latency` seconds per message, with the sync worker and the async one.
+    """
+    client = Client()
+    client.force_login(user)
+    session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+    period = resolve_period({}, timezone.now().date())
+    month = f'?year={period.year}&month={period.month}'
+    results = {}
+    for name, path in [('report', reverse('report') + month), ('export_csv', reverse('export_csv') + month)]:
+        consume(client.get(path))
+        results[f'{name}_wsgi'] = _wsgi_load(session_key, path, requests, concurrency)
+        results[f'{name}_asgi'] = asyncio.run(_asgi_load(session_key, path, requests, concurrency))
+
+    SlowEmailBackend.latency = latency
+    with override_settings(EMAIL_BACKEND='expenses.benchmarks.SlowEmailBackend'):
+        _queue_report_emails(user, requests, period)
+        started = time.perf_counter()
+        jobs.run_pending()
+        results['email_jobs_sync'] = {'requests': requests, 'concurrency': 1,
+                                      'wall_ms': round((time.perf_counter() - started) * 1000, 3)}
+        _queue_report_emails(user, requests, period)
+        started = time.perf_counter()
+        asyncio.run(jobs.arun_pending(concurrency))
+        results['email_jobs_async'] = {'requests': requests, 'concurrency': concurrency,
+                                       'wall_ms': round((time.perf_counter() - started) * 1000, 3)}
+    for result in (results['email_jobs_sync'], results['email_jobs_async']):
+        result['per_second'] = round(requests / result['wall_ms'] * 1000, 1)
+    return results
+
+
+def run_write_stress(users, threads=8, writes=50):
+    """
+    Has `threads` clients, each logged in as one of `users`, add, edit and
+    delete expenses through the views at the same time, `writes` requests
+    each. Returns the counts of successful writes, "database is locked"
+    errors and other failures, and the wall time.
+    """
+    sessions = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        sessions.append((user, client.cookies[settings.SESSION_COOKIE_NAME].value))
+    categories = dict(Category.objects.filter(user__in=users).order_by('id').values_list('user_id', 'id'))
+    day = timezone.now().date().isoformat()
+    counts = {'writes': 0, 'locked': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def writer(number):
+        user, session_key = sessions[number % len(sessions)]
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        form = {'amount': '12.50', 'description': f'Stress {number}', 'category': categories[user.id], 'date': day}
+        outcome = {'writes': 0, 'locked': 0, 'failed': 0}
+        try:
+            for i in range(writes):
+                try:
+                    if i % 3 == 0:
+                        response = client.post(reverse('dashboard'), form)
+                    else:
+                        expense_id = (
+                            Expense.objects.filter(user=user, description=form['description'])
+                            .order_by('-id').values_list('id', flat=True).first()
+                        )
+                        if expense_id is None:
+                            response = client.post(reverse('dashboard'), form)
+                        elif i % 3 == 1:
+                            response = client.post(reverse('edit_expense', args=[expense_id]), dict(form, amount='20.00'))
+                        else:
+                            response = client.post(reverse('delete_expense', args=[expense_id]))
+                except OperationalError as e:
+                    outcome['locked' if 'locked' in str(e) else 'failed'] += 1
+                    continue
+                outcome['writes' if response.status_code == 302 else 'failed'] += 1
+        finally:
+            connections.close_all()
+        with lock:
+            for key, value in outcome.items():
+                counts[key] += value
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(writer, range(threads)))
+    counts['wall_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return counts
+
+
+def run_export_benchmarks(user, iterations=5, warmup=1):
+    """
+    Times encoding a user's whole history as CSV, Parquet and Arrow, and
+    decoding each file back into a table, and reports the file sizes.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    expenses = Expense.objects.filter(user=user)
+    encoders = {
+        'csv': lambda: exports.stream_csv(exports.expense_rows(expenses)),
+        'parquet': lambda: columnar.stream(expenses, columnar.PARQUET),
+        'arrow': lambda: columnar.stream(expenses, columnar.ARROW),
+    }
+    decoders = {
+        'csv': lambda data: pa_csv.read_csv(pa.BufferReader(data)),
+        'parquet': lambda data: pq.read_table(pa.BufferReader(data)),
+        'arrow': lambda data: pa.ipc.open_stream(data).read_all(),
+    }
+    results = {}
+    for name, encode in encoders.items():
+        data = b''.join(chunk.encode() if isinstance(chunk, str) else chunk for chunk in encode())
+        results[f'{name}_encode'] = dict(
+            measure(lambda: sum(len(chunk) for chunk in encode()), iterations=iterations, warmup=warmup),
+            size_bytes=len(data),
+        )
+        results[f'{name}_decode'] = measure(lambda: decoders[name](data), iterations=iterations, warmup=warmup)
+    return results
+
+
+def environment():
+    """Describes where a benchmark ran, so results are only compared like for like."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def write_results(path, results, **meta):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'parameters': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(old, new, metric='p50_ms'):
+    """Returns (name, old, new, percent change) rows for cases present in both result sets."""
+    rows = []
+    for name in sorted(old['results'].keys() & new['results'].keys()):
+        before, after = old['results'][name][metric], new['results'][name][metric]
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append((name, before, after, change))
+    return rows
+
+
+# Run in a fresh interpreter: set up Django, load the URLconf (and with it
+# every view module) and report what that cost.
+STARTUP_PROBE = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_expense_tracker.settings')
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({
+    'import_ms': (time.perf_counter() - started) * 1000,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'google_loaded': any(name.split('.')[0] in ('google', 'googleapiclient', 'google_auth_oauthlib') for name in sys.modules),
+}))
+"""
+
+
+def _run_child(args, cwd):
+    """Runs a child process and returns (wall ms, max RSS in KB, stdout)."""
+    started = time.perf_counter()
+    process = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    stdout = process.stdout.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(args)} exited with {process.returncode}")
+    return (time.perf_counter() - started) * 1000, usage.ru_maxrss, stdout
+
+
+def run_startup_benchmarks(base_dir, runs=10):
+    """Times fresh `manage.py check` processes and the cost of importing the project."""
+    check, check_rss = [], []
+    imports, import_rss, google_loaded = [], [], False
+    for _ in range(runs):
+        wall, rss, _ = _run_child([sys.executable, 'manage.py', 'check'], base_dir)
+        check.append(wall)
+        check_rss.append(rss)
+        _, _, stdout = _run_child([sys.executable, '-c', STARTUP_PROBE], base_dir)
+        probe = json.loads(stdout)
+        imports.append(probe['import_ms'])
+        import_rss.append(probe['rss_kb'])
+        google_loaded = google_loaded or probe['google_loaded']
+
+    def summary(samples, rss):
+        return {
+            'p50_ms': round(percentile(samples, 50), 3),
+            'p95_ms': round(percentile(samples, 95), 3),
+            'mean_ms': round(statistics.fmean(samples), 3),
+            'min_ms': round(min(samples), 3),
+            'max_rss_kb': max(rss),
+            'iterations': runs,
+        }
+
+    return {
+        'manage_py_check': summary(check, check_rss),
+        'project_import': dict(summary(imports, import_rss), google_loaded=google_loaded),
+    }
@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Budget, Expense, MonthlyCategoryTotal
+from .rollups import CENT, month_start, next_month
+
+# Per-category monthly budgets. Each Budget row carries a counter of its
+# category's spend in the current month, so budget status is read without
+# aggregating expenses: the signals that maintain the rollups also add
+# every change to the counter with an F() update, matching only a budget
+# whose counter is for the expense's month. A counter still on a past month
+# is rolled forward the first time it is read, starting from the new
+# month's rollup row. reconcile() recomputes counters from raw expenses,
+# e.g. after a write raced a rollover.
+
+_money = DecimalField(max_digits=14, decimal_places=2)
+
+
+def add_spend(category_id, day, amount):
+    """Adds an expense change to its category's budget counter, if the budget is counting that month."""
+    if amount:
+        Budget.objects.filter(category_id=category_id, month=month_start(day)).update(spent=F('spent') + amount)
+
+
+def _rollup_total(month):
+    # The category's rollup row for the month (at most one), or zero
+    rows = MonthlyCategoryTotal.objects.filter(category=OuterRef('category'), month=month).values('total')[:1]
+    return Coalesce(Subquery(rows), Value(Decimal('0')), output_field=_money)
+
+
+def _expense_total(month):
+    expenses = (
+        Expense.objects.filter(category=OuterRef('category'), date__gte=month, date__lt=next_month(month))
+        .order_by().values('category').annotate(total=Sum('amount')).values('total')
+    )
+    return Coalesce(Subquery(expenses), Value(Decimal('0')), output_field=_money)
+
+
+def roll_forward(budgets, month):
+    """Moves counters still on an earlier month to `month`, starting from its rollup total. Returns the count."""
+    return budgets.filter(month__lt=month).update(month=month, spent=_rollup_total(month))
+
+
+def current_budgets(user, today=None):
+    """
+    Returns the user's budgets, category joined, with counters for the
+    current month: one query, plus a rollover on the first read of a month.
+    """
+    month = month_start(today or timezone.now().date())
+    budgets = Budget.objects.filter(user=user).select_related('category').order_by('category__name')
+    rows = list(budgets)
+    if any(budget.month < month for budget in rows):
+        roll_forward(Budget.objects.filter(user=user), month)
+        rows = list(budgets.all())
+    return rows
+
+
+def set_budget(user, category, amount, today=None):
+    """Sets a category's monthly budget; a new counter starts from the month's spend so far."""
+    if Budget.objects.filter(category=category).update(amount=amount):
+        return
+    month = month_start(today or timezone.now().date())
+    budget = Budget.objects.create(user=user, category=category, amount=amount, month=month)
+    # Read the total in the UPDATE itself, so an expense added meanwhile is not lost
+    Budget.objects.filter(pk=budget.pk).update(spent=_rollup_total(month))
+
+
+def reconcile(user=None, today=None):
+    """
+    Rolls every budget forward to the current month and recomputes the
+    counters that disagree with raw expenses. Returns [(budget, counted,
+    actual)] for the budgets that were fixed.
+    """
+    month = month_start(today or timezone.now().date())
+    budgets = Budget.objects.all() if user is None else Budget.objects.filter(user=user)
+    roll_forward(budgets, month)
+    # Compared in Python: SQLite keeps decimals as floats, so equality in SQL is unreliable
+    drifted = [
+        (budget, budget.spent.quantize(CENT), budget.actual.quantize(CENT))
+        for budget in budgets.annotate(actual=_expense_total(month)).select_related('category').order_by('id')
+        if budget.spent.quantize(CENT) != budget.actual.quantize(CENT)
+    ]
+    if drifted:
+        budgets.filter(pk__in=[budget.pk for budget, _, _ in drifted]).update(spent=_expense_total(month))
+    return drifted
@@ -0,0 +1,100 @@
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from . import search
+from .models import Expense
+from .rollups import CENT, add_delta
+from .signals import expenses_bulk_changed
+
+# Bulk changes to a selection of one user's expenses: recategorise, move to
+# another date, delete. Each is one UPDATE or DELETE whose WHERE clause has
+# the owner in it, so ids of other users' expenses simply match nothing.
+# Queryset writes send no model signals, so the selected rows' previous
+# totals per (category, month) are summed first in the same transaction, and
+# the resulting rollup, budget and cache changes are sent as a single
+# expenses_bulk_changed.
+
+RECATEGORISE = 'recategorise'
+CHANGE_DATE = 'change_date'
+DELETE = 'delete'
+ACTIONS = [
+    (RECATEGORISE, 'Change category'),
+    (CHANGE_DATE, 'Change date'),
+    (DELETE, 'Delete'),
+]
+
+
+def select(user, ids=None, category_id=None, date_filter=None, query=''):
+    """The user's expenses with the given ids, or matching a category, date filter and search query."""
+    queryset = Expense.objects.filter(user=user)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    if date_filter:
+        queryset = queryset.filter(**date_filter)
+    if query:
+        queryset = search.filter_matches(queryset, query)
+    return queryset
+
+
+def _apply(user, selection, write, category_id=None, day=None):
+    with transaction.atomic():
+        # The totals are summed per (category, month) by the database rather
+        # than read row by row; on backends with row locks the subquery locks
+        # the selected rows first, so the write changes exactly what was summed
+        locked = Expense.objects.filter(pk__in=selection.order_by().select_for_update().values('pk'))
+        groups = list(
+            locked.order_by()
+            .annotate(month=TruncMonth('date'))
+            .values('category_id', 'month')
+            .annotate(total=Sum('amount'), count=Count('id'))
+        )
+        if not groups:
+            return 0
+        count = write(selection.order_by())
+        deltas = {}
+        for group in groups:
+            # SQLite sums decimals as floats
+            amount, rows = group['total'].quantize(CENT), group['count']
+            add_delta(deltas, group['category_id'], group['month'], -amount, -rows)
+            if category_id or day:
+                add_delta(deltas, category_id or group['category_id'], day or group['month'], amount, rows)
+        expenses_bulk_changed.send(sender=Expense, user_id=user.id, deltas=deltas)
+    return count
+
+
+def _delete_rows(queryset):
+    """Deletes the rows of a queryset in one DELETE statement and returns how many there were."""
+    # QuerySet.delete() collects the rows first to send pre/post_delete, whose
+    # receivers would apply the rollup changes a second time; nothing
+    # references an expense, so the rows are deleted with plain SQL instead
+    connection = connections[queryset.db]
+    table, pk = (connection.ops.quote_name(name) for name in (Expense._meta.db_table, Expense._meta.pk.column))
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({sql})', params)
+        return cursor.rowcount
+
+
+def recategorise(user, selection, category):
+    """Moves the selected expenses to one of the user's categories. Returns how many were changed."""
+    if category.user_id != user.id:
+        raise ValueError("The category belongs to another user.")
+    selection = selection.exclude(category=category)
+    return _apply(user, selection, lambda rows: rows.update(category=category), category_id=category.id)
+
+
+def change_date(user, selection, day):
+    """Moves the selected expenses to another date. Returns how many were changed."""
+    selection = selection.exclude(date=day)
+    try:
+        return _apply(user, selection, lambda rows: rows.update(date=day), day=day)
+    except IntegrityError:
+        raise ValueError("Two occurrences of the same recurring expense cannot share a date.")
+
+
+def delete(user, selection):
+    """Deletes the selected expenses. Returns how many were deleted."""
+    return _apply(user, selection, _delete_rows)
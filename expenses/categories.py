@@ -0,0 +1,42 @@
+from django.db import transaction
+
+from . import reportcache
+from .models import Category
+
+# Per-user cache of the (id, name) pairs of a user's categories, sorted by
+# name, which every expense, budget and bulk-action form offers as choices.
+# Category saves and deletes invalidate it through
+# signals; writes that bypass them (bulk_create) call invalidate() here.
+# Like the report cache, the entry is dropped immediately and again once the
+# surrounding transaction commits, so nothing read in between outlives it.
+# Invalidation only reaches processes sharing the cache, so deployments with
+# several processes need a shared backend (see EXPENSES_CACHE_ALIAS); forms
+# still check a submitted category against the database either way.
+
+DEFAULT_CATEGORIES = ['Food', 'Transport', 'Bills', 'Entertainment', 'Other']
+
+
+def _key(user_id):
+    return f'expenses:categories:{user_id}'
+
+
+def invalidate(user_id):
+    cache = reportcache.get_cache()
+    cache.delete(_key(user_id))
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def user_categories(user_id):
+    """Returns the user's categories as a list of (id, name) pairs, sorted by name."""
+    cache = reportcache.get_cache()
+    categories = cache.get(_key(user_id))
+    if categories is None:
+        categories = list(Category.objects.filter(user_id=user_id).order_by('name').values_list('id', 'name'))
+        cache.set(_key(user_id), categories, timeout=reportcache.get_timeout())
+    return categories
+
+
+def create_defaults(user):
+    """Gives a new user the default categories, in one INSERT."""
+    Category.objects.bulk_create([Category(user=user, name=name) for name in DEFAULT_CATEGORIES])
+    invalidate(user.id)
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Google Drive integration. The Google client libraries are heavy to import,
+# and almost no request needs them, so every import here happens inside the
+# function that uses it rather than at module level.
+
+SCOPES = ['https://www.googleapis.com/auth/drive.file']
+TOKEN_FILE = 'token.json'
+CLIENT_SECRETS_FILE = 'client_secret.json'
+
+# Uploads are sent in chunks of this size (Drive requires multiples of 256 KB)
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+DEFAULT_NUM_RETRIES = 3
+
+# The OAuth callback is served over plain HTTP in development
+os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+
+# Built services, keyed by the credential they authenticate with. build()
+# parses the API discovery document, which is too slow to repeat per upload.
+# httplib2 is not thread-safe, so each thread keeps its own.
+_local = threading.local()
+
+
+def is_authorized():
+    """Whether an OAuth token has been stored (it may still need refreshing)."""
+    return os.path.exists(TOKEN_FILE)
+
+
+def save_credentials(creds):
+    with open(TOKEN_FILE, 'w') as token:
+        token.write(creds.to_json())
+
+
+def load_credentials():
+    """Loads the stored OAuth token, refreshing it if it has expired. Returns None if unusable."""
+    if not is_authorized():
+        return None
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
+    creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+    if not creds.valid and creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+        save_credentials(creds)
+    return creds if creds.valid else None
+
+
+def authorization_flow(redirect_uri, state=None):
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    return InstalledAppFlow.from_client_secrets_file(
+        CLIENT_SECRETS_FILE, SCOPES, state=state, redirect_uri=redirect_uri
+    )
+
+
+def service_for(creds):
+    """Returns the Drive v3 service for a credential, building it only the first time."""
+    services = _local.__dict__.setdefault('services', {})
+    key = (creds.client_id, creds.refresh_token or creds.token)
+    if key not in services:
+        from googleapiclient.discovery import build
+
+        services[key] = build('drive', 'v3', credentials=creds, cache_discovery=False)
+    return services[key]
+
+
+def build_service():
+    creds = load_credentials()
+    if creds is None:
+        raise RuntimeError("Google Drive is not authorized.")
+    return service_for(creds)
+
+
+def get_service():
+    """Returns a Drive v3 service from the factory named by settings.EXPENSES_DRIVE_SERVICE_FACTORY."""
+    factory = getattr(settings, 'EXPENSES_DRIVE_SERVICE_FACTORY', 'expenses.drive.build_service')
+    return import_string(factory)()
+
+
+def _session_offset(http, uri, size):
+    """
+    Asks a resumable upload session how much it has received. Returns
+    (offset, file) where file is set if the upload already completed, or
+    (None, None) if the session has expired and the upload must restart.
+    """
+    response, content = http.request(uri, 'PUT', headers={'Content-Range': f'bytes */{size}', 'Content-Length': '0'})
+    if response.status in (200, 201):
+        return size, json.loads(content)
+    if response.status == 308:
+        received = response.get('range')
+        return (int(received.rsplit('-', 1)[1]) + 1 if received else 0), None
+    return None, None
+
+
+def upload_file(service, name, fileobj, mimetype='text/csv', chunksize=None, session=None, checkpoint=None):
+    """
+    Uploads a seekable binary file object as a new Drive file, in resumable
+    chunks, and returns its {'id', 'name'}.
+
+    After every chunk the server acknowledges, `checkpoint` (if given) is
+    called with a {'uri', 'progress'} dict. Passing that dict back as
+    `session` continues an interrupted upload from where the server stopped,
+    as long as the file content is the same.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
+    if chunksize is None:
+        chunksize = getattr(settings, 'EXPENSES_DRIVE_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    num_retries = getattr(settings, 'EXPENSES_DRIVE_NUM_RETRIES', DEFAULT_NUM_RETRIES)
+    media = MediaIoBaseUpload(fileobj, mimetype=mimetype, chunksize=chunksize, resumable=True)
+    request = service.files().create(body={'name': name}, media_body=media, fields='id,name')
+
+    if session:
+        offset, file = _session_offset(request.http, session['uri'], media.size())
+        if file is not None:
+            return file
+        if offset is not None:
+            request.resumable_uri, request.resumable_progress = session['uri'], offset
+
+    file = None
+    while file is None:
+        _, file = request.next_chunk(num_retries=num_retries)
+        if file is None and checkpoint:
+            checkpoint({'uri': request.resumable_uri, 'progress': request.resumable_progress})
+    return file
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import get_template
+from django.utils.html import strip_tags
+
+REPORT_TEMPLATE = 'expenses/email/report_email.html'
+
+
+def report_month_name(period):
+    return datetime(period.year, period.month, 1).strftime('%B %Y')
+
+
+def report_message(user, period, category_summary, total_expenses, connection=None, template=None):
+    """
+    Builds (but does not send) the monthly report email for a user. Pass a
+    pre-loaded `template` and a shared `connection` when building many at once.
+    """
+    template = template or get_template(REPORT_TEMPLATE)
+    month_name = report_month_name(period)
+    html_message = template.render({
+        'user': user,
+        'category_summary': category_summary,
+        'total_expenses': total_expenses,
+        'report_month': month_name,
+    })
+    message = EmailMultiAlternatives(
+        f'Your Expense Report for {month_name}',
+        strip_tags(html_message),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        connection=connection,
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+async def asend(message):
+    """
+    Sends a message without blocking the event loop: with aiosmtplib when it
+    is installed and the SMTP backend is configured, otherwise through the
+    configured backend in a worker thread.
+    """
+    if settings.EMAIL_BACKEND == SMTP_BACKEND:
+        try:
+            import aiosmtplib
+        except ImportError:
+            pass
+        else:
+            await aiosmtplib.send(
+                message.message(), sender=message.from_email, recipients=message.recipients(),
+                hostname=settings.EMAIL_HOST, port=settings.EMAIL_PORT,
+                username=settings.EMAIL_HOST_USER or None, password=settings.EMAIL_HOST_PASSWORD or None,
+                use_tls=settings.EMAIL_USE_SSL, start_tls=settings.EMAIL_USE_TLS, timeout=settings.EMAIL_TIMEOUT,
+            )
+            return 1
+    return await sync_to_async(message.send, thread_sensitive=False)(fail_silently=False)
@@ -0,0 +1,52 @@
+import csv
+
+CSV_HEADER = ['Date', 'Description', 'Category', 'Amount']
+
+# Rows fetched per database round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """A file-like object whose write() just returns the value, so csv.writer can produce lines lazily."""
+    def write(self, value):
+        return value
+
+
+def expense_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields [date, description, category, amount] lists for a queryset of expenses.
+    Uses a join for the category and a chunked cursor, so no model instances are
+    built and memory does not grow with the number of rows.
+    """
+    rows = (
+        queryset.order_by('date', 'id')
+        .values_list('date', 'description', 'category__name', 'amount')
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield list(row)
+
+
+async def aexpense_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """expense_rows() for async responses: each chunk is one trip to the database thread."""
+    # values(), not values_list(): Django 4.2's aiterator() runs the latter's query on the event loop
+    fields = ['date', 'description', 'category__name', 'amount']
+    rows = queryset.order_by('date', 'id').values(*fields).aiterator(chunk_size=chunk_size)
+    async for row in rows:
+        yield [row[field] for field in fields]
+
+
+def stream_csv(rows, header=CSV_HEADER):
+    """Yields CSV-encoded lines, starting with the header."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def astream_csv(rows, header=CSV_HEADER):
+    """stream_csv() over an async iterable of rows."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    async for row in rows:
+        yield writer.writerow(row)
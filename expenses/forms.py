@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Expense, Category
+from .models import MAX_ID, Expense, Category
+from . import bulk, categories
 
 class CustomUserCreationForm(UserCreationForm):
     """
@@ -17,15 +18,64 @@ class CustomUserCreationForm(UserCreationForm):
         fields = UserCreationForm.Meta.fields + ('email',)
 
 
+class CategoryChoiceField(forms.ChoiceField):
+    """
+    A choice of one of a user's categories. The options come from the
+    per-user cache in categories.py, so rendering a form costs no query; a
+    submitted value is checked against the database, since another process
+    may have added or deleted the category since this one cached the list.
+    Cleans to a Category like ModelChoiceField does.
+    """
+    def __init__(self, *args, empty_label='---------', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.empty_label = empty_label
+        self.user_id = None
+
+    def set_user(self, user):
+        self.user_id = user.id
+        self.choices = [('', self.empty_label)] + categories.user_categories(user.id)
+
+    def prepare_value(self, value):
+        return value.pk if isinstance(value, Category) else value
+
+    def valid_value(self, value):
+        # Checked in clean() against the database rather than the cached options
+        return True
+
+    def clean(self, value):
+        value = super().clean(value)
+        if value in self.empty_values:
+            return None
+        try:
+            pk = int(value)
+            if not 0 < pk <= MAX_ID:
+                raise ValueError(value)
+            category = Category.objects.filter(user_id=self.user_id).only('id', 'name', 'user_id').get(pk=pk)
+        except (ValueError, Category.DoesNotExist):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        return category
+
+
 class ExpenseForm(forms.ModelForm):
     """
     A form for creating and updating Expense objects, customized for the user.
     """
+    category = CategoryChoiceField(
+        widget=forms.Select(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
+    )
+
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
+        user = kwargs.pop('user')
         super(ExpenseForm, self).__init__(*args, **kwargs)
-        if user:
-            self.fields['category'].queryset = Category.objects.filter(user=user)
+        self.fields['category'].set_user(user)
+
+    def _get_validation_exclusions(self):
+        # The field has already read the category from the database: skip the model's second existence query
+        exclude = super()._get_validation_exclusions()
+        exclude.add('category')
+        return exclude
 
     class Meta:
         model = Expense
@@ -33,7 +83,149 @@ class ExpenseForm(forms.ModelForm):
         widgets = {
             'amount': forms.NumberInput(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm', 'placeholder': 'e.g., 50.00'}),
             'description': forms.Textarea(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm', 'rows': 3, 'placeholder': 'e.g., Lunch with client'}),
-            'category': forms.Select(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
             'date': forms.DateInput(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm', 'type': 'date'}),
         }
 
+
+class BudgetForm(forms.Form):
+    """
+    Sets the monthly budget of one of the user's categories; an amount of 0 removes it.
+    """
+    category = CategoryChoiceField(
+        widget=forms.Select(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
+    )
+    amount = forms.DecimalField(
+        min_value=0, max_digits=10, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm', 'placeholder': 'e.g., 5000.00'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['category'].set_user(user)
+
+
+class BulkActionForm(forms.Form):
+    """
+    A bulk change to the user's expenses, either the ticked ones (`ids`) or
+    all those matching the search filters (scope 'filter').
+    """
+    SELECTED = 'selected'
+    FILTER = 'filter'
+
+    action = forms.ChoiceField(choices=bulk.ACTIONS)
+    scope = forms.ChoiceField(choices=[(SELECTED, 'Selected'), (FILTER, 'All matching')], required=False)
+    category = CategoryChoiceField(
+        required=False, empty_label='Category…',
+        widget=forms.Select(attrs={'class': 'border border-gray-300 rounded-md shadow-sm py-1 px-2 sm:text-sm'}),
+    )
+    date = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'border border-gray-300 rounded-md shadow-sm py-1 px-2 sm:text-sm', 'type': 'date'}),
+    )
+    # The filters of the search page, for scope 'filter'
+    filter_category = forms.IntegerField(required=False, min_value=1, max_value=MAX_ID)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    q = forms.CharField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['category'].set_user(user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+        if action == bulk.RECATEGORISE and not cleaned_data.get('category'):
+            self.add_error('category', 'Choose the new category.')
+        if action == bulk.CHANGE_DATE and not cleaned_data.get('date'):
+            self.add_error('date', 'Choose the new date.')
+        if cleaned_data.get('scope') == self.FILTER:
+            if not any(cleaned_data.get(name) for name in ('filter_category', 'start', 'end', 'q')):
+                raise forms.ValidationError('Filter the expenses first.')
+        else:
+            ids = []
+            for value in self.data.getlist('ids'):
+                try:
+                    pk = int(value)
+                except (TypeError, ValueError):
+                    raise forms.ValidationError('Invalid selection.')
+                if not 0 < pk <= MAX_ID:
+                    raise forms.ValidationError('Invalid selection.')
+                ids.append(pk)
+            if not ids:
+                raise forms.ValidationError('Select at least one expense.')
+            cleaned_data['ids'] = ids
+        return cleaned_data
+
+    def selection(self, user):
+        """The queryset of the user's expenses this form applies to."""
+        data = self.cleaned_data
+        if data.get('scope') == self.FILTER:
+            date_filter = {}
+            if data.get('start'):
+                date_filter['date__gte'] = data['start']
+            if data.get('end'):
+                date_filter['date__lte'] = data['end']
+            return bulk.select(
+                user, category_id=data.get('filter_category'), date_filter=date_filter, query=data.get('q', '').strip(),
+            )
+        return bulk.select(user, ids=data['ids'])
+
+
+class SearchForm(forms.Form):
+    """
+    The filters of the search page. Each is optional; an invalid one is
+    reported rather than dropped, so the results never silently cover a
+    different range than the one asked for.
+    """
+    CATEGORY_ERROR = 'Choose one of your categories.'
+
+    q = forms.CharField(required=False)
+    category = forms.IntegerField(
+        required=False, min_value=1, max_value=MAX_ID,
+        error_messages={'invalid': CATEGORY_ERROR, 'min_value': CATEGORY_ERROR, 'max_value': CATEGORY_ERROR},
+    )
+    start = forms.DateField(required=False, error_messages={'invalid': "'From' must be a valid date."})
+    end = forms.DateField(required=False, error_messages={'invalid': "'To' must be a valid date."})
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("'From' must not be after 'To'.")
+        return cleaned_data
+
+    def date_filter(self):
+        """Queryset filter kwargs for the inclusive start/end dates."""
+        date_filter = {}
+        if self.cleaned_data.get('start'):
+            date_filter['date__gte'] = self.cleaned_data['start']
+        if self.cleaned_data.get('end'):
+            date_filter['date__lte'] = self.cleaned_data['end']
+        return date_filter
+
+
+class CategoryForm(forms.ModelForm):
+    """
+    Adds or renames one of the user's categories; names are unique per user.
+    """
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+
+    def clean_name(self):
+        name = self.cleaned_data['name'].strip()
+        # Checked against the database, not the cached list: another process may have added the name since
+        taken = Category.objects.filter(user=self.user, name__iexact=name).exclude(pk=self.instance.pk)
+        if taken.exists():
+            raise forms.ValidationError('You already have a category with this name.')
+        return name
+
+    class Meta:
+        model = Category
+        fields = ['name']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'mt-1 block w-full border border-gray-300 rounded-md shadow-sm py-2 px-3 focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm', 'placeholder': 'e.g., Groceries'}),
+        }
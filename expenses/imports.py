@@ -0,0 +1,251 @@
+import codecs
+import csv
+import io
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import categories
+from .models import Category, Expense
+from .rollups import add_delta
+from .signals import expenses_bulk_changed
+
+# Bulk import of expenses from the CSV files export_csv writes (Date,
+# Description, Category, Amount) or from bank OFX statements. Files are read
+# as a stream, validated and inserted in batches: each batch costs one
+# category lookup, at most one category insert and one bulk insert.
+
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_OFX_CATEGORY = 'Other'
+MAX_ERRORS = 1000  # stop collecting (but keep counting) errors past this
+
+_amount_field = Expense._meta.get_field('amount')
+_category_name_length = Category._meta.get_field('name').max_length
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []  # (line number, message)
+        self.categories_created = []
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return (self.created + self.failed) / self.elapsed if self.elapsed else 0.0
+
+
+# --- Parsing: each parser yields (line number, date, description, category, amount) as strings ---
+
+def _text_stream(fileobj, encoding='utf-8-sig'):
+    if not isinstance(fileobj.read(0), bytes):
+        return fileobj
+    if hasattr(fileobj, 'readable'):
+        return io.TextIOWrapper(fileobj, encoding=encoding, errors='replace', newline='')
+    return codecs.getreader(encoding)(fileobj, errors='replace')
+
+
+def _csv_rows(reader):
+    """Iterates a csv.reader, turning malformed input (csv.Error) into a ValueError naming the line."""
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            raise ValueError(f"Line {reader.line_num}: {e}")
+        yield row
+
+
+def parse_csv(fileobj):
+    reader = csv.reader(_text_stream(fileobj))
+    rows = _csv_rows(reader)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = {name.strip().lower(): index for index, name in enumerate(header)}
+    missing = [name for name in ('date', 'category', 'amount') if name not in columns]
+    if missing:
+        raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+    description = columns.get('description')
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        get = lambda index: row[index].strip() if index is not None and index < len(row) else ''
+        yield (
+            reader.line_num, get(columns['date']), get(description),
+            get(columns['category']), get(columns['amount']),
+        )
+
+
+_OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.IGNORECASE | re.DOTALL)
+_OFX_FIELD = re.compile(r'<(DTPOSTED|TRNAMT|NAME|MEMO)>([^<\r\n]*)', re.IGNORECASE)
+
+
+def parse_ofx(fileobj, category=DEFAULT_OFX_CATEGORY, chunk_size=64 * 1024):
+    """
+    Reads <STMTTRN> blocks from an OFX 1.x (SGML) or 2.x (XML) statement.
+    Debits become expenses; the "line number" is the transaction's position.
+    """
+    stream = _text_stream(fileobj, encoding='latin-1')
+    buffer = ''
+    position = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        consumed = 0
+        for match in _OFX_TRANSACTION.finditer(buffer):
+            consumed = match.end()
+            position += 1
+            fields = {name.upper(): value.strip() for name, value in _OFX_FIELD.findall(match.group(1))}
+            yield (
+                position, fields.get('DTPOSTED', '')[:8],
+                fields.get('NAME') or fields.get('MEMO', ''), category, fields.get('TRNAMT', ''),
+            )
+        if not chunk:
+            break
+        # Keep only what may belong to a block that continues in the next chunk
+        buffer = buffer[consumed:]
+        if len(buffer) > chunk_size and not re.search(r'<STMTTRN>', buffer, re.IGNORECASE):
+            buffer = buffer[-len('<STMTTRN>'):]
+
+
+def detect_format(fileobj, name=''):
+    """Returns 'ofx' or 'csv' from the file name, or by sniffing the start of a seekable file."""
+    if name.lower().endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    if name.lower().endswith('.csv'):
+        return 'csv'
+    head = fileobj.read(512)
+    fileobj.seek(0)
+    if isinstance(head, bytes):
+        head = head.decode('latin-1')
+    return 'ofx' if 'OFXHEADER' in head.upper() or '<OFX>' in head.upper() else 'csv'
+
+
+# --- Validation ---
+
+def _parse_date(value):
+    if re.fullmatch(r'\d{8}', value):
+        return datetime.strptime(value, '%Y%m%d').date()
+    return date.fromisoformat(value)
+
+
+def clean_row(date_value, description, category, amount_value, ofx=False):
+    """Validates one parsed row and returns (date, description, category name, amount)."""
+    try:
+        expense_date = _parse_date(date_value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{date_value}' (expected YYYY-MM-DD).")
+    try:
+        amount = Decimal(amount_value.replace(',', ''))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount '{amount_value}'.")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount '{amount_value}'.")
+    if ofx:
+        # Bank statements list spending as negative amounts
+        if amount >= 0:
+            raise ValueError("Not an expense (credit or zero amount).")
+        amount = -amount
+    # Round before checking the digits: 99999999.999 only overflows once rounded
+    try:
+        amount = amount.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"Amount {amount_value} is too large.")
+    if amount.adjusted() >= _amount_field.max_digits - _amount_field.decimal_places:
+        raise ValueError(f"Amount {amount_value} is too large.")
+    if amount <= 0:
+        raise ValueError("Amount must be a positive number.")
+    if not category:
+        raise ValueError("Category is required.")
+    if len(category) > _category_name_length:
+        raise ValueError(f"Category name is longer than {_category_name_length} characters.")
+    return expense_date, description, category, amount
+
+
+# --- Import ---
+
+class Importer:
+    def __init__(self, user, batch_size=DEFAULT_BATCH_SIZE, create_categories=True):
+        self.user = user
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.categories = {}  # name -> id, filled one batch at a time
+        self.result = ImportResult()
+
+    def _resolve_categories(self, names):
+        unknown = set(names) - self.categories.keys()
+        if not unknown:
+            return
+        self.categories.update(
+            Category.objects.filter(user=self.user, name__in=unknown).values_list('name', 'id')
+        )
+        missing = unknown - self.categories.keys()
+        if missing and self.create_categories:
+            Category.objects.bulk_create(
+                [Category(user=self.user, name=name) for name in sorted(missing)], ignore_conflicts=True
+            )
+            categories.invalidate(self.user.id)
+            # Re-read rather than trust returned ids, which not every backend provides with ignore_conflicts
+            self.categories.update(
+                Category.objects.filter(user=self.user, name__in=missing).values_list('name', 'id')
+            )
+            self.result.categories_created.extend(sorted(missing))
+
+    def _import_batch(self, rows, ofx):
+        cleaned = []
+        for line, *values in rows:
+            try:
+                cleaned.append((line, *clean_row(*values, ofx=ofx)))
+            except ValueError as e:
+                self.result.add_error(line, str(e))
+        self._resolve_categories({row[3] for row in cleaned})
+
+        expenses, deltas = [], {}
+        for line, expense_date, description, category, amount in cleaned:
+            category_id = self.categories.get(category)
+            if category_id is None:
+                self.result.add_error(line, f"Unknown category '{category}'.")
+                continue
+            expenses.append(Expense(
+                user=self.user, category_id=category_id, amount=amount,
+                description=description, date=expense_date,
+            ))
+            add_delta(deltas, category_id, expense_date, amount, 1)
+
+        with transaction.atomic():
+            Expense.objects.bulk_create(expenses, batch_size=self.batch_size)
+            expenses_bulk_changed.send(sender=Expense, user_id=self.user.id, deltas=deltas)
+        self.result.created += len(expenses)
+
+    def run(self, fileobj, file_format='csv', ofx_category=DEFAULT_OFX_CATEGORY):
+        started = time.perf_counter()
+        ofx = file_format == 'ofx'
+        rows = parse_ofx(fileobj, category=ofx_category) if ofx else parse_csv(fileobj)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch, ofx)
+                batch = []
+        if batch:
+            self._import_batch(batch, ofx)
+        self.result.elapsed = time.perf_counter() - started
+        return self.result
+
+
+def import_expenses(user, fileobj, file_format=None, name='', **options):
+    """Imports a CSV or OFX file for a user and returns an ImportResult."""
+    ofx_category = options.pop('ofx_category', DEFAULT_OFX_CATEGORY)
+    file_format = file_format or detect_format(fileobj, name)
+    return Importer(user, **options).run(fileobj, file_format, ofx_category=ofx_category)
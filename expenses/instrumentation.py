@@ -0,0 +1,198 @@
+import functools
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Per-request SQL and template timing. Use instrument() around any block of
+# code, or enable InstrumentationMiddleware to get Server-Timing headers and
+# one structured log line per (sampled) request:
+#
+#   EXPENSES_INSTRUMENTATION = {
+#       'SAMPLE_RATE': 0.05,         # fraction of requests to instrument
+#       'DUPLICATE_THRESHOLD': 3,    # same SQL this many times = N+1 suspect
+#       'SERVER_TIMING': False,      # add the Server-Timing header
+#       'LOG': True,                 # emit a log line on 'expenses.instrumentation'
+#   }
+#
+# No request is instrumented unless SAMPLE_RATE is raised. Server-Timing
+# exposes query counts and timings to anyone making a request, so it is also
+# off unless SERVER_TIMING is set.
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.0,
+    'DUPLICATE_THRESHOLD': 3,
+    'SERVER_TIMING': False,
+    'LOG': True,
+}
+
+_active = ContextVar('expenses_instrumentation', default=None)
+_template_timer_installed = False
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EXPENSES_INSTRUMENTATION', {})}
+
+
+class Metrics:
+    """Collects query and render timings; also acts as the database execute wrapper."""
+
+    def __init__(self, duplicate_threshold=DEFAULTS['DUPLICATE_THRESHOLD']):
+        self.duplicate_threshold = duplicate_threshold
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.wall_time = 0.0
+        self.statements = Counter()
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.query_count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """SQL statements run at least duplicate_threshold times, e.g. a related lookup inside a loop."""
+        return {sql: count for sql, count in self.statements.items() if count >= self.duplicate_threshold}
+
+    def server_timing(self):
+        parts = [
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.wall_time * 1000:.1f}',
+        ]
+        if self.duplicates:
+            parts.append(f'dup;desc="{sum(self.duplicates.values())} repeated queries"')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        return {
+            'queries': self.query_count,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.wall_time * 1000, 2),
+            'duplicates': [{'sql': sql[:200], 'count': count} for sql, count in self.duplicates.items()],
+        }
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        metrics = _active.get()
+        if metrics is None or metrics._template_depth:
+            return render(self, *args, **kwargs)
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics._template_depth -= 1
+    return wrapper
+
+
+def install_template_timer():
+    """Wraps Django template rendering once so renders inside instrument() are timed."""
+    global _template_timer_installed
+    if not _template_timer_installed:
+        from django.template.backends.django import Template
+        Template.render = _timed_render(Template.render)
+        _template_timer_installed = True
+
+
+def _wrap_connections(stack, metrics):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics))
+
+
+@contextmanager
+def instrument(duplicate_threshold=None):
+    """Records queries, SQL time, template time and wall time for the enclosed block."""
+    install_template_timer()
+    if duplicate_threshold is None:
+        duplicate_threshold = get_config()['DUPLICATE_THRESHOLD']
+    metrics = Metrics(duplicate_threshold)
+    token = _active.set(metrics)
+    started = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            _wrap_connections(stack, metrics)
+            yield metrics
+    finally:
+        metrics.wall_time = time.perf_counter() - started
+        _active.reset(token)
+
+
+class InstrumentationMiddleware:
+    """
+    Instruments a sample of requests; put it first in MIDDLEWARE so the total
+    covers the rest. Works in both sync and async (ASGI) stacks, so it never
+    forces async views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        with instrument(self.config['DUPLICATE_THRESHOLD']) as metrics:
+            response = self.get_response(request)
+        return self.report(request, response, metrics)
+
+    async def __acall__(self, request):
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return await self.get_response(request)
+
+        # An async request runs its queries in one thread-sensitive executor
+        # thread, whose connections are not the event loop thread's: install
+        # the query wrappers (and remove them) in that thread
+        install_template_timer()
+        metrics = Metrics(self.config['DUPLICATE_THRESHOLD'])
+        token = _active.set(metrics)
+        stack = ExitStack()
+        started = time.perf_counter()
+        try:
+            await sync_to_async(_wrap_connections)(stack, metrics)
+            response = await self.get_response(request)
+        finally:
+            metrics.wall_time = time.perf_counter() - started
+            await sync_to_async(stack.close)()
+            _active.reset(token)
+        return self.report(request, response, metrics)
+
+    def report(self, request, response, metrics):
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = metrics.server_timing()
+        if self.config['LOG']:
+            data = {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **metrics.as_dict(),
+            }
+            level = logging.WARNING if metrics.duplicates else logging.INFO
+            logger.log(level, 'request_metrics %s', json.dumps(data, sort_keys=True))
+        return response
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# A small database-backed job queue. Views enqueue work and return at once;
+# `manage.py run_jobs` claims due jobs and runs the handler registered for
+# their kind, retrying failures with exponential backoff. With --concurrency
+# the worker runs jobs on an event loop instead (arun_pending), preferring a
+# kind's async handler, so one process can wait on many slow deliveries.
+
+DEFAULT_HANDLERS = {
+    'email_report': 'expenses.tasks.send_report_email',
+    'drive_upload': 'expenses.tasks.upload_report_to_drive',
+}
+# Handlers awaited by the async worker; other kinds run their sync handler in a thread
+DEFAULT_ASYNC_HANDLERS = {
+    'email_report': 'expenses.tasks.asend_report_email',
+}
+DEFAULT_CONCURRENCY = 10
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 60 * 60
+# A job whose lease (locked_at) is older than this is assumed to belong to a
+# dead worker. Handlers that may run longer renew the lease with heartbeat().
+STALE_AFTER = timedelta(minutes=15)
+
+
+def get_handler(kind):
+    handlers = {**DEFAULT_HANDLERS, **getattr(settings, 'EXPENSES_JOB_HANDLERS', {})}
+    return import_string(handlers[kind])
+
+
+def get_async_handler(kind):
+    """The coroutine function for a kind, or its sync handler wrapped to run in a worker thread."""
+    handlers = {**DEFAULT_ASYNC_HANDLERS, **getattr(settings, 'EXPENSES_JOB_ASYNC_HANDLERS', {})}
+    handler = import_string(handlers[kind]) if kind in handlers else get_handler(kind)
+    if iscoroutinefunction(handler):
+        return handler
+    return sync_to_async(handler, thread_sensitive=False)
+
+
+def enqueue(kind, user, payload=None, max_attempts=None):
+    """Queues a job for the worker and returns it."""
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'EXPENSES_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    return Job.objects.create(kind=kind, user=user, payload=payload or {}, max_attempts=max_attempts)
+
+
+async def aenqueue(kind, user, payload=None, max_attempts=None):
+    """enqueue() for async views."""
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'EXPENSES_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    return await Job.objects.acreate(kind=kind, user=user, payload=payload or {}, max_attempts=max_attempts)
+
+
+def backoff(attempts):
+    """Returns the delay before retry number `attempts` (1, 2, ...): base * 2**(attempts - 1), capped."""
+    base = getattr(settings, 'EXPENSES_JOB_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def heartbeat(job):
+    """
+    Renews the lease of a running job, so requeue_stale() leaves it alone
+    while its handler makes progress. Returns False if the job is no longer
+    running, e.g. because it was already requeued.
+    """
+    job.locked_at = timezone.now()
+    return bool(Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(locked_at=job.locked_at))
+
+
+def requeue_stale():
+    """
+    Puts jobs abandoned by a crashed worker back on the queue. The abandoned
+    run counts as an attempt, so a job that keeps killing its worker ends up
+    failed instead of being retried forever.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - STALE_AFTER)
+    outcome = {
+        'attempts': F('attempts') + 1, 'locked_at': None, 'updated_at': now,
+        'last_error': 'The worker running the job stopped responding.',
+    }
+    failed = stale.filter(attempts__gte=F('max_attempts') - 1).update(status=Job.FAILED, **outcome)
+    return failed + stale.update(status=Job.QUEUED, **outcome)
+
+
+def claim_next():
+    """
+    Atomically claims the next due job, or returns None. The conditional UPDATE
+    makes sure two workers never run the same job, on any database backend.
+    """
+    while True:
+        now = timezone.now()
+        job_id = (
+            Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        if Job.objects.filter(id=job_id, status=Job.QUEUED).update(status=Job.RUNNING, locked_at=now):
+            return Job.objects.select_related('user').get(id=job_id)
+
+
+def _record_outcome(job, result=None, error=None):
+    job.attempts += 1
+    if error is not None:
+        job.last_error = f"{type(error).__name__}: {error}"
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning("Job %s failed (attempt %s), retrying at %s: %s", job.pk, job.attempts, job.run_at, error)
+        else:
+            job.status = Job.FAILED
+            logger.error("Job %s failed permanently after %s attempts: %s", job.pk, job.attempts, error)
+    else:
+        job.result = result
+        job.status = Job.SUCCEEDED
+        job.last_error = ''
+    job.locked_at = None
+
+
+_OUTCOME_FIELDS = ['attempts', 'result', 'last_error', 'status', 'run_at', 'locked_at', 'updated_at']
+
+
+def run_job(job):
+    """Runs a claimed job and records its outcome, scheduling a retry on failure."""
+    try:
+        result = get_handler(job.kind)(job)
+    except Exception as e:
+        _record_outcome(job, error=e)
+    else:
+        _record_outcome(job, result)
+    job.save(update_fields=_OUTCOME_FIELDS)
+    return job
+
+
+async def arun_job(job):
+    """run_job() on the event loop, awaiting the kind's async handler."""
+    try:
+        result = await get_async_handler(job.kind)(job)
+    except Exception as e:
+        _record_outcome(job, error=e)
+    else:
+        _record_outcome(job, result)
+    await job.asave(update_fields=_OUTCOME_FIELDS)
+    return job
+
+
+def run_pending(limit=None):
+    """Runs due jobs until the queue is empty (or `limit` jobs ran) and returns how many ran."""
+    requeue_stale()
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+async def arun_pending(concurrency=DEFAULT_CONCURRENCY, limit=None):
+    """
+    Like run_pending(), with up to `concurrency` jobs in flight at once.
+    Claims still go through the conditional UPDATE, so several processes
+    can share the queue.
+    """
+    await sync_to_async(requeue_stale)()
+    processed = 0
+
+    async def worker():
+        nonlocal processed
+        while limit is None or processed < limit:
+            job = await sync_to_async(claim_next)()
+            if job is None:
+                return
+            processed += 1
+            await arun_job(job)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return processed
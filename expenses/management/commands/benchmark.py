@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from expenses import benchmarks
+from expenses.sampledata import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Times every view on a freshly generated dataset in a throwaway test database "
+        "and writes p50/p95 latencies and query counts to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--expenses', type=int, default=5000, help="Expenses per user.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='*', help="Only run these cases.")
+        parser.add_argument('--output', default='bench_results.json')
+        parser.add_argument('--compare', help="A previous results file to compare against.")
+
+    def handle(self, *args, **options):
+        # DEBUG would log every query and skew the timings
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(f"Generating {options['users']} x {options['expenses']} expenses...")
+            users = generate(users=options['users'], expenses_per_user=options['expenses'], seed=options['seed'])
+            results = benchmarks.run_view_benchmarks(
+                users[0], iterations=options['iterations'], warmup=options['warmup'], only=options['only'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        benchmarks.write_results(
+            options['output'], results,
+            users=options['users'], expenses_per_user=options['expenses'],
+            seed=options['seed'], iterations=options['iterations'],
+        )
+        self.stdout.write(f"{'case':<24}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, stats in results.items():
+            self.stdout.write(f"{name:<24}{stats['queries']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            old = benchmarks.load_results(options['compare'])
+            new = benchmarks.load_results(options['output'])
+            self.stdout.write(f"\nCompared with {options['compare']} ({old['environment'].get('commit')}):")
+            for name, before, after, change in benchmarks.compare_results(old, new):
+                self.stdout.write(f"{name:<24}{before:>10.2f}{after:>10.2f}{change:>+9.1f}%")
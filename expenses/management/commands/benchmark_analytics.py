@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from expenses import analytics, benchmarks
+from expenses.sampledata import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Times fitting the anomaly / forecast model on a large synthetic history and, with --database, "
+        "loading a stored history of the same size from a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument(
+            '--database', action='store_true',
+            help="Also store the rows for one user and time the query and the report insights (slow to set up).",
+        )
+        parser.add_argument('--output', default='bench_results_analytics.json')
+        parser.add_argument('--compare', help="A previous results file to compare against.")
+
+    def handle(self, *args, **options):
+        if not analytics.numpy_available():
+            raise CommandError("NumPy is not installed.")
+        options_for_run = {'rows': options['rows'], 'iterations': options['iterations'],
+                           'warmup': options['warmup'], 'seed': options['seed']}
+        if options['database']:
+            setup_test_environment(debug=False)
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                self.stdout.write(f"Generating {options['rows']} expenses...")
+                user, = generate(users=1, expenses_per_user=options['rows'], days=3650, seed=options['seed'])
+                results = benchmarks.run_analytics_benchmarks(user=user, **options_for_run)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+        else:
+            results = benchmarks.run_analytics_benchmarks(**options_for_run)
+
+        benchmarks.write_results(options['output'], results, **options_for_run)
+        self.stdout.write(f"{'case':<16}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, stats in results.items():
+            self.stdout.write(f"{name:<16}{stats['queries']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            old = benchmarks.load_results(options['compare'])
+            new = benchmarks.load_results(options['output'])
+            self.stdout.write(f"\nCompared with {options['compare']} ({old['environment'].get('commit')}):")
+            for name, before, after, change in benchmarks.compare_results(old, new):
+                self.stdout.write(f"{name:<16}{before:>10.2f}{after:>10.2f}{change:>+9.1f}%")
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from expenses import benchmarks
+from expenses.sampledata import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the report and CSV export views served concurrently through WSGI (threads) and ASGI "
+        "(an event loop), and report email delivery by the sync and async job workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expenses', type=int, default=5000, help="Expenses of the benchmark user.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=100, help="Requests (and emails) per case.")
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument(
+            '--latency', type=float, default=0.05, help="Seconds the simulated SMTP server takes per message.",
+        )
+        parser.add_argument('--output', default='bench_results_concurrency.json')
+        parser.add_argument('--compare', help="A previous results file to compare against.")
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(f"Generating {options['expenses']} expenses...")
+            user, = generate(users=1, expenses_per_user=options['expenses'], seed=options['seed'])
+            results = benchmarks.run_concurrency_benchmarks(
+                user, requests=options['requests'], concurrency=options['concurrency'], latency=options['latency'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        benchmarks.write_results(
+            options['output'], results,
+            expenses=options['expenses'], seed=options['seed'], requests=options['requests'],
+            concurrency=options['concurrency'], latency=options['latency'],
+        )
+        self.stdout.write(f"{'case':<20}{'wall ms':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, stats in results.items():
+            p50, p95 = stats.get('p50_ms'), stats.get('p95_ms')
+            latencies = f"{p50:>10.2f}{p95:>10.2f}" if p50 is not None else f"{'-':>10}{'-':>10}"
+            self.stdout.write(f"{name:<20}{stats['wall_ms']:>10.1f}{stats['per_second']:>10.1f}{latencies}")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            old = benchmarks.load_results(options['compare'])
+            new = benchmarks.load_results(options['output'])
+            self.stdout.write(f"\nCompared with {options['compare']} ({old['environment'].get('commit')}):")
+            for name, before, after, change in benchmarks.compare_results(old, new, metric='wall_ms'):
+                self.stdout.write(f"{name:<20}{before:>10.2f}{after:>10.2f}{change:>+9.1f}%")
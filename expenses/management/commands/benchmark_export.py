@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from expenses import benchmarks, columnar
+from expenses.sampledata import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the CSV, Parquet and Arrow exports of one user's history in a throwaway test "
+        "database: encode time, decode time and file size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expenses', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--output', default='bench_results_export.json')
+        parser.add_argument('--compare', help="A previous results file to compare against.")
+
+    def handle(self, *args, **options):
+        if not columnar.pyarrow_available():
+            raise CommandError("pyarrow is not installed.")
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(f"Generating {options['expenses']} expenses...")
+            user, = generate(users=1, expenses_per_user=options['expenses'], days=3650, seed=options['seed'])
+            results = benchmarks.run_export_benchmarks(
+                user, iterations=options['iterations'], warmup=options['warmup'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        benchmarks.write_results(
+            options['output'], results, expenses=options['expenses'], seed=options['seed'],
+            iterations=options['iterations'],
+        )
+        self.stdout.write(f"{'case':<16}{'p50 ms':>10}{'p95 ms':>10}{'size KB':>10}")
+        for name, stats in results.items():
+            size = f"{stats['size_bytes'] / 1024:>10.0f}" if 'size_bytes' in stats else f"{'':>10}"
+            self.stdout.write(f"{name:<16}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{size}")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            old = benchmarks.load_results(options['compare'])
+            new = benchmarks.load_results(options['output'])
+            self.stdout.write(f"\nCompared with {options['compare']} ({old['environment'].get('commit')}):")
+            for name, before, after, change in benchmarks.compare_results(old, new):
+                self.stdout.write(f"{name:<16}{before:>10.2f}{after:>10.2f}{change:>+9.1f}%")
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from expenses import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Measures start-up cost: wall time and peak RSS of fresh `manage.py check` and project-import processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--output', default='bench_results_startup.json')
+        parser.add_argument('--compare', help="A previous results file to compare against.")
+
+    def handle(self, *args, **options):
+        results = benchmarks.run_startup_benchmarks(settings.BASE_DIR, runs=options['runs'])
+        benchmarks.write_results(options['output'], results, runs=options['runs'])
+
+        self.stdout.write(f"{'case':<20}{'p50 ms':>10}{'p95 ms':>10}{'max RSS MB':>12}")
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<20}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['max_rss_kb'] / 1024:>12.1f}"
+            )
+        google = results['project_import']['google_loaded']
+        self.stdout.write(f"Google client libraries imported at start-up: {'yes' if google else 'no'}")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            old = benchmarks.load_results(options['compare'])
+            new = benchmarks.load_results(options['output'])
+            self.stdout.write(f"\nCompared with {options['compare']} ({old['environment'].get('commit')}):")
+            for name, before, after, change in benchmarks.compare_results(old, new):
+                self.stdout.write(f"{name:<20}{before:>10.1f}{after:>10.1f}{change:>+9.1f}%")
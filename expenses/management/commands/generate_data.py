@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from expenses.sampledata import PASSWORD, generate
+
+
+class Command(BaseCommand):
+    help = "Fills the database with synthetic users and expenses for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--expenses', type=int, default=1000, help="Expenses per user.")
+        parser.add_argument('--days', type=int, default=730, help="How far back the history goes.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench', help="Username prefix, e.g. bench0, bench1, ...")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = generate(
+                users=options['users'],
+                expenses_per_user=options['expenses'],
+                days=options['days'],
+                seed=options['seed'],
+                prefix=options['prefix'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users with {options['expenses']} expenses each "
+            f"in {time.perf_counter() - started:.1f}s (password: {PASSWORD})."
+        ))
@@ -0,0 +1,54 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.imports import DEFAULT_BATCH_SIZE, DEFAULT_OFX_CATEGORY, import_expenses
+
+
+class Command(BaseCommand):
+    help = "Imports expenses for a user from a CSV (as written by the CSV export) or OFX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help="Detected from the file when omitted.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per transaction.")
+        parser.add_argument('--no-create-categories', action='store_true', help="Reject rows with unknown categories.")
+        parser.add_argument('--ofx-category', default=DEFAULT_OFX_CATEGORY, help="Category for OFX transactions.")
+        parser.add_argument('--errors', help="Write the per-row error report to this CSV file.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        try:
+            with open(options['path'], 'rb') as f:
+                result = import_expenses(
+                    user, f, file_format=options['format'], name=options['path'],
+                    batch_size=options['batch_size'],
+                    create_categories=not options['no_create_categories'],
+                    ofx_category=options['ofx_category'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Line', 'Error'])
+                writer.writerows(result.errors)
+        else:
+            for line, message in result.errors[:20]:
+                self.stderr.write(f"line {line}: {message}")
+            if result.failed > 20:
+                self.stderr.write(f"... and {result.failed - 20} more errors (use --errors to save them all)")
+
+        if result.categories_created:
+            self.stdout.write(f"Created categories: {', '.join(result.categories_created)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} expenses, {result.failed} rows rejected "
+            f"in {result.elapsed:.2f}s ({result.rows_per_second:.0f} rows/s)."
+        ))
@@ -0,0 +1,35 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.recurring import DEFAULT_BATCH_SIZE, MAX_OCCURRENCES_PER_RUN, materialize_due
+
+
+class Command(BaseCommand):
+    help = "Creates the expenses of every due recurring-expense occurrence, for all users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Create occurrences up to this date (YYYY-MM-DD, defaults to today).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--max-per-rule', type=int, default=MAX_OCCURRENCES_PER_RUN,
+            help="Occurrences created per rule in one run; rules further behind continue next run.",
+        )
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be in YYYY-MM-DD format.")
+
+        stats = materialize_due(today, batch_size=options['batch_size'], max_per_rule=options['max_per_rule'])
+        self.stdout.write(
+            f"{stats['created']} expenses created from {stats['rules']} due rules "
+            f"in {stats['batches']} batches ({stats['elapsed_seconds']:.2f}s)"
+        )
+        if stats['behind']:
+            self.stdout.write(f"{stats['behind']} rules still have occurrences to create; run again.")
+        if stats['conflicts']:
+            self.stderr.write(f"{stats['conflicts']} batches skipped: another run created them first.")
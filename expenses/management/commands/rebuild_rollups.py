@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.rollups import find_mismatches, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the MonthlyCategoryTotal rollup table from raw expenses and verifies it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild rollups for this username.")
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare the rollups with raw expenses; exit with an error on drift.",
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        if not options['check']:
+            written = rebuild_rollups(user)
+            self.stdout.write(f"Rebuilt {written} rollup rows.")
+
+        mismatches = find_mismatches(user)
+        for (user_id, category_id, month), expected, stored in mismatches:
+            self.stderr.write(
+                f"user={user_id} category={category_id} month={month:%Y-%m}: "
+                f"expected {expected[0]} ({expected[1]} rows), stored {stored[0]} ({stored[1]} rows)"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} rollup rows disagree with raw expenses.")
+        self.stdout.write(self.style.SUCCESS("Rollups match raw expenses."))
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.budgets import reconcile
+
+
+class Command(BaseCommand):
+    help = "Rolls budget counters forward to the current month and fixes any that drifted from raw expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only reconcile this username's budgets.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        fixed = reconcile(user)
+        for budget, counted, actual in fixed:
+            self.stdout.write(
+                f"user={budget.user_id} category={budget.category.name} month={budget.month:%Y-%m}: "
+                f"counted {counted}, actual {actual}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Fixed {len(fixed)} budget counter(s)."))
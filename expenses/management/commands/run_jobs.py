@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from expenses.jobs import arun_pending, run_pending
+
+
+class Command(BaseCommand):
+    help = "Processes queued background jobs (report emails, Google Drive uploads)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run every due job, then exit.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--max-jobs', type=int, help="Exit after processing this many jobs.")
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help="Run up to this many jobs at once on an event loop, awaiting async handlers.",
+        )
+
+    def handle(self, *args, **options):
+        remaining = options['max_jobs']
+        while True:
+            if options['concurrency'] > 1:
+                processed = asyncio.run(arun_pending(options['concurrency'], limit=remaining))
+            else:
+                processed = run_pending(limit=remaining)
+            if processed:
+                self.stdout.write(f"Processed {processed} job(s).")
+            if remaining is not None:
+                remaining -= processed
+                if remaining <= 0:
+                    break
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from expenses.digest import DEFAULT_BATCH_SIZE, send_monthly_digest
+from expenses.periods import resolve_period
+
+
+class Command(BaseCommand):
+    help = "Emails the monthly expense report to every user subscribed to the digest."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help="Report year (defaults to last month's).")
+        parser.add_argument('--month', type=int, help="Report month (defaults to last month).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Render the emails without sending them.")
+
+    def handle(self, *args, **options):
+        if options['year'] or options['month']:
+            if not (options['year'] and options['month'] and 1 <= options['month'] <= 12):
+                raise CommandError("Pass both --year and --month (1-12).")
+            year, month = options['year'], options['month']
+        else:
+            today = timezone.now().date()
+            year, month = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+        period = resolve_period({'year': year, 'month': month})
+
+        stats = send_monthly_digest(period, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        self.stdout.write(
+            f"{period.year}-{period.month:02d}: {stats['sent']} sent, {stats['skipped']} skipped "
+            f"({stats['users']} users in {stats['batches']} batches)"
+        )
+        self.stdout.write(
+            f"{stats['elapsed_seconds']:.2f}s total, {stats['emails_per_second']:.1f} emails/s "
+            f"(query {stats['query_seconds']:.2f}s, render {stats['render_seconds']:.2f}s, "
+            f"send {stats['send_seconds']:.2f}s)"
+        )
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from expenses import benchmarks
+from expenses.models import Category
+from expenses.rollups import find_mismatches
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent writers (add / edit / delete through the views) against a throwaway "
+        "copy of the configured database and reports lock errors. With --baseline on SQLite, "
+        "runs the same load with Django's stock backend first for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=50, help="Requests per thread.")
+        parser.add_argument('--users', type=int, default=4)
+        parser.add_argument(
+            '--baseline', action='store_true',
+            help="Also run with django.db.backends.sqlite3 and no extra options.",
+        )
+
+    def handle(self, *args, **options):
+        database = connections['default'].settings_dict
+        runs = [('configured', database['ENGINE'], database['OPTIONS'])]
+        if options['baseline']:
+            if connections['default'].vendor != 'sqlite':
+                raise CommandError("--baseline only applies to SQLite.")
+            runs.insert(0, ('stock', 'django.db.backends.sqlite3', {}))
+
+        for label, engine, engine_options in runs:
+            results = self.run(label, engine, engine_options, options)
+            self.stdout.write(
+                f"{label:<12}{results['writes']:>7} writes{results['locked']:>6} locked"
+                f"{results['failed']:>6} failed{results['wall_ms']:>10.0f} ms"
+            )
+
+    def run(self, label, engine, engine_options, options):
+        database = connections['default'].settings_dict
+        saved = database['ENGINE'], database['OPTIONS'], database['TEST'].get('NAME')
+        database['ENGINE'], database['OPTIONS'] = engine, engine_options
+        # Reconnect through the backend just configured
+        connections.close_all()
+        del connections['default']
+        tmpdir = None
+        if connections['default'].vendor == 'sqlite':
+            # An in-memory test database has no file locking to exercise
+            tmpdir = tempfile.mkdtemp()
+            database['TEST']['NAME'] = os.path.join(tmpdir, 'stress.sqlite3')
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            users = []
+            for i in range(options['users']):
+                user = User.objects.create_user(f'stress{i}', f'stress{i}@example.com', 'stress-password')
+                Category.objects.create(user=user, name='Food')
+                users.append(user)
+            results = benchmarks.run_write_stress(users, threads=options['threads'], writes=options['writes'])
+            if find_mismatches():
+                self.stderr.write(f"{label}: rollups disagree with the expenses after the run")
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            database['ENGINE'], database['OPTIONS'], database['TEST']['NAME'] = saved
+            del connections['default']
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+        return results
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["user", "-date", "id"], name="expense_user_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["user", "category", "date"], name="expense_user_cat_date_idx"),
+        ),
+    ]
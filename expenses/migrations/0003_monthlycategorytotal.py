@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    Expense = apps.get_model("expenses", "Expense")
+    MonthlyCategoryTotal = apps.get_model("expenses", "MonthlyCategoryTotal")
+    rows = (
+        Expense.objects.order_by()
+        .annotate(month=TruncMonth("date"))
+        .values("user_id", "category_id", "month")
+        .annotate(total=Sum("amount"), count=Count("id"))
+    )
+    MonthlyCategoryTotal.objects.bulk_create(
+        (MonthlyCategoryTotal(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("expenses", "0002_expense_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyCategoryTotal",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField(help_text="First day of the month")),
+                ("total", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("category", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="expenses.category")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["user", "-month"], name="rollup_user_month_idx")],
+                "unique_together": {("user", "category", "month")},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("expenses", "0004_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DigestSubscription",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("is_active", models.BooleanField(default=True)),
+                ("last_sent_month", models.DateField(blank=True, null=True)),
+                ("user", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="digest_subscription", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Full-text search index over Expense.description; see expenses/search.py.
+
+from django.db import migrations
+
+from expenses import search
+
+SEARCH_INDEX_NAME = "expense_description_search_idx"
+
+
+def search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector("description", config=search.SEARCH_CONFIG), name=SEARCH_INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        search.install_sqlite_index(schema_editor.connection)
+    elif vendor == "postgresql":
+        schema_editor.add_index(apps.get_model("expenses", "Expense"), search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for statement in search.SQLITE_DROP_SQL:
+            schema_editor.execute(statement)
+    elif vendor == "postgresql":
+        schema_editor.remove_index(apps.get_model("expenses", "Expense"), search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0005_digestsubscription"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("expenses", "0006_expense_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Budget",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("month", models.DateField(help_text="First day of the month `spent` counts")),
+                ("spent", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("category", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="budget", to="expenses.category")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
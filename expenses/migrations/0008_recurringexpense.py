@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("expenses", "0007_budget"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecurringExpense",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("description", models.TextField(blank=True, null=True)),
+                ("unit", models.CharField(choices=[("day", "Days"), ("week", "Weeks"), ("month", "Months"), ("year", "Years")], default="month", max_length=5)),
+                ("interval", models.PositiveIntegerField(default=1)),
+                ("cron", models.CharField(blank=True, help_text="Cron schedule (minute hour day month weekday) used instead of the interval; only the date fields matter", max_length=100)),
+                ("start_date", models.DateField(default=django.utils.timezone.now)),
+                ("end_date", models.DateField(blank=True, null=True)),
+                ("next_date", models.DateField(blank=True, null=True)),
+                ("is_active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="recurringexpense",
+            name="category",
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="expenses.category"),
+        ),
+        migrations.AddField(
+            model_name="recurringexpense",
+            name="user",
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name="expense",
+            name="recurring",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="occurrences", to="expenses.recurringexpense"),
+        ),
+        migrations.AddConstraint(
+            model_name="expense",
+            constraint=models.UniqueConstraint(fields=("recurring", "date"), name="expense_recurring_date_uniq"),
+        ),
+        migrations.AddIndex(
+            model_name="recurringexpense",
+            index=models.Index(fields=["is_active", "next_date", "id"], name="recurring_due_idx"),
+        ),
+    ]
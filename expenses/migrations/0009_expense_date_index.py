@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0008_recurringexpense"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["date"], name="expense_date_idx"),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0009_expense_date_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="expense",
+            name="expense_user_date_id_idx",
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["user", "-date", "-id"], name="expense_user_date_id_idx"),
+        ),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 # Create your models here.
 
+#the largest id a BigAutoField holds; parsed ids beyond it cannot be bound as query parameters
+MAX_ID = 2 ** 63 - 1
+
 class Category(models.Model):
     #Model to represent expense categories. Each category is owned by a specific user.
     name = models.CharField(max_length=100)
@@ -26,9 +29,184 @@ class Expense(models.Model):
     description = models.TextField(blank=True, null=True)
     date = models.DateField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
+    #set on expenses created from a recurring rule, one per occurrence date
+    recurring = models.ForeignKey(
+        'RecurringExpense', on_delete=models.SET_NULL, blank=True, null=True, related_name='occurrences'
+    )
 
     def __str__(self):
         return f"{self.amount} - {self.category.name} on {self.date}"
+
+    def save(self, *args, **kwargs):
+        #post_save applies the rollup and budget deltas (see signals.py): commit them with the row or not at all.
+        #delete() needs no override, Django already sends post_delete inside the deleting transaction.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
     class Meta:
         #Orders expense by date, most recent first
-        ordering = ['-date']
\ No newline at end of file
+        ordering = ['-date']
+        indexes = [
+            # dashboard keyset pages and monthly range scans for one user
+            models.Index(fields=['user', '-date', '-id'], name='expense_user_date_id_idx'),
+            # per-category breakdowns over a date range
+            models.Index(fields=['user', 'category', 'date'], name='expense_user_cat_date_idx'),
+            # admin date hierarchy ranges and first/last dates across all users
+            models.Index(fields=['date'], name='expense_date_idx'),
+        ]
+        constraints = [
+            # a re-run of the recurring scheduler can never create an occurrence twice
+            models.UniqueConstraint(fields=['recurring', 'date'], name='expense_recurring_date_uniq'),
+        ]
+
+class RecurringExpense(models.Model):
+    #A rule for an expense that repeats (rent, subscriptions), either every `interval` units from `start_date`
+    #or on a cron-style schedule. `manage.py materialize_recurring` creates the Expense rows for every
+    #occurrence up to today; see expenses/recurring.py.
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    YEAR = 'year'
+    UNIT_CHOICES = [
+        (DAY, 'Days'),
+        (WEEK, 'Weeks'),
+        (MONTH, 'Months'),
+        (YEAR, 'Years'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.TextField(blank=True, null=True)
+    unit = models.CharField(max_length=5, choices=UNIT_CHOICES, default=MONTH)
+    interval = models.PositiveIntegerField(default=1)
+    cron = models.CharField(
+        max_length=100, blank=True,
+        help_text="Cron schedule (minute hour day month weekday) used instead of the interval; only the date fields matter",
+    )
+    start_date = models.DateField(default=timezone.now)
+    end_date = models.DateField(blank=True, null=True)
+    #first occurrence not created yet; empty until the scheduler first sees the rule
+    next_date = models.DateField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the scheduler's scan for due rules
+            models.Index(fields=['is_active', 'next_date', 'id'], name='recurring_due_idx'),
+        ]
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .recurring import MAX_INTERVAL, CronSchedule
+
+        if not 1 <= (self.interval or 0) <= MAX_INTERVAL:
+            raise ValidationError({'interval': f"The interval must be between 1 and {MAX_INTERVAL}."})
+        if self.cron:
+            try:
+                CronSchedule(self.cron)
+            except ValueError as e:
+                raise ValidationError({'cron': str(e)})
+        if self.end_date and self.start_date and self.end_date < self.start_date:
+            raise ValidationError({'end_date': "The end date is before the start date."})
+
+    def __str__(self):
+        schedule = self.cron or f"every {self.interval} {self.unit}(s)"
+        return f"{self.amount} - {self.category.name} {schedule}"
+
+
+class MonthlyCategoryTotal(models.Model):
+    #Rollup of expenses per user, category and month, kept up to date by the signals in expenses/signals.py.
+    #Reports read these rows instead of aggregating raw expenses.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    month = models.DateField(help_text="First day of the month")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "category", "month")
+        indexes = [
+            models.Index(fields=['user', '-month'], name='rollup_user_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category.name} {self.month:%Y-%m}: {self.total}"
+
+
+class Job(models.Model):
+    #A unit of background work (report emails, Drive uploads) processed by `manage.py run_jobs`.
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # the worker's "next due job" lookup
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+
+class DigestSubscription(models.Model):
+    #Opt-in to the monthly report email sent by `manage.py send_monthly_digest`.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='digest_subscription')
+    is_active = models.BooleanField(default=True)
+    #Month of the last digest delivered, so an interrupted run can resume without re-sending
+    last_sent_month = models.DateField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Digest for {self.user.username} ({'active' if self.is_active else 'paused'})"
+
+
+class Budget(models.Model):
+    #A monthly spending limit for one category. `spent` is a running counter of the category's spend in
+    #`month`, updated with F() expressions by the signals in expenses/signals.py (see expenses/budgets.py).
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, related_name='budget')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    month = models.DateField(help_text="First day of the month `spent` counts")
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.category.name}: {self.spent} of {self.amount} ({self.month:%Y-%m})"
+
+    @property
+    def remaining(self):
+        return self.amount - self.spent
+
+    @property
+    def percent(self):
+        return min(int(self.spent * 100 / self.amount), 100) if self.amount else 100
+
+    @property
+    def is_over(self):
+        return self.spent > self.amount
@@ -0,0 +1,115 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import MAX_ID
+
+# Cursor (keyset) pagination over expenses ordered newest first by (date, id).
+# Unlike OFFSET pagination every page is an index range scan, so page 500 costs
+# the same as page 1.
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+
+def get_page_size(value=None):
+    """Returns a sane page size from a request value, falling back to settings."""
+    default = getattr(settings, 'EXPENSES_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    try:
+        size = int(value) if value not in (None, '') else default
+    except (ValueError, TypeError):
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(expense):
+    """Encodes the position of the last expense on a page, e.g. '2025-09-19.42'."""
+    return f"{expense.date.isoformat()}.{expense.id}"
+
+
+def decode_cursor(cursor):
+    """Decodes a cursor into a (date, id) tuple, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        date_part, id_part = cursor.split('.', 1)
+        position = date.fromisoformat(date_part), int(id_part)
+    except (ValueError, TypeError):
+        return None
+    # An id no query can bind falls back to the first page
+    return position if 0 < position[1] <= MAX_ID else None
+
+
+def paginate_expenses(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns (expenses, next_cursor) for the page that follows `cursor`.
+    next_cursor is None when there are no more rows.
+    """
+    queryset = queryset.select_related('category').order_by('-date', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        last_date, last_id = position
+        # The OR alone cannot bound an index scan; date__lte starts it at the cursor's date
+        queryset = queryset.filter(date__lte=last_date).filter(Q(date__lt=last_date) | Q(date=last_date, id__lt=last_id))
+
+    # Fetch one extra row to know whether another page exists without a COUNT(*)
+    expenses = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(expenses) > page_size:
+        expenses = expenses[:page_size]
+        next_cursor = encode_cursor(expenses[-1])
+    return expenses, next_cursor
+
+
+# The admin changelist pages with OFFSET and needs a total for its page links,
+# but an exact COUNT(*) over millions of rows reads a whole index on every
+# page load. EstimatedCountPaginator counts at most EXPENSES_ADMIN_COUNT_LIMIT
+# rows; beyond that an unfiltered table reports the database's own row
+# estimate (PostgreSQL's planner statistics, SQLite's ANALYZE results) and a
+# filtered one reports the limit, so the changelist links its first pages.
+
+DEFAULT_ADMIN_COUNT_LIMIT = 10_000
+
+
+def estimated_row_count(model, using='default'):
+    """Returns the database's estimate of a table's row count, or None if it has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            if 'sqlite_stat1' not in connection.introspection.table_names(cursor):
+                return None
+            # Each index's row starts with the table's row count
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    # sqlite_stat1 stats are "<rows> <rows per distinct key>..."; PostgreSQL says -1 before the first ANALYZE
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """A Paginator whose count is exact up to a limit and estimated beyond it."""
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'EXPENSES_ADMIN_COUNT_LIMIT', DEFAULT_ADMIN_COUNT_LIMIT)
+        queryset = self.object_list
+        # COUNT(*) over a LIMITed subquery stops reading once it has enough rows
+        counted = queryset.order_by().values('pk')[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None:
+                return max(estimate, counted)
+        return limit
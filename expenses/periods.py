@@ -0,0 +1,78 @@
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+# Reports filter expenses by half-open date ranges ([start, end)) rather than
+# date__year / date__month lookups, which compile to EXTRACT()/strftime()
+# expressions that cannot use the (user, date) index.
+
+Period = namedtuple('Period', ['year', 'month', 'start', 'end'])
+
+
+def month_range(year, month):
+    """Returns the (start, end) dates of a month, end being the first day of the next month."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def year_range(year):
+    """Returns the (start, end) dates of a year, end being January 1st of the next year."""
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def resolve_period(params, today=None):
+    """
+    Builds a monthly Period from request parameters (`year` and `month`),
+    falling back to the current month when they are missing or invalid.
+    """
+    today = today or timezone.now().date()
+    try:
+        year = int(params.get('year', today.year))
+        month = int(params.get('month', today.month))
+        start, end = month_range(year, month)
+    except (ValueError, TypeError, OverflowError):
+        year, month = today.year, today.month
+        start, end = month_range(year, month)
+    return Period(year, month, start, end)
+
+
+def period_filter(period):
+    """Returns queryset filter kwargs selecting the expenses inside a period."""
+    return {'date__gte': period.start, 'date__lt': period.end}
+
+
+DateRange = namedtuple('DateRange', ['start', 'end', 'label'])
+
+
+def resolve_range(params, today=None):
+    """
+    Builds an export DateRange from request parameters. Supports `range=all`,
+    an inclusive `start`/`end` pair (YYYY-MM-DD, either may be omitted) and
+    falls back to the `year`/`month` period otherwise. A None bound is open.
+    """
+    if params.get('range') == 'all':
+        return DateRange(None, None, 'all')
+    if params.get('start') or params.get('end'):
+        try:
+            start = date.fromisoformat(params['start']) if params.get('start') else None
+            last = date.fromisoformat(params['end']) if params.get('end') else None
+            end = last + timedelta(days=1) if last else None
+        except (ValueError, OverflowError):
+            pass
+        else:
+            label = f"{start.isoformat() if start else 'start'}_{last.isoformat() if last else 'end'}"
+            return DateRange(start, end, label)
+    period = resolve_period(params, today)
+    return DateRange(period.start, period.end, f"{period.year}-{period.month:02d}")
+
+
+def range_filter(date_range):
+    """Returns queryset filter kwargs for a DateRange, skipping open bounds."""
+    filters = {}
+    if date_range.start:
+        filters['date__gte'] = date_range.start
+    if date_range.end:
+        filters['date__lt'] = date_range.end
+    return filters
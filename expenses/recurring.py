@@ -0,0 +1,238 @@
+import calendar
+import logging
+import time
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Expense, RecurringExpense
+from .rollups import add_delta
+from .signals import expenses_bulk_changed
+
+logger = logging.getLogger(__name__)
+
+# Recurring expenses. A rule repeats every `interval` days / weeks / months /
+# years from its start date, or follows a cron expression of which only the
+# day, month and weekday fields are used (expenses are dated by day).
+#
+# `manage.py materialize_recurring` walks the due rules in id order, a batch
+# at a time. Each batch is one transaction: the occurrences up to today are
+# bulk-inserted and the rules' next_date moved past them, so an interrupted
+# run resumes where it stopped and a re-run finds nothing left to create.
+# Occurrences that already exist (a reactivated rule restarts from its start
+# date) are skipped. A unique (recurring, date) constraint on Expense guards
+# against two runs racing on the same rules.
+
+DEFAULT_BATCH_SIZE = 500
+# Occurrences created per rule and run, so one long-dormant daily rule cannot
+# blow the batch up; the rest are created by the next runs
+MAX_OCCURRENCES_PER_RUN = 366
+# How far ahead a cron schedule is searched (covers February 29th)
+CRON_HORIZON_DAYS = 366 * 8
+# Largest `interval` a rule accepts, in its unit
+MAX_INTERVAL = 1000
+
+_CRON_NAMES = {
+    'month': ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'],
+    'weekday': ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'],
+}
+
+
+def _cron_field(value, low, high, names=None):
+    """Expands one cron field ('*', '1,15', '1-5', '*/2', 'mon-fri') into a set of numbers."""
+    values = set()
+    for part in value.lower().split(','):
+        spec, _, step = part.partition('/')
+        if names:
+            for index, name in enumerate(names):
+                spec = spec.replace(name, str(index + low))
+        if spec == '*':
+            start, end = low, high
+        elif '-' in spec:
+            start, end = (int(bound) for bound in spec.split('-', 1))
+        else:
+            start = end = int(spec)
+        step = int(step) if step else 1
+        if not (low <= start <= end <= high) or step < 1:
+            raise ValueError(f"'{part}' is out of range {low}-{high}.")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """The date part of a 5-field cron expression (minute hour day month weekday)."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("A cron schedule has 5 fields: minute hour day month weekday.")
+        try:
+            self.days = _cron_field(fields[2], 1, 31)
+            self.months = _cron_field(fields[3], 1, 12, _CRON_NAMES['month'])
+            weekdays = _cron_field(fields[4], 0, 7, _CRON_NAMES['weekday'])
+        except ValueError as e:
+            raise ValueError(f"Invalid cron schedule '{expression}': {e}")
+        # Cron counts Sunday as 0 (or 7), Python as 6
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        # As in cron, when both day and weekday are restricted either one matches
+        self.any_day = fields[2].startswith('*')
+        self.any_weekday = fields[4].startswith('*')
+
+    def matches(self, day):
+        if day.month not in self.months:
+            return False
+        if self.any_day or self.any_weekday:
+            return day.day in self.days and day.weekday() in self.weekdays
+        return day.day in self.days or day.weekday() in self.weekdays
+
+    def next_on_or_after(self, day):
+        for offset in range(CRON_HORIZON_DAYS):
+            candidate = day + timedelta(days=offset)
+            if self.matches(candidate):
+                return candidate
+        return None
+
+
+def _add_months(day, months, anchor_day):
+    index = day.year * 12 + day.month - 1 + months
+    year, month = index // 12, index % 12 + 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+class Schedule:
+    """Computes a rule's occurrences; month and year steps keep the start date's day, clamped to short months."""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.cron = CronSchedule(rule.cron) if rule.cron else None
+
+    def first(self):
+        if self.cron:
+            try:
+                return self.cron.next_on_or_after(self.rule.start_date)
+            except OverflowError:
+                return None
+        return self.rule.start_date
+
+    def after(self, day):
+        """The occurrence after `day`, or None once the schedule runs past the last representable date."""
+        try:
+            return self._after(day)
+        except (ValueError, OverflowError):
+            return None
+
+    def _after(self, day):
+        rule = self.rule
+        if self.cron:
+            return self.cron.next_on_or_after(day + timedelta(days=1))
+        step = max(rule.interval, 1)
+        if rule.unit == RecurringExpense.DAY:
+            return day + timedelta(days=step)
+        if rule.unit == RecurringExpense.WEEK:
+            return day + timedelta(weeks=step)
+        months = step * 12 if rule.unit == RecurringExpense.YEAR else step
+        return _add_months(day, months, rule.start_date.day)
+
+    def occurrences(self, start, until, limit):
+        """Returns (occurrence dates from `start` up to `until`, at most `limit`, next date or None)."""
+        dates, day = [], start
+        while day is not None and day <= until and len(dates) < limit:
+            dates.append(day)
+            day = self.after(day)
+        return dates, day
+
+
+def due_rules(today):
+    return RecurringExpense.objects.filter(is_active=True).filter(
+        Q(next_date__lte=today) | Q(next_date__isnull=True)
+    ).order_by('id')
+
+
+def _existing_occurrences(starts):
+    """Returns the (rule id, date) pairs already created on or after each rule's start."""
+    if not starts:
+        return set()
+    # One condition for the whole batch: an OR term per rule overflows SQLite's expression depth on large batches
+    rows = Expense.objects.filter(recurring_id__in=starts, date__gte=min(starts.values()))
+    return {(rule_id, day) for rule_id, day in rows.values_list('recurring_id', 'date') if day >= starts[rule_id]}
+
+
+def _materialize_batch(rules, today, max_per_rule, batch_size, stats):
+    schedules, starts = {}, {}
+    for rule in rules:
+        try:
+            schedules[rule.id] = Schedule(rule)
+            starts[rule.id] = rule.next_date or schedules[rule.id].first()
+        except ValueError as e:
+            logger.warning("Recurring expense %s disabled: %s", rule.id, e)
+            rule.is_active, rule.next_date = False, None
+    # A reactivated rule starts over from its start date: skip the occurrences it already has
+    existing = _existing_occurrences({rule_id: start for rule_id, start in starts.items() if start})
+
+    expenses, deltas = [], {}
+    for rule in rules:
+        if rule.id not in schedules:
+            continue
+        schedule, start = schedules[rule.id], starts[rule.id]
+        until = min(today, rule.end_date) if rule.end_date else today
+        dates, following = schedule.occurrences(start, until, max_per_rule) if start else ([], None)
+        for day in dates:
+            if (rule.id, day) in existing:
+                continue
+            expenses.append(Expense(
+                user_id=rule.user_id, category_id=rule.category_id, amount=rule.amount,
+                description=rule.description, date=day, recurring=rule,
+            ))
+            add_delta(deltas.setdefault(rule.user_id, {}), rule.category_id, day, rule.amount, 1)
+        rule.next_date = following
+        if following is None or (rule.end_date and following > rule.end_date):
+            # The schedule has ended
+            rule.is_active, rule.next_date = False, None
+        elif following <= today:
+            stats['behind'] += 1
+
+    try:
+        with transaction.atomic():
+            Expense.objects.bulk_create(expenses, batch_size=batch_size)
+            # Rules of a batch share few next dates: one UPDATE per date beats bulk_update's CASE per row
+            updates = {}
+            for rule in rules:
+                updates.setdefault((rule.next_date, rule.is_active), []).append(rule.id)
+            for (next_date, is_active), ids in updates.items():
+                RecurringExpense.objects.filter(id__in=ids).update(next_date=next_date, is_active=is_active)
+            for user_id, user_deltas in deltas.items():
+                expenses_bulk_changed.send(sender=Expense, user_id=user_id, deltas=user_deltas)
+    except IntegrityError:
+        # Another run created some of these occurrences first; it owns the batch
+        logger.warning("Recurring batch of rules %s-%s skipped: occurrences already exist", rules[0].id, rules[-1].id)
+        stats['conflicts'] += 1
+        return
+    stats['created'] += len(expenses)
+
+
+def materialize_due(today=None, batch_size=DEFAULT_BATCH_SIZE, max_per_rule=MAX_OCCURRENCES_PER_RUN):
+    """
+    Creates the expenses of every due occurrence up to `today` for all users
+    and returns statistics. Memory is bounded by the batch size: each batch
+    reads at most `batch_size` rules and creates at most `max_per_rule`
+    occurrences for each. Rules still behind afterwards are counted in
+    'behind' and continue on the next run.
+    """
+    today = today or timezone.now().date()
+    stats = {'rules': 0, 'created': 0, 'batches': 0, 'behind': 0, 'conflicts': 0}
+    started = time.perf_counter()
+    pending = due_rules(today)
+    last_id = 0
+    while True:
+        rules = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not rules:
+            break
+        last_id = rules[-1].id
+        _materialize_batch(rules, today, max_per_rule, batch_size, stats)
+        stats['batches'] += 1
+        stats['rules'] += len(rules)
+        logger.info("Recurring batch %s: %s rules, %s expenses so far", stats['batches'], len(rules), stats['created'])
+    stats['elapsed_seconds'] = time.perf_counter() - started
+    return stats
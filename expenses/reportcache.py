@@ -0,0 +1,126 @@
+import json
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+
+# Cache of the computed report context per user and month.
+#
+# Entries are never deleted; each user/month (and each user's year list) has a
+# version number stored in the cache, and invalidating means writing a new
+# version so old entries become unreachable and simply expire. Versions are
+# nanosecond timestamps of the last change, which also gives Last-Modified,
+# and an evicted version key can never resurrect a stale entry.
+
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+
+def get_cache():
+    return caches[getattr(settings, 'EXPENSES_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'EXPENSES_REPORT_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _month_version_key(user_id, month):
+    return f'expenses:report:v:{user_id}:{month:%Y-%m}'
+
+
+def _years_version_key(user_id):
+    return f'expenses:years:v:{user_id}'
+
+
+def _data_version_key(user_id):
+    return f'expenses:data:v:{user_id}'
+
+
+def _history_version_key(user_id):
+    return f'expenses:history:v:{user_id}'
+
+
+def _get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key) or time.time_ns()
+    return version
+
+
+def _bump(keys):
+    get_cache().set_many({key: time.time_ns() for key in keys}, timeout=None)
+
+
+def invalidate(user_id, months=(), years=False):
+    """
+    Drops the cached reports for some of a user's months (and optionally their
+    year list), and moves on the user's data_version() and, when a month
+    before the current one changed, history_version(). Invalidates immediately
+    and again once the surrounding transaction commits, so nothing cached in
+    between can outlive the change.
+    """
+    keys = [_month_version_key(user_id, rollups.month_start(month)) for month in months]
+    if years:
+        keys.append(_years_version_key(user_id))
+    keys.append(_data_version_key(user_id))
+    current = rollups.month_start(timezone.now().date())
+    if any(rollups.month_start(month) < current for month in months):
+        keys.append(_history_version_key(user_id))
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def data_version(user_id):
+    """A version that changes whenever any of the user's expenses or categories change."""
+    return _get_version(_data_version_key(user_id))
+
+
+def history_version(user_id):
+    """A version that changes whenever the user's expenses before the current month change."""
+    return _get_version(_history_version_key(user_id))
+
+
+def _available_years(user):
+    version = _get_version(_years_version_key(user.id))
+    key = f'expenses:years:{user.id}'
+    cache = get_cache()
+    years = cache.get(key, version=version)
+    if years is None:
+        years = rollups.available_years(user)
+        cache.set(key, years, timeout=get_timeout(), version=version)
+    return years, version
+
+
+def get_report(user, period):
+    """
+    Returns the report context for a monthly period: total_expenses,
+    category_summary, chart_labels, chart_data, available_years and
+    `version`, a (month, years) pair identifying the data it was built from.
+    """
+    cache = get_cache()
+    month_version = _get_version(_month_version_key(user.id, period.start))
+    key = f'expenses:report:{user.id}:{period.start:%Y-%m}'
+    report = cache.get(key, version=month_version)
+    if report is None:
+        category_summary, total_expenses = rollups.category_summary(user, period)
+        report = {
+            'total_expenses': total_expenses,
+            'category_summary': category_summary,
+            'chart_labels': json.dumps([item['category__name'] for item in category_summary]),
+            'chart_data': json.dumps([float(item['total']) for item in category_summary]),
+        }
+        cache.set(key, report, timeout=get_timeout(), version=month_version)
+
+    available_years, years_version = _available_years(user)
+    return {**report, 'available_years': list(available_years), 'version': (month_version, years_version)}
+
+
+def last_modified(version):
+    """Converts a report version back into the datetime of the change it records."""
+    return datetime.fromtimestamp(max(version) / 1e9, tz=dt_timezone.utc)
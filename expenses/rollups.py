@@ -0,0 +1,206 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Expense, MonthlyCategoryTotal
+
+CENT = Decimal('0.01')
+
+
+def month_start(value):
+    """Returns the first day of the month containing a date (or datetime)."""
+    if isinstance(value, datetime):
+        value = value.date()
+    return date(value.year, value.month, 1)
+
+
+def apply_delta(user_id, category_id, month, amount, count):
+    """
+    Adds `amount` and `count` to one rollup row, creating it when an expense
+    lands in a new (category, month) and removing it once it becomes empty.
+    """
+    key = {'user_id': user_id, 'category_id': category_id, 'month': month_start(month)}
+    rows = MonthlyCategoryTotal.objects.filter(**key)
+    if rows.update(total=F('total') + amount, count=F('count') + count):
+        if count < 0:
+            rows.filter(count__lte=0).delete()
+        return
+    if count <= 0:
+        # Nothing to subtract from, e.g. the category is being deleted in the same cascade
+        return
+    try:
+        with transaction.atomic():
+            MonthlyCategoryTotal.objects.create(total=amount, count=count, **key)
+    except IntegrityError:
+        # Another request created the row first; fall back to the atomic update
+        rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def raw_totals(user=None):
+    """Aggregates raw expenses into {(user_id, category_id, month): (total, count)}."""
+    expenses = Expense.objects.all() if user is None else Expense.objects.filter(user=user)
+    rows = (
+        expenses.order_by()
+        .annotate(month=TruncMonth('date'))
+        .values('user_id', 'category_id', 'month')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    # SQLite sums decimals as floats, so round back to cents before comparing or storing
+    return {
+        (r['user_id'], r['category_id'], r['month']): (r['total'].quantize(CENT), r['count'])
+        for r in rows
+    }
+
+
+def stored_totals(user=None):
+    """Returns the rollup table as {(user_id, category_id, month): (total, count)}."""
+    rollups = MonthlyCategoryTotal.objects.all() if user is None else MonthlyCategoryTotal.objects.filter(user=user)
+    return {
+        (r.user_id, r.category_id, r.month): (r.total, r.count)
+        for r in rollups.only('user_id', 'category_id', 'month', 'total', 'count')
+    }
+
+
+def rebuild_rollups(user=None, batch_size=1000):
+    """Recomputes the rollup table from raw expenses and returns the number of rows written."""
+    totals = raw_totals(user)
+    with transaction.atomic():
+        rollups = MonthlyCategoryTotal.objects.all() if user is None else MonthlyCategoryTotal.objects.filter(user=user)
+        rollups.delete()
+        MonthlyCategoryTotal.objects.bulk_create(
+            [
+                MonthlyCategoryTotal(user_id=u, category_id=c, month=m, total=total, count=count)
+                for (u, c, m), (total, count) in totals.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+def find_mismatches(user=None):
+    """Returns a list of (key, expected, stored) tuples where the rollups disagree with raw data."""
+    expected = raw_totals(user)
+    stored = stored_totals(user)
+    missing = (Decimal('0'), 0)
+    return [
+        (key, expected.get(key, missing), stored.get(key, missing))
+        for key in sorted(expected.keys() | stored.keys())
+        if expected.get(key, missing) != stored.get(key, missing)
+    ]
+
+
+def _category_summary_rows(user, period):
+    return (
+        MonthlyCategoryTotal.objects.filter(user=user, month__gte=period.start, month__lt=period.end)
+        .values('category__name')
+        .annotate(total=Sum('total'))
+        .order_by('-total')
+    )
+
+
+def category_summary(user, period):
+    """
+    Returns (summary, total) for a period from the rollup table, where summary
+    is a list of {'category__name', 'total'} dicts ordered by total descending.
+    """
+    summary = list(_category_summary_rows(user, period))
+    total = sum((item['total'] for item in summary), Decimal('0'))
+    return summary, total
+
+
+async def acategory_summary(user, period):
+    """category_summary() for async code."""
+    summary = [item async for item in _category_summary_rows(user, period)]
+    total = sum((item['total'] for item in summary), Decimal('0'))
+    return summary, total
+
+
+def available_years(user):
+    """Returns the years the user has expenses in, newest first."""
+    months = MonthlyCategoryTotal.objects.filter(user=user).dates('month', 'year', order='DESC')
+    return [d.year for d in months]
+
+
+def category_summaries(user_ids, period):
+    """
+    Like category_summary() for many users at once, with a single query.
+    Returns {user_id: (summary, total)} for the users that have expenses in the period.
+    """
+    rows = (
+        MonthlyCategoryTotal.objects.filter(user_id__in=user_ids, month__gte=period.start, month__lt=period.end)
+        .values('user_id', 'category__name')
+        .annotate(total=Sum('total'))
+        .order_by('user_id', '-total')
+    )
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.pop('user_id'), []).append(row)
+    return {
+        user_id: (summary, sum((item['total'] for item in summary), Decimal('0')))
+        for user_id, summary in grouped.items()
+    }
+
+
+def add_delta(deltas, category_id, day, amount, count):
+    """Accumulates one expense change into a {(category_id, month): (amount, count)} mapping."""
+    key = (category_id, month_start(day))
+    total, rows = deltas.get(key, (Decimal('0'), 0))
+    deltas[key] = (total + amount, rows + count)
+
+
+def next_month(day):
+    """Returns the first day of the month after the one containing `day`."""
+    start = month_start(day)
+    return date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+
+
+def category_totals(user, start=None, end=None, category_id=None):
+    """
+    Per-category totals over any half-open date range [start, end), where
+    either bound may be None (open), optionally of a single category. Whole
+    months are read from the rollup table; only the partial months at the
+    edges aggregate raw expenses.
+    Returns a list of {'category_id', 'category__name', 'total', 'count'}
+    dicts ordered by total descending.
+    """
+    full_start = start if start is None or start.day == 1 else next_month(start)
+    full_end = end if end is None or end.day == 1 else month_start(end)
+    parts = []
+    if full_start is not None and full_end is not None and full_start >= full_end:
+        # No whole month inside the range
+        parts.append(('raw', start, end))
+    else:
+        parts.append(('rollup', full_start, full_end))
+        if start is not None and start < full_start:
+            parts.append(('raw', start, full_start))
+        if end is not None and full_end < end:
+            parts.append(('raw', full_end, end))
+
+    totals = {}
+    for source, part_start, part_end in parts:
+        if source == 'rollup':
+            rows = MonthlyCategoryTotal.objects.filter(user=user)
+            field, amount, count = 'month', Sum('total'), Sum('count')
+        else:
+            rows = Expense.objects.filter(user=user)
+            field, amount, count = 'date', Sum('amount'), Count('id')
+        if part_start is not None:
+            rows = rows.filter(**{f'{field}__gte': part_start})
+        if part_end is not None:
+            rows = rows.filter(**{f'{field}__lt': part_end})
+        if category_id is not None:
+            rows = rows.filter(category_id=category_id)
+        for row in rows.order_by().values('category_id', 'category__name').annotate(total=amount, count=count):
+            entry = totals.setdefault(row['category_id'], {
+                'category_id': row['category_id'], 'category__name': row['category__name'],
+                'total': Decimal('0'), 'count': 0,
+            })
+            entry['total'] += row['total']
+            entry['count'] += row['count']
+
+    for entry in totals.values():
+        entry['total'] = entry['total'].quantize(CENT)
+    return sorted(totals.values(), key=lambda entry: (-entry['total'], entry['category__name']))
@@ -0,0 +1,64 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .models import Category, Expense
+from .rollups import rebuild_rollups
+
+# Synthetic data for benchmarks and local testing. The same seed always
+# produces the same users, categories and expenses.
+
+# name: (share of expenses, lognormal mu, lognormal sigma, descriptions)
+CATEGORY_PROFILES = {
+    'Food': (0.40, 5.5, 0.7, ['Groceries', 'Lunch', 'Dinner out', 'Coffee', 'Snacks']),
+    'Transport': (0.20, 5.0, 0.8, ['Bus pass', 'Taxi', 'Fuel', 'Train ticket', 'Parking']),
+    'Bills': (0.10, 7.5, 0.5, ['Electricity', 'Internet', 'Phone', 'Water', 'Rent']),
+    'Entertainment': (0.15, 6.0, 0.9, ['Movie', 'Concert', 'Streaming', 'Games', 'Books']),
+    'Other': (0.15, 5.8, 1.1, ['Gift', 'Pharmacy', 'Clothes', 'Repairs', '']),
+}
+PASSWORD = 'benchmark-pass'
+
+
+def generate(users=10, expenses_per_user=1000, days=730, seed=0, prefix='bench', batch_size=5000):
+    """
+    Creates `users` users with the default categories and `expenses_per_user`
+    expenses each, spread over the last `days` days. Returns the created users.
+    """
+    rng = random.Random(seed)
+    today = timezone.now().date()
+    names = list(CATEGORY_PROFILES)
+    weights = [CATEGORY_PROFILES[name][0] for name in names]
+
+    # Hashing is deliberately slow, so hash the shared password only once
+    password = make_password(PASSWORD)
+    created = []
+    for i in range(users):
+        user = User.objects.create(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=password)
+        Category.objects.bulk_create([Category(user=user, name=name) for name in names])
+        by_name = {category.name: category for category in Category.objects.filter(user=user)}
+
+        batch = []
+        for _ in range(expenses_per_user):
+            name = rng.choices(names, weights)[0]
+            _, mu, sigma, descriptions = CATEGORY_PROFILES[name]
+            # Weighted towards recent dates, like a real history that grows over time
+            age = int(days * (1 - rng.random() ** 0.7))
+            batch.append(Expense(
+                user=user,
+                category=by_name[name],
+                amount=Decimal(min(rng.lognormvariate(mu, sigma), 99_999_999)).quantize(Decimal('0.01')),
+                description=rng.choice(descriptions),
+                date=today - timedelta(days=age),
+            ))
+            if len(batch) >= batch_size:
+                Expense.objects.bulk_create(batch)
+                batch = []
+        Expense.objects.bulk_create(batch)
+        # bulk_create skips the signals that maintain the rollups
+        rebuild_rollups(user)
+        created.append(user)
+    return created
@@ -0,0 +1,170 @@
+import re
+
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+
+from .models import Expense
+from .pagination import DEFAULT_PAGE_SIZE
+
+# Full-text search over expense descriptions.
+#
+# On SQLite an FTS5 table (external content, so it stores only the index)
+# mirrors expenses_expense.description and is kept in sync by triggers. On
+# PostgreSQL a GIN index over SEARCH_VECTOR serves the same queries. Other
+# backends fall back to icontains. Every term is matched as a prefix, and
+# results are ranked by relevance (bm25 / ts_rank), newest first on ties.
+
+FTS_TABLE = 'expenses_expense_fts'
+SEARCH_CONFIG = 'english'
+MAX_TERMS = 8
+# Result pages are read with OFFSET, which gets slower the further it goes
+MAX_PAGE = 1000
+
+SQLITE_INDEX_SQL = [
+    # The porter stemmer matches the 'english' configuration used on PostgreSQL
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description, content='expenses_expense', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON expenses_expense BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON expenses_expense BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description ON expenses_expense BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END""",
+]
+SQLITE_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def fts5_available(cursor):
+    cursor.execute("PRAGMA compile_options")
+    return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def install_sqlite_index(connection):
+    """
+    Creates the FTS5 table and its triggers if any are missing, then rebuilds
+    the index from expenses_expense. Safe to repeat: SQLite drops a table's
+    triggers when a migration rebuilds the table, so this also runs after
+    every migrate (see ensure_index).
+    """
+    with connection.cursor() as cursor:
+        if not fts5_available(cursor):
+            return
+        triggers = [f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)", triggers
+        )
+        if cursor.fetchone()[0] == len(triggers):
+            return
+        for statement in SQLITE_INDEX_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_index(sender, using, **kwargs):
+    """post_migrate receiver restoring the SQLite triggers after a table rebuild."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and Expense._meta.db_table in connection.introspection.table_names():
+        install_sqlite_index(connection)
+
+
+def search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('description', config=SEARCH_CONFIG)
+
+
+def parse_terms(query):
+    """Splits a user query into at most MAX_TERMS lowercase words; punctuation is dropped."""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+_fts_installed = None
+
+
+def _use_fts():
+    global _fts_installed
+    if connection.vendor != 'sqlite':
+        return False
+    if _fts_installed is None:
+        _fts_installed = FTS_TABLE in connection.introspection.table_names()
+    return _fts_installed
+
+
+def _fts_match(terms):
+    # Quoting each term keeps FTS5 operators in user input literal
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms):
+    from django.contrib.postgres.search import SearchQuery
+
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def filter_matches(queryset, query):
+    """Narrows an Expense queryset to descriptions matching every term of `query` (unranked)."""
+    terms = parse_terms(query)
+    if not terms:
+        return queryset.none()
+    if _use_fts():
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts_match(terms)])
+        )
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchVectorExact
+
+        return queryset.filter(SearchVectorExact(search_vector(), _tsquery(terms)))
+    for term in terms:
+        queryset = queryset.filter(description__icontains=term)
+    return queryset
+
+
+def search_expenses(user, query, category_id=None, date_filter=None, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns (expenses, has_next) for one page of a user's expenses matching
+    `query`, best matches first. `date_filter` takes queryset filter kwargs,
+    e.g. from periods.range_filter().
+    """
+    queryset = Expense.objects.filter(user=user, **(date_filter or {})).select_related('category')
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+
+    terms = parse_terms(query)
+    if not terms:
+        return [], False
+    if _use_fts():
+        # A join rather than filter_matches(): bm25() can only be read in a
+        # MATCH query on the FTS table, and a correlated subquery per row
+        # would re-run the match for every result
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = expenses_expense.id', f'{FTS_TABLE} MATCH %s'],
+            params=[_fts_match(terms)],
+            select={'rank': f'bm25({FTS_TABLE})'},
+        ).order_by('rank', '-date', '-id')
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchRank
+
+        queryset = (
+            filter_matches(queryset, query)
+            .annotate(rank=SearchRank(search_vector(), _tsquery(terms)))
+            .order_by('-rank', '-date', '-id')
+        )
+    else:
+        queryset = filter_matches(queryset, query).order_by('-date', '-id')
+
+    offset = (min(max(page, 1), MAX_PAGE) - 1) * page_size
+    # One extra row tells whether there is a next page without a COUNT(*)
+    expenses = list(queryset[offset:offset + page_size + 1])
+    return expenses[:page_size], len(expenses) > page_size
@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import budgets, categories, reportcache
+from .models import Category, Expense, MonthlyCategoryTotal
+from .rollups import apply_delta, month_start
+
+# Sent after bulk writes that bypass the model signals (bulk_create,
+# QuerySet.update / delete) with `user_id` and `deltas`, a mapping of
+# (category_id, month) to the (amount, count) change; see rollups.add_delta().
+expenses_bulk_changed = Signal()
+
+
+def _apply_change(user_id, category_id, day, amount, count):
+    """Applies one expense change to its rollup row and to its category's budget counter."""
+    apply_delta(user_id, category_id, day, amount, count)
+    budgets.add_spend(category_id, day, amount)
+
+
+@receiver(pre_save, sender=Expense)
+def remember_previous_expense(sender, instance, **kwargs):
+    """Stores the row as it is in the database so post_save can move it between rollups."""
+    instance._previous = None
+    if instance.pk and not kwargs.get('raw'):
+        instance._previous = (
+            Expense.objects.filter(pk=instance.pk)
+            .values('user_id', 'category_id', 'date', 'amount')
+            .first()
+        )
+
+
+def _date_and_amount(instance):
+    # The model default for date is timezone.now (a datetime), so normalise through the fields
+    return (
+        Expense._meta.get_field('date').to_python(instance.date),
+        Expense._meta.get_field('amount').to_python(instance.amount),
+    )
+
+
+@receiver(post_save, sender=Expense)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    expense_date, amount = _date_and_amount(instance)
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        same_bucket = (
+            previous['user_id'] == instance.user_id
+            and previous['category_id'] == instance.category_id
+            and month_start(previous['date']) == month_start(expense_date)
+        )
+        if same_bucket:
+            if amount != previous['amount']:
+                _apply_change(instance.user_id, instance.category_id, expense_date, amount - previous['amount'], 0)
+            return
+        _apply_change(previous['user_id'], previous['category_id'], previous['date'], -previous['amount'], -1)
+    _apply_change(instance.user_id, instance.category_id, expense_date, amount, 1)
+
+
+@receiver(post_delete, sender=Expense)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    expense_date, amount = _date_and_amount(instance)
+    _apply_change(instance.user_id, instance.category_id, expense_date, -amount, -1)
+
+
+@receiver(post_save, sender=Expense)
+def invalidate_reports_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    expense_date, _ = _date_and_amount(instance)
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['user_id'] != instance.user_id:
+        reportcache.invalidate(previous['user_id'], [previous['date']], years=True)
+        previous = None
+    months = [expense_date]
+    if previous and month_start(previous['date']) != month_start(expense_date):
+        months.append(previous['date'])
+    # The year list only changes when a month gains or loses expenses
+    reportcache.invalidate(instance.user_id, months, years=created or len(months) > 1)
+
+
+@receiver(post_delete, sender=Expense)
+def invalidate_reports_on_delete(sender, instance, **kwargs):
+    expense_date, _ = _date_and_amount(instance)
+    reportcache.invalidate(instance.user_id, [expense_date], years=True)
+
+
+@receiver(post_save, sender=Category)
+def invalidate_reports_on_category_change(sender, instance, created, raw=False, **kwargs):
+    # A rename changes the labels of every month the category has expenses in
+    if created or raw:
+        return
+    months = MonthlyCategoryTotal.objects.filter(category=instance).values_list('month', flat=True)
+    reportcache.invalidate(instance.user_id, list(months))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_choices(sender, instance, raw=False, **kwargs):
+    if not raw:
+        categories.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_new_user_category_choices(sender, instance, created, raw=False, **kwargs):
+    # SQLite hands out the id of a rolled-back insert again: never inherit its cached categories
+    if created and not raw:
+        categories.invalidate(instance.pk)
+
+
+@receiver(expenses_bulk_changed)
+def apply_bulk_changes(sender, user_id, deltas, **kwargs):
+    for (category_id, month), (amount, count) in deltas.items():
+        if amount or count:
+            _apply_change(user_id, category_id, month, amount, count)
+    months = sorted({month for _, month in deltas})
+    reportcache.invalidate(user_id, months, years=any(count for _, count in deltas.values()))
@@ -0,0 +1,82 @@
+import hashlib
+import tempfile
+
+from django.conf import settings
+
+from . import drive, exports, jobs, rollups
+from .emails import asend, report_message, report_month_name
+from .models import Expense, Job
+from .periods import period_filter, resolve_period
+
+# Job handlers run by the worker (see expenses/jobs.py). Each takes a Job and
+# returns a JSON-serialisable result; raising makes the job retry.
+
+# Exports up to this size are spooled in memory, larger ones on disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def send_report_email(job):
+    """Sends the monthly report for payload['year'] / payload['month'] to the job's user."""
+    user = job.user
+    period = resolve_period(job.payload)
+    category_summary, total_expenses = rollups.category_summary(user, period)
+    report_message(user, period, category_summary, total_expenses).send(fail_silently=False)
+    return {'message': f"Your expense report for {report_month_name(period)} has been sent to {user.email}."}
+
+
+async def asend_report_email(job):
+    """send_report_email() for the async worker: the SMTP round trips are awaited, not blocking a thread."""
+    user = job.user
+    period = resolve_period(job.payload)
+    category_summary, total_expenses = await rollups.acategory_summary(user, period)
+    await asend(report_message(user, period, category_summary, total_expenses))
+    return {'message': f"Your expense report for {report_month_name(period)} has been sent to {user.email}."}
+
+
+def spool_csv(expenses):
+    """
+    Writes the CSV export of a queryset into a temporary file, kept in memory
+    while small and spilled to disk past SPOOL_MAX_SIZE. Returns the file
+    (rewound) and the SHA-256 of its content.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=getattr(settings, 'EXPENSES_SPOOL_MAX_SIZE', SPOOL_MAX_SIZE))
+    digest = hashlib.sha256()
+    for line in exports.stream_csv(exports.expense_rows(expenses)):
+        data = line.encode()
+        spool.write(data)
+        digest.update(data)
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+
+def upload_report_to_drive(job):
+    """
+    Uploads the CSV export for payload['year'] / payload['month'] to the user's
+    Google Drive. Upload progress is saved in payload['upload'], so a retry of
+    the job resumes the upload instead of starting again, unless the export
+    has changed in the meantime.
+    """
+    period = resolve_period(job.payload)
+    expenses = Expense.objects.filter(user=job.user, **period_filter(period))
+    file_name = f'expense_report_{period.year}-{period.month:02d}.csv'
+
+    def save_progress(upload):
+        job.payload['upload'] = upload
+        Job.objects.filter(pk=job.pk).update(payload=job.payload)
+        # A large upload can outlast jobs.STALE_AFTER; each chunk renews the lease
+        jobs.heartbeat(job)
+
+    spool, sha256 = spool_csv(expenses)
+    with spool:
+        previous = job.payload.get('upload')
+        session = previous if previous and previous.get('sha256') == sha256 else None
+        file = drive.upload_file(
+            drive.get_service(), file_name, spool, session=session,
+            checkpoint=lambda upload: save_progress({**upload, 'sha256': sha256}),
+        )
+    if job.payload.pop('upload', None) is not None:
+        Job.objects.filter(pk=job.pk).update(payload=job.payload)
+    return {
+        'file_id': file.get('id'),
+        'message': f"Successfully uploaded '{file.get('name')}' to your Google Drive.",
+    }
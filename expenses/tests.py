@@ -1,3 +1,1636 @@
-from django.test import TestCase
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.utils import ConnectionHandler
+from django.db.models import Sum
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    analytics, api, benchmarks, budgets, bulk, categories, columnar, drive, emails, exports, jobs, recurring, reportcache, rollups, sampledata, search, tasks,
+    trends,
+)
+from .forms import ExpenseForm
+from .imports import import_expenses
+from .instrumentation import instrument
+from .models import Budget, Category, DigestSubscription, Expense, Job, MonthlyCategoryTotal, RecurringExpense
+from .pagination import decode_cursor, encode_cursor
+from .periods import month_range, resolve_period, resolve_range
+from .rollups import find_mismatches
+from django_expense_tracker.database import database_config
+
+
+def make_expenses(user, category, count, start=date(2025, 1, 1)):
+    Expense.objects.bulk_create([
+        Expense(user=user, category=category, amount=Decimal('10.00') + i,
+                description=f'Expense {i}', date=start + timedelta(days=i // 3))
+        for i in range(count)
+    ])
+
+
+class ExpensesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'pass12345')
+        self.category = Category.objects.create(user=self.user, name='Food')
+        self.client.force_login(self.user)
+
+
+@override_settings(EXPENSES_PAGE_SIZE=10)
+class DashboardPaginationTests(ExpensesTestCase):
+    def test_cursor_round_trip(self):
+        make_expenses(self.user, self.category, 1)
+        expense = Expense.objects.get()
+        self.assertEqual(decode_cursor(encode_cursor(expense)), (expense.date, expense.id))
+        self.assertIsNone(decode_cursor('garbage'))
+        self.assertIsNone(decode_cursor(f'2025-01-01.{2 ** 64}'))
+        response = self.client.get(reverse('expense_rows'), {'cursor': f'2025-01-01.{2 ** 64}'})
+        self.assertEqual(len(response.context['expenses']), 1)
+
+    def test_pages_cover_every_row_once(self):
+        make_expenses(self.user, self.category, 35)
+        response = self.client.get(reverse('dashboard'))
+        seen = [e.id for e in response.context['expenses']]
+        cursor = response.context['next_cursor']
+        while cursor:
+            response = self.client.get(reverse('expense_rows'), {'cursor': cursor})
+            seen += [e.id for e in response.context['expenses']]
+            cursor = response.context['next_cursor']
+        expected = list(Expense.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_query_count_does_not_grow_with_history(self):
+        make_expenses(self.user, self.category, 5)
+        # The first request also fills the category cache
+        self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('dashboard'))
+        small = len(queries)
+        make_expenses(self.user, self.category, 500)
+        with self.assertNumQueries(small):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['expenses']), 10)
+        self.assertGreater(small, 0)
+
+    def test_other_users_rows_are_hidden(self):
+        bob = User.objects.create_user('bob', password='pass12345')
+        make_expenses(bob, Category.objects.create(user=bob, name='Food'), 3)
+        response = self.client.get(reverse('expense_rows'))
+        self.assertEqual(list(response.context['expenses']), [])
+
+
+class DashboardHtmxTests(ExpensesTestCase):
+    htmx = {'HTTP_HX_REQUEST': 'true'}
+
+    def setUp(self):
+        super().setUp()
+        make_expenses(self.user, self.category, 60)
+        self.form = {'amount': '42.00', 'description': 'Taxi', 'category': self.category.id, 'date': '2025-03-04'}
+
+    def test_add_returns_only_the_new_row_and_messages(self):
+        full_page = self.client.get(reverse('dashboard')).content
+        response = self.client.post(reverse('dashboard'), self.form, **self.htmx)
+        expense = Expense.objects.get(description='Taxi')
+        self.assertContains(response, f'<tr id="expense-{expense.id}">')
+        self.assertContains(response, 'hx-swap-oob="true"')
+        self.assertContains(response, 'Expense added successfully!')
+        self.assertNotContains(response, 'Add New Expense')
+        self.assertLess(len(response.content) * 10, len(full_page))
+        # Without HTMX the form still posts and redirects
+        self.assertRedirects(self.client.post(reverse('dashboard'), self.form), reverse('dashboard'))
+
+    def test_invalid_add_re_renders_the_form_in_place(self):
+        response = self.client.post(reverse('dashboard'), dict(self.form, amount=''), **self.htmx)
+        self.assertEqual((response['HX-Retarget'], response['HX-Reswap']), ('#add-expense-form', 'outerHTML'))
+        self.assertContains(response, 'This field is required.')
+
+    def test_edit_and_delete_swap_one_row_and_budget_status(self):
+        budgets.set_budget(self.user, self.category, Decimal('500.00'), today=date(2025, 1, 15))
+        expense = Expense.objects.filter(user=self.user).first()
+        url = reverse('edit_expense', args=[expense.id])
+        response = self.client.post(url, dict(self.form, description='Edited'), **self.htmx)
+        self.assertContains(response, f'<tr id="expense-{expense.id}">')
+        self.assertContains(response, 'Edited')
+        self.assertContains(response, '<div id="budget-status" hx-swap-oob="true">')
+
+        response = self.client.post(url, dict(self.form, date='not a date'), **self.htmx)
+        self.assertEqual(response['HX-Retarget'], '#modal-content-target')
+
+        response = self.client.post(reverse('delete_expense', args=[expense.id]), **self.htmx)
+        self.assertNotContains(response, '<tr id="expense-')
+        self.assertContains(response, 'Expense deleted successfully!')
+        self.assertFalse(Expense.objects.filter(id=expense.id).exists())
+
+
+class PeriodTests(ExpensesTestCase):
+    def test_month_range_is_half_open(self):
+        self.assertEqual(month_range(2024, 2), (date(2024, 2, 1), date(2024, 3, 1)))
+        self.assertEqual(month_range(2024, 12), (date(2024, 12, 1), date(2025, 1, 1)))
+
+    def test_invalid_params_fall_back_to_today(self):
+        today = date(2025, 6, 15)
+        self.assertEqual(resolve_period({'year': 'x', 'month': '3'}, today)[:2], (2025, 6))
+        self.assertEqual(resolve_period({'year': '2025', 'month': '13'}, today)[:2], (2025, 6))
+        self.assertEqual(resolve_period({'year': '2023', 'month': '1'}, today)[:2], (2023, 1))
+
+    def test_report_includes_month_boundaries_only(self):
+        for day in (date(2025, 1, 31), date(2025, 2, 1), date(2025, 2, 28), date(2025, 3, 1)):
+            Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), date=day)
+        response = self.client.get(reverse('report'), {'year': 2025, 'month': 2})
+        self.assertEqual(response.context['total_expenses'], Decimal('2.00'))
+
+
+class RollupTests(ExpensesTestCase):
+    def totals(self):
+        return {
+            (r.category.name, r.month): (r.total, r.count)
+            for r in MonthlyCategoryTotal.objects.select_related('category')
+        }
+
+    def test_create_edit_move_and_delete(self):
+        transport = Category.objects.create(user=self.user, name='Transport')
+        expense = Expense.objects.create(user=self.user, category=self.category, amount=Decimal('10.00'), date=date(2025, 3, 5))
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('5.00'), date=date(2025, 3, 9))
+        self.assertEqual(self.totals(), {('Food', date(2025, 3, 1)): (Decimal('15.00'), 2)})
+
+        expense.amount = Decimal('12.50')
+        expense.save()
+        self.assertEqual(self.totals(), {('Food', date(2025, 3, 1)): (Decimal('17.50'), 2)})
+
+        expense.date = date(2025, 4, 1)
+        expense.category = transport
+        expense.save()
+        self.assertEqual(self.totals(), {
+            ('Food', date(2025, 3, 1)): (Decimal('5.00'), 1),
+            ('Transport', date(2025, 4, 1)): (Decimal('12.50'), 1),
+        })
+
+        expense.delete()
+        self.assertEqual(self.totals(), {('Food', date(2025, 3, 1)): (Decimal('5.00'), 1)})
+        self.assertEqual(find_mismatches(), [])
+
+    def test_rollup_changes_share_the_writes_transaction(self):
+        expense = Expense.objects.create(user=self.user, category=self.category, amount=Decimal('2.00'))
+        depths = []
+
+        def failing_apply_delta(*args):
+            depths.append(len(connection.atomic_blocks))
+            raise OperationalError('database is locked')
+
+        outside = len(connection.atomic_blocks)
+        with mock.patch('expenses.signals.apply_delta', side_effect=failing_apply_delta):
+            for write in [
+                lambda: Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00')),
+                expense.delete,
+            ]:
+                with self.assertRaises(OperationalError), transaction.atomic():
+                    write()
+        # Each delta ran in a transaction opened by the write itself, inside the one here
+        self.assertEqual(depths, [outside + 2, outside + 2])
+        self.assertEqual(list(Expense.objects.all()), [expense])
+        self.assertEqual(find_mismatches(), [])
+
+    def test_category_delete_cascades(self):
+        make_expenses(self.user, self.category, 3)
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'))
+        self.category.delete()
+        self.assertFalse(MonthlyCategoryTotal.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        make_expenses(self.user, self.category, 30)  # bulk_create bypasses the signals
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(find_mismatches(), [])
+
+    def test_report_reads_rollups(self):
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('7.00'), date=date(2024, 5, 2))
+        response = self.client.get(reverse('report'), {'year': 2024, 'month': 5})
+        self.assertEqual(response.context['total_expenses'], Decimal('7.00'))
+        self.assertIn(2024, response.context['available_years'])
+
+
+class ExportCsvTests(ExpensesTestCase):
+    def export(self, **params):
+        response = self.client.get(reverse('export_csv'), params)
+        return response, b''.join(response.streaming_content).decode().splitlines()
+
+    def test_month_export(self):
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('3.50'), description='Tea', date=date(2025, 2, 3))
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), date=date(2025, 3, 1))
+        response, lines = self.export(year=2025, month=2)
+        self.assertIn('expense_report_2025-02.csv', response['Content-Disposition'])
+        self.assertEqual(lines, ['Date,Description,Category,Amount', '2025-02-03,Tea,Food,3.50'])
+
+    def test_date_range_and_all_time(self):
+        make_expenses(self.user, self.category, 30)  # 2025-01-01 .. 2025-01-10
+        self.assertEqual(len(self.export(start='2025-01-02', end='2025-01-03')[1]), 1 + 6)
+        self.assertEqual(len(self.export(range='all')[1]), 1 + 30)
+        self.assertEqual(resolve_range({'start': 'bad'}, date(2025, 6, 1)).label, '2025-06')
+
+    def peak_export_memory(self):
+        response = self.client.get(reverse('export_csv'), {'range': 'all'})
+        tracemalloc.start()
+        try:
+            rows = sum(1 for _ in response.streaming_content)
+            return rows, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_memory_is_flat(self):
+        make_expenses(self.user, self.category, 2000)
+        small_rows, small_peak = self.peak_export_memory()
+        make_expenses(self.user, self.category, 18000)
+        large_rows, large_peak = self.peak_export_memory()
+        self.assertEqual((small_rows, large_rows), (2001, 20001))
+        # 10x the rows must not need anywhere near 10x the memory
+        self.assertLess(large_peak, small_peak * 2)
+
+
+@skipUnless(columnar.pyarrow_available(), "pyarrow is not installed")
+class ColumnarExportTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('3.10'), description='Tea', date=date(2025, 2, 3))
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1234.99'), date=date(2025, 3, 1))
+        bob = User.objects.create_user('bob', password='pass12345')
+        Expense.objects.create(user=bob, category=Category.objects.create(user=bob, name='Rent'), amount=Decimal('900.00'), date=date(2025, 2, 1))
+
+    def read(self, fmt, **params):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        response = self.client.get(reverse('export_columnar', args=[fmt]), params)
+        data = b''.join(response.streaming_content)
+        table = pq.read_table(pa.BufferReader(data)) if fmt == columnar.PARQUET else pa.ipc.open_stream(data).read_all()
+        return response, table
+
+    def test_parquet_keeps_types_and_only_has_own_expenses(self):
+        response, table = self.read('parquet', range='all')
+        self.assertIn('expense_report_all.parquet', response['Content-Disposition'])
+        rows = table.to_pylist()
+        self.assertEqual([(row['date'], row['amount'], row['category']) for row in rows], [
+            (date(2025, 2, 3), Decimal('3.10'), 'Food'), (date(2025, 3, 1), Decimal('1234.99'), 'Food'),
+        ])
+        self.assertEqual({row['user'] for row in rows}, {'alice'})
+
+    def test_arrow_stream_of_a_month(self):
+        _, table = self.read('arrow', year=2025, month=2)
+        self.assertEqual(table.column('description').to_pylist(), ['Tea'])
+
+    def test_all_users_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('export_columnar', args=['parquet']), {'scope': 'all'}).status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response, table = self.read('parquet', range='all', scope='all')
+        self.assertIn('all_all_users', response['Content-Disposition'])
+        self.assertEqual(sorted(table.column('user').to_pylist()), ['alice', 'alice', 'bob'])
+        self.assertEqual(self.client.get(reverse('export_columnar', args=['xlsx'])).status_code, 404)
+
+    def test_writes_a_batch_at_a_time(self):
+        make_expenses(self.user, self.category, 9)
+        batches = list(columnar.record_batches(Expense.objects.filter(user=self.user), batch_rows=4))
+        self.assertEqual([batch.num_rows for batch in batches], [4, 4, 3])
+        chunks = list(columnar.stream(Expense.objects.filter(user=self.user), columnar.ARROW, batch_rows=4))
+        self.assertEqual(len(chunks), 4)  # one per batch, then the end of the stream
+
+
+class FakeDriveService:
+    """Records uploads instead of calling the Google Drive API."""
+    uploads = []
+
+    def files(self):
+        return self
+
+    def create(self, body, media_body, fields):
+        FakeDriveService.uploads.append((body['name'], media_body.getbytes(0, media_body.size())))
+        return self
+
+    def next_chunk(self, num_retries=0):
+        return None, {'id': 'fake-id', 'name': FakeDriveService.uploads[-1][0]}
+
+
+def fake_drive_service():
+    return FakeDriveService()
+
+
+def flaky_handler(job):
+    raise ConnectionError('remote is down')
+
+
+@override_settings(EXPENSES_DRIVE_SERVICE_FACTORY='expenses.tests.fake_drive_service')
+class JobQueueTests(ExpensesTestCase):
+    def test_email_report_is_queued_then_sent_by_worker(self):
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('9.99'), date=date(2025, 4, 2))
+        response = self.client.get(reverse('email_report'), {'year': 2025, 'month': 4})
+        job = Job.objects.get()
+        self.assertRedirects(response, f"{reverse('report')}?year=2025&month=4&job={job.id}")
+        self.assertEqual(mail.outbox, [])
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertIn('9.99', mail.outbox[0].body)
+
+        status = self.client.get(reverse('job_status', args=[job.id]))
+        self.assertContains(status, 'has been sent')
+        self.assertNotContains(status, 'hx-trigger')
+
+    def test_drive_upload_uses_fake_client(self):
+        FakeDriveService.uploads = []
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('4.00'), date=date(2025, 4, 2))
+        with mock.patch('expenses.drive.is_authorized', return_value=True):
+            self.client.get(reverse('upload_to_drive'), {'year': 2025, 'month': 4})
+        jobs.run_pending()
+        self.assertEqual(Job.objects.get().status, Job.SUCCEEDED)
+        name, content = FakeDriveService.uploads[0]
+        self.assertEqual(name, 'expense_report_2025-04.csv')
+        self.assertIn(b'2025-04-02,,Food,4.00', content)
+
+    @override_settings(EXPENSES_JOB_HANDLERS={'flaky': 'expenses.tests.flaky_handler'})
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = jobs.enqueue('flaky', self.user, max_attempts=2)
+        with self.assertLogs('expenses.jobs', 'WARNING'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('remote is down', job.last_error)
+        self.assertEqual(jobs.run_pending(), 0)  # not due until the backoff has passed
+
+        Job.objects.update(run_at=job.run_at - jobs.backoff(1))
+        with self.assertLogs('expenses.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_stale_jobs_are_requeued_as_a_failed_attempt(self):
+        first = jobs.enqueue('email_report', self.user, max_attempts=2)
+        last = jobs.enqueue('email_report', self.user, max_attempts=1)
+        self.assertEqual(jobs.claim_next(), first)
+        self.assertEqual(jobs.claim_next(), last)
+        Job.objects.update(locked_at=timezone.now() - jobs.STALE_AFTER * 2)
+        self.assertTrue(jobs.heartbeat(first))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        first.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (Job.RUNNING, 0))
+        self.assertEqual((last.status, last.attempts), (Job.FAILED, 1))
+        self.assertIn('stopped responding', last.last_error)
+
+        Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - jobs.STALE_AFTER * 2)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts, first.locked_at), (Job.QUEUED, 1, None))
+        self.assertFalse(jobs.heartbeat(first))
+
+    def test_jobs_of_other_users_are_hidden(self):
+        bob = User.objects.create_user('bob', password='pass12345')
+        job = jobs.enqueue('email_report', bob)
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.id])).status_code, 404)
+        for value in [str(job.id), '²', '9' * 23, '-1']:
+            with self.subTest(job=value):
+                response = self.client.get(reverse('report'), {'job': value})
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.context['job'])
+
+
+class SlowHandler:
+    """An async job handler that records how many of its calls overlap."""
+    running = peak = 0
+
+    @classmethod
+    async def handle(cls, job):
+        cls.running += 1
+        cls.peak = max(cls.peak, cls.running)
+        await asyncio.sleep(0.2)
+        cls.running -= 1
+        return {'message': 'done'}
+
+
+slow_async_handler = SlowHandler.handle
+
+
+class AsyncViewTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(self.user)
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('6.25'), description='Cab', date=date(2025, 4, 2))
+
+    @override_settings(EXPENSES_INSTRUMENTATION={'SAMPLE_RATE': 1, 'SERVER_TIMING': True})
+    async def test_report_and_export_over_asgi(self):
+        response = await self.async_client.get(reverse('report'), {'year': 2025, 'month': 4})
+        self.assertEqual(response.context['total_expenses'], Decimal('6.25'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+        response = await self.async_client.get(reverse('export_csv'), {'year': 2025, 'month': 4})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(content.splitlines(), ['Date,Description,Category,Amount', '2025-04-02,Cab,Food,6.25'])
+
+    async def test_anonymous_users_are_sent_to_login(self):
+        response = await AsyncClient().get(reverse('report'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(reverse('login')))
+
+    async def test_email_report_is_delivered_by_async_worker(self):
+        await self.async_client.get(reverse('email_report'), {'year': 2025, 'month': 4})
+        self.assertEqual(await jobs.arun_pending(), 1)
+        job = await Job.objects.aget()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertIn('6.25', mail.outbox[0].body)
+
+    @override_settings(EMAIL_BACKEND=emails.SMTP_BACKEND, EMAIL_HOST='smtp.example.com')
+    async def test_smtp_goes_through_aiosmtplib_when_installed(self):
+        aiosmtplib = mock.Mock(send=mock.AsyncMock())
+        message = mail.EmailMessage('Report', 'Body', 'from@example.com', ['alice@example.com'])
+        with mock.patch.dict(sys.modules, {'aiosmtplib': aiosmtplib}):
+            self.assertEqual(await emails.asend(message), 1)
+        kwargs = aiosmtplib.send.call_args.kwargs
+        self.assertEqual((kwargs['hostname'], kwargs['recipients']), ('smtp.example.com', ['alice@example.com']))
+
+    @override_settings(
+        EXPENSES_JOB_HANDLERS={'slow': 'expenses.tests.flaky_handler'},
+        EXPENSES_JOB_ASYNC_HANDLERS={'slow': 'expenses.tests.slow_async_handler'},
+    )
+    async def test_async_worker_runs_jobs_concurrently(self):
+        for _ in range(4):
+            await jobs.aenqueue('slow', self.user)
+        SlowHandler.peak = 0
+        self.assertEqual(await jobs.arun_pending(concurrency=4), 4)
+        self.assertEqual(SlowHandler.peak, 4)
+        self.assertEqual(await Job.objects.filter(status=Job.SUCCEEDED).acount(), 4)
+
+
+class MonthlyDigestTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [self.user]
+        for i in range(4):
+            user = User.objects.create_user(f'user{i}', f'user{i}@example.com', 'pass12345')
+            category = Category.objects.create(user=user, name='Bills')
+            Expense.objects.create(user=user, category=category, amount=Decimal('20.00') + i, date=date(2025, 5, 10))
+            self.users.append(user)
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('3.00'), date=date(2025, 5, 1))
+        DigestSubscription.objects.bulk_create([DigestSubscription(user=user) for user in self.users])
+
+    def send(self, **options):
+        call_command('send_monthly_digest', '--year', '2025', '--month', '5', stdout=StringIO(), **options)
+
+    def test_sends_one_email_per_subscriber_over_one_connection(self):
+        DigestSubscription.objects.filter(user__username='user3').update(is_active=False)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection:
+            with self.assertNumQueries(3 * 2 + 1):  # fetch, summarise, mark sent per batch, plus the empty last one
+                self.send(batch_size=2)
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['alice@example.com', 'user0@example.com', 'user1@example.com', 'user2@example.com'])
+        self.assertIn('22.00', [m for m in mail.outbox if m.to == ['user2@example.com']][0].body)
+
+    def test_rerun_resumes_without_duplicates(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=[2, OSError('smtp died')]):
+            with self.assertRaises(OSError):
+                self.send(batch_size=2)
+        self.assertEqual(DigestSubscription.objects.filter(last_sent_month=date(2025, 5, 1)).count(), 2)
+        self.send(batch_size=2)
+        self.assertEqual(len(mail.outbox), 3)
+        self.send(batch_size=2)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_toggle_digest(self):
+        DigestSubscription.objects.all().delete()
+        self.client.post(reverse('toggle_digest'))
+        self.assertTrue(DigestSubscription.objects.get(user=self.user).is_active)
+        self.client.post(reverse('toggle_digest'))
+        self.assertFalse(DigestSubscription.objects.get(user=self.user).is_active)
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_profiles_from_environment(self):
+        sqlite = database_config({}, Path('/srv'))
+        self.assertEqual((sqlite['ENGINE'], sqlite['NAME']), ('expenses.backends.sqlite3', Path('/srv/db.sqlite3')))
+        self.assertEqual(sqlite['OPTIONS'], {'timeout': 20.0, 'transaction_mode': 'IMMEDIATE'})
+        self.assertTrue(sqlite['CONN_HEALTH_CHECKS'])
+
+        postgres = database_config(
+            {'DB_ENGINE': 'postgresql', 'DB_HOST': 'db', 'DB_CONN_MAX_AGE': '300', 'DB_POOLER': 'pgbouncer'}, Path('/srv'),
+        )
+        self.assertEqual((postgres['ENGINE'], postgres['HOST']), ('django.db.backends.postgresql', 'db'))
+        self.assertEqual((postgres['CONN_MAX_AGE'], postgres['CONN_HEALTH_CHECKS']), (300, True))
+        self.assertTrue(postgres['DISABLE_SERVER_SIDE_CURSORS'])
+        with self.assertRaises(ValueError):
+            database_config({'DB_ENGINE': 'oracle'}, Path('/srv'))
+
+    def concurrent_writers(self, engine, options, threads=8, transactions=20):
+        """Runs read-then-write transactions from several threads on a file database; returns the lock errors."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            databases = ConnectionHandler({'default': {'ENGINE': engine, 'NAME': f'{tmpdir}/db.sqlite3', 'OPTIONS': options}})
+            databases['default'].cursor().execute('CREATE TABLE counter (n integer)')
+            databases['default'].close()
+            errors = []
+
+            def work():
+                db = databases['default']
+                for _ in range(transactions):
+                    # What atomic() does on SQLite
+                    db.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                    try:
+                        with db.cursor() as cursor:
+                            cursor.execute('SELECT COUNT(*) FROM counter')
+                            count = cursor.fetchone()[0]
+                            # Hold the read lock long enough for the other threads to overlap
+                            time.sleep(0.001)
+                            cursor.execute('INSERT INTO counter VALUES (%s)', [count])
+                        db.commit()
+                    except OperationalError as e:
+                        errors.append(e)
+                        db.rollback()
+                    finally:
+                        db.set_autocommit(True)
+                db.close()
+
+            workers = [threading.Thread(target=work) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            return errors
+
+    def test_tuned_sqlite_has_no_lock_errors_under_concurrent_writers(self):
+        self.assertEqual(self.concurrent_writers('expenses.backends.sqlite3', {'timeout': 20}), [])
+        # Django's plain BEGIN cannot wait for the write lock once the transaction has read
+        self.assertIn('locked', str(self.concurrent_writers('django.db.backends.sqlite3', {'timeout': 20})[0]))
+
+    def test_pragmas_are_set_on_connect(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            databases = ConnectionHandler({'default': {
+                'ENGINE': 'expenses.backends.sqlite3', 'NAME': f'{tmpdir}/db.sqlite3',
+                'OPTIONS': {'timeout': 7, 'pragmas': {'cache_size': -4000}},
+            }})
+            with databases['default'].cursor() as cursor:
+                values = {}
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    values[pragma] = cursor.fetchone()[0]
+            databases['default'].close()
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 7000, 'cache_size': -4000})
+
+
+class BenchmarkTests(TestCase):
+    def test_generated_data_is_reproducible_and_rolled_up(self):
+        first = sampledata.generate(users=1, expenses_per_user=50, seed=7, prefix='a')[0]
+        second = sampledata.generate(users=1, expenses_per_user=50, seed=7, prefix='b')[0]
+        rows = lambda user: list(Expense.objects.filter(user=user).order_by('id').values_list('date', 'amount', 'category__name'))
+        self.assertEqual(len(rows(first)), 50)
+        self.assertEqual(rows(first), rows(second))
+        self.assertEqual(find_mismatches(), [])
+
+    def test_harness_reports_every_view(self):
+        user = sampledata.generate(users=1, expenses_per_user=60)[0]
+        results = benchmarks.run_view_benchmarks(user, iterations=2, warmup=0)
+        self.assertLessEqual({
+            'dashboard', 'expense_rows', 'search', 'edit_expense', 'budgets', 'categories', 'report', 'trends',
+            'export_csv_all', 'import_form', 'job_status', 'api_monthly_totals', 'api_category_breakdown',
+            'api_daily_series', 'api_top_expenses',
+        }, results.keys())
+        for stats in results.values():
+            self.assertGreater(stats['queries'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+        faster = {name: dict(stats, p50_ms=stats['p50_ms'] / 2) for name, stats in results.items()}
+        rows = benchmarks.compare_results({'results': results}, {'results': faster})
+        self.assertTrue(all(round(change) == -50 for _, _, _, change in rows))
+
+
+class InstrumentationTests(ExpensesTestCase):
+    def test_detects_repeated_queries(self):
+        make_expenses(self.user, self.category, 5)
+        with instrument(duplicate_threshold=3) as metrics:
+            names = [expense.category.name for expense in Expense.objects.filter(user=self.user)]
+        self.assertEqual(len(names), 5)
+        self.assertEqual(metrics.query_count, 6)
+        self.assertEqual(list(metrics.duplicates.values()), [5])
+
+        with instrument() as metrics:
+            list(Expense.objects.filter(user=self.user).select_related('category'))
+        self.assertEqual((metrics.query_count, metrics.duplicates), (1, {}))
+
+    @override_settings(EXPENSES_INSTRUMENTATION={'SAMPLE_RATE': 1, 'SERVER_TIMING': True})
+    def test_middleware_adds_server_timing_and_logs(self):
+        with self.assertLogs('expenses.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('dashboard'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=')
+        self.assertIn('"path": "/"', logs.output[0])
+        self.assertNotRegex(response['Server-Timing'], r'tpl;dur=0\.0,')
+
+    @override_settings(EXPENSES_INSTRUMENTATION={'SAMPLE_RATE': 1})
+    def test_server_timing_is_opt_in(self):
+        with self.assertLogs('expenses.instrumentation', 'INFO'):
+            response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(EXPENSES_INSTRUMENTATION={})
+    def test_off_by_default(self):
+        with self.assertNoLogs('expenses.instrumentation'):
+            response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class ReportCacheTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        reportcache.get_cache().clear()
+        self.expense = Expense.objects.create(user=self.user, category=self.category, amount=Decimal('5.00'), date=date(2025, 6, 3))
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('8.00'), date=date(2025, 7, 3))
+        self.june = resolve_period({'year': 2025, 'month': 6})
+        self.july = resolve_period({'year': 2025, 'month': 7})
+
+    def test_second_read_needs_no_queries(self):
+        reportcache.get_report(self.user, self.june)
+        with self.assertNumQueries(0):
+            report = reportcache.get_report(self.user, self.june)
+        self.assertEqual(report['total_expenses'], Decimal('5.00'))
+        self.assertEqual(report['available_years'], [2025])
+
+    def test_edit_invalidates_only_affected_months(self):
+        june, july = reportcache.get_report(self.user, self.june), reportcache.get_report(self.user, self.july)
+        self.expense.amount = Decimal('6.00')
+        self.expense.save()
+        self.assertNotEqual(reportcache.get_report(self.user, self.june)['version'], june['version'])
+        self.assertEqual(reportcache.get_report(self.user, self.july)['version'], july['version'])
+        self.assertEqual(reportcache.get_report(self.user, self.june)['total_expenses'], Decimal('6.00'))
+
+        self.expense.date = date(2025, 7, 20)
+        self.expense.save()
+        self.assertEqual(reportcache.get_report(self.user, self.june)['total_expenses'], Decimal('0'))
+        self.assertEqual(reportcache.get_report(self.user, self.july)['total_expenses'], Decimal('14.00'))
+
+    def test_category_rename_invalidates_its_months(self):
+        reportcache.get_report(self.user, self.june)
+        self.category.name = 'Groceries'
+        self.category.save()
+        summary = reportcache.get_report(self.user, self.june)['category_summary']
+        self.assertEqual(summary[0]['category__name'], 'Groceries')
+
+    def test_conditional_get(self):
+        url = reverse('report') + '?year=2025&month=6'
+        self.client.get(url)  # sets the CSRF cookie, which is part of the ETag
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), date=date(2025, 6, 9))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_file_based_cache_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+            with self.settings(CACHES=backend):
+                self.assertEqual(reportcache.get_report(self.user, self.june)['total_expenses'], Decimal('5.00'))
+                Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), date=date(2025, 6, 9))
+                self.assertEqual(reportcache.get_report(self.user, self.june)['total_expenses'], Decimal('6.00'))
+
+
+@override_settings(EXPENSES_ADMIN_COUNT_LIMIT=1000)
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = sampledata.generate(users=10, expenses_per_user=300)
+        cls.superuser = User.objects.create_superuser('root', 'root@example.com', 'pass12345')
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def changelist(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:expenses_expense_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_changelist_queries_do_not_grow_with_the_table(self):
+        response, queries = self.changelist()
+        self.assertEqual(response.context['cl'].result_count, 1000)
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        # No per-row lookups, no DISTINCT over every date and no COUNT(*) without a LIMIT
+        self.assertLess(len(queries), 15)
+        self.assertFalse([sql for sql in queries if 'DISTINCT' in sql or ('COUNT(' in sql and 'LIMIT' not in sql)])
+        years = sorted({expense.date.year for expense in Expense.objects.only('date')})
+        self.assertEqual([choice['title'] for choice in response.context['choices']], [str(year) for year in years])
+
+        response, queries = self.changelist({'date__year': years[-1]})
+        months = sorted({day.replace(day=1) for day in Expense.objects.filter(date__year=years[-1]).values_list('date', flat=True)})
+        self.assertEqual(len(response.context['choices']), len(months))
+        self.assertLess(len(queries), 20)
+
+        # An unfiltered table past the limit reports SQLite's ANALYZE estimate
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        response, _ = self.changelist()
+        self.assertEqual(response.context['cl'].result_count, 3000)
+
+    def test_autocomplete_filters(self):
+        user = self.users[3]
+        response, queries = self.changelist({'user__id__exact': user.id})
+        self.assertEqual(response.context['cl'].result_count, 300)
+        self.assertContains(response, f'<option value="{user.id}" selected>{user.username}</option>', html=True)
+        # The other users are searched for, not listed
+        self.assertNotContains(response, self.users[4].username)
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'expenses', 'model_name': 'expense', 'field_name': 'user', 'term': user.username,
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], [user.username])
+
+    def test_export_actions(self):
+        selected = list(Expense.objects.filter(user=self.users[0]).values_list('id', flat=True)[:5])
+        response = self.client.post(reverse('admin:expenses_expense_changelist'), {
+            'action': 'export_csv', '_selected_action': selected,
+        })
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Date,User,Description,Category,Amount')
+        self.assertEqual(len(lines), 6)
+        self.assertIn(self.users[0].username, lines[1])
+
+
+class DriveTests(TestCase):
+    def test_project_import_does_not_load_google_libraries(self):
+        probe = subprocess.run([sys.executable, '-c', benchmarks.STARTUP_PROBE], capture_output=True, text=True, check=True)
+        self.assertFalse(json.loads(probe.stdout)['google_loaded'])
+
+    def test_service_is_built_once_per_credential(self):
+        creds = mock.Mock(client_id='client', refresh_token='refresh')
+        with mock.patch('googleapiclient.discovery.build') as build:
+            self.assertIs(drive.service_for(creds), drive.service_for(creds))
+            drive.service_for(mock.Mock(client_id='client', refresh_token='other'))
+        self.assertEqual(build.call_count, 2)
+
+
+OFX_STATEMENT = b"""OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250304120000<TRNAMT>-12.50<NAME>Grocer
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250305<TRNAMT>100.00<NAME>Salary
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250306<TRNAMT>-3.00<MEMO>Bus fare
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class ImportTests(ExpensesTestCase):
+    def upload(self, content, name='expenses.csv', **data):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(reverse('import_expenses'), {'file': upload, 'create_categories': '1', **data})
+
+    def test_export_round_trip(self):
+        make_expenses(self.user, self.category, 30)
+        exported = b''.join(self.client.get(reverse('export_csv'), {'range': 'all'}).streaming_content)
+        bob = User.objects.create_user('bob', 'bob@example.com', 'pass12345')
+        result = import_expenses(bob, BytesIO(exported), name='export.csv')
+        self.assertEqual((result.created, result.failed, result.categories_created), (30, 0, ['Food']))
+        self.assertEqual(
+            sorted(Expense.objects.filter(user=bob).values_list('date', 'description', 'amount')),
+            sorted(Expense.objects.filter(user=self.user).values_list('date', 'description', 'amount')),
+        )
+        self.assertEqual(find_mismatches(bob), [])
+
+    def test_bad_rows_are_reported_by_line(self):
+        content = (
+            'Date,Description,Category,Amount\n'
+            '2025-01-02,Lunch,Food,12.00\n'
+            'not-a-date,Oops,Food,1.00\n'
+            '2025-01-03,Free,Food,0\n'
+            '2025-01-04,Taxi,Travel,\n'
+            '2025-01-05,Train,Travel,"1,234.50"\n'
+            '2025-01-06,Rounds up,Food,99999999.999\n'
+            '2025-01-07,Huge,Food,1e30\n'
+        ).encode()
+        response = self.upload(content)
+        result = response.context['result']
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 7, 8])
+        self.assertContains(response, 'Amount 99999999.999 is too large.')
+        self.assertContains(response, "Invalid date &#x27;not-a-date&#x27;")
+        self.assertEqual(Expense.objects.get(description='Train').amount, Decimal('1234.50'))
+
+    def test_malformed_csv_is_reported_not_raised(self):
+        content = f'Date,Description,Category,Amount\n2025-01-02,{"x" * 200_000},Food,1.00\n'.encode()
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Could not read the file: Line 2: field larger than field limit')
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            f.write(content)
+            f.flush()
+            with self.assertRaisesMessage(CommandError, 'Line 2:'):
+                call_command('import_expenses', 'alice', f.name, stdout=StringIO())
+
+    def test_unknown_categories_rejected_when_not_created(self):
+        content = b'Date,Description,Category,Amount\n2025-01-02,Lunch,Food,12.00\n2025-01-02,Film,Fun,8.00\n'
+        result = import_expenses(self.user, BytesIO(content), create_categories=False)
+        self.assertEqual((result.created, result.errors), (1, [(3, "Unknown category 'Fun'.")]))
+        self.assertFalse(Category.objects.filter(name='Fun').exists())
+
+    def test_ofx_debits_become_expenses(self):
+        response = self.upload(OFX_STATEMENT, name='statement.ofx')
+        self.assertEqual(response.context['result'].created, 2)
+        self.assertEqual(
+            list(Expense.objects.order_by('date').values_list('date', 'description', 'amount', 'category__name')),
+            [(date(2025, 3, 4), 'Grocer', Decimal('12.50'), 'Other'), (date(2025, 3, 6), 'Bus fare', Decimal('3.00'), 'Other')],
+        )
+
+    def test_queries_per_batch_do_not_grow_with_rows(self):
+        def import_rows(count):
+            lines = ['Date,Description,Category,Amount'] + [f'2025-01-{i % 28 + 1:02d},Row {i},Food,1.00' for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                import_expenses(self.user, BytesIO('\n'.join(lines).encode()), batch_size=500)
+            return len(queries)
+
+        self.assertEqual(import_rows(50), import_rows(500))
+        self.assertEqual(Expense.objects.count(), 550)
+        self.assertEqual(find_mismatches(self.user), [])
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            f.write(b'Date,Description,Category,Amount\n2025-01-02,Lunch,Food,12.00\nbad,row,Food,1\n')
+            f.flush()
+            out, err = StringIO(), StringIO()
+            call_command('import_expenses', 'alice', f.name, stdout=out, stderr=err)
+        self.assertIn('Imported 1 expenses, 1 rows rejected', out.getvalue())
+        self.assertIn('line 3:', err.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('import_expenses', 'nobody', 'missing.csv')
+
+
+class FakeUploadHandler(BaseHTTPRequestHandler):
+    """The Drive resumable upload protocol, served from memory by LocalDriveServer."""
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, headers=(), body=b''):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        session = f'/upload/session/{len(server.sessions) + 1}'
+        server.sessions[session] = bytearray()
+        self.reply(200, [('Location', f'http://127.0.0.1:{server.server_port}{session}')])
+
+    def do_PUT(self):
+        server = self.server
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        received = server.sessions[self.path]
+        content_range = self.headers['Content-Range']
+        size = int(content_range.rsplit('/', 1)[1])
+        if not content_range.startswith('bytes */'):
+            start = int(content_range.split()[1].split('-')[0])
+            server.chunk_starts.append((self.path, start))
+            received[start:] = data
+            if server.fail_chunks and len(server.chunk_starts) in server.fail_chunks:
+                # The chunk arrived but the response is lost
+                return self.reply(503)
+        if len(received) == size:
+            server.files.append(bytes(received))
+            return self.reply(200, [('Content-Type', 'application/json')], b'{"id": "local-id", "name": "upload.csv"}')
+        self.reply(308, [('Range', f'bytes=0-{len(received) - 1}')] if received else [])
+
+
+class LocalDriveServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeUploadHandler)
+        self.sessions, self.chunk_starts, self.files, self.fail_chunks = {}, [], [], ()
+
+
+local_drive = None
+
+
+def local_drive_service():
+    """A real Drive client whose API root is the LocalDriveServer."""
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    from googleapiclient.http import build_http
+
+    document = json.loads(get_static_doc('drive', 'v3'))
+    document['rootUrl'] = f'http://127.0.0.1:{local_drive.server_port}/'
+    return build_from_document(document, http=build_http())
+
+
+@override_settings(
+    EXPENSES_DRIVE_SERVICE_FACTORY='expenses.tests.local_drive_service',
+    EXPENSES_DRIVE_CHUNK_SIZE=4096, EXPENSES_DRIVE_NUM_RETRIES=0, EXPENSES_SPOOL_MAX_SIZE=8192,
+)
+class ResumableDriveUploadTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        global local_drive
+        local_drive = LocalDriveServer()
+        threading.Thread(target=local_drive.serve_forever, daemon=True).start()
+        self.addCleanup(local_drive.server_close)
+        self.addCleanup(local_drive.shutdown)
+        Expense.objects.bulk_create([  # ~19 KB of CSV in April 2025
+            Expense(user=self.user, category=self.category, amount=Decimal('10.00') + i,
+                    description=f'Expense {i}', date=date(2025, 4, 1 + i % 30))
+            for i in range(600)
+        ])
+        self.job = jobs.enqueue('drive_upload', self.user, {'year': 2025, 'month': 4})
+        self.expected = b''.join(
+            line.encode() for line in exports.stream_csv(exports.expense_rows(Expense.objects.filter(user=self.user)))
+        )
+
+    def run_job(self):
+        with self.assertNoLogs('expenses.jobs', 'WARNING'):
+            jobs.run_job(Job.objects.get(pk=self.job.pk))
+        self.job.refresh_from_db()
+
+    def test_export_is_spooled_to_disk_and_uploaded_in_chunks(self):
+        spool, _ = tasks.spool_csv(Expense.objects.filter(user=self.user))
+        self.assertTrue(spool._rolled)
+        self.run_job()
+        self.assertEqual(self.job.status, Job.SUCCEEDED)
+        self.assertEqual(local_drive.files, [self.expected])
+        self.assertEqual([start for _, start in local_drive.chunk_starts], list(range(0, len(self.expected), 4096)))
+        self.assertNotIn('upload', self.job.payload)
+
+    def test_each_chunk_renews_the_lease(self):
+        job = jobs.claim_next()
+        with mock.patch('expenses.jobs.heartbeat', wraps=jobs.heartbeat) as heartbeat:
+            self.run_job()
+        self.assertEqual(self.job.status, Job.SUCCEEDED)
+        # Every chunk but the last, which completes the upload
+        self.assertEqual(heartbeat.call_count, len(local_drive.chunk_starts) - 1)
+        self.assertEqual(heartbeat.call_args.args[0].pk, job.pk)
+
+    def test_interrupted_upload_resumes_where_it_stopped(self):
+        local_drive.fail_chunks = (3,)
+        with self.assertLogs('expenses.jobs', 'WARNING'):
+            jobs.run_job(self.job)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, Job.QUEUED)
+        self.assertEqual(self.job.payload['upload']['progress'], 8192)
+
+        local_drive.fail_chunks = ()
+        self.run_job()
+        self.assertEqual(self.job.status, Job.SUCCEEDED)
+        self.assertEqual(local_drive.files, [self.expected])
+        # One session; the retry continued after the third chunk, which the server already had
+        self.assertEqual(len(local_drive.sessions), 1)
+        self.assertEqual([start for _, start in local_drive.chunk_starts][:4], [0, 4096, 8192, 12288])
+
+    def test_changed_export_starts_a_new_upload(self):
+        local_drive.fail_chunks = (2,)
+        with self.assertLogs('expenses.jobs', 'WARNING'):
+            jobs.run_job(self.job)
+        Expense.objects.filter(user=self.user).update(amount=Decimal('1.00'))
+
+        self.run_job()
+        self.assertEqual(self.job.status, Job.SUCCEEDED)
+        self.assertEqual(len(local_drive.sessions), 2)
+        self.assertIn(b'2025-04-01,Expense 0,Food,1.00', local_drive.files[0])
+
+
+class SearchTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.travel = Category.objects.create(user=self.user, name='Travel')
+        for description, category, day in [
+            ('Coffee beans', self.category, date(2025, 1, 5)),
+            ('Coffee with coffee cake', self.category, date(2025, 1, 6)),
+            ('Train ticket', self.travel, date(2025, 2, 1)),
+            ('Café latte', self.category, date(2025, 3, 1)),
+        ]:
+            Expense.objects.create(user=self.user, category=category, amount=Decimal('3.00'), description=description, date=day)
+
+    def search(self, query, **kwargs):
+        return [e.description for e in search.search_expenses(self.user, query, **kwargs)[0]]
+
+    def test_ranked_prefix_matches(self):
+        self.assertEqual(self.search('coffee'), ['Coffee with coffee cake', 'Coffee beans'])
+        self.assertEqual(self.search('cof bea'), ['Coffee beans'])
+        self.assertEqual(self.search('cafe'), ['Café latte'])
+        self.assertEqual(self.search('"coffee" OR NEAR(train'), [])  # operators are taken literally
+        self.assertEqual(self.search('  '), [])
+
+    def test_category_and_date_filters(self):
+        self.assertEqual(self.search('t', category_id=self.travel.id), ['Train ticket'])
+        self.assertEqual(self.search('coffee', date_filter={'date__gte': date(2025, 1, 6)}), ['Coffee with coffee cake'])
+        bob = User.objects.create_user('bob', password='pass12345')
+        self.assertEqual(search.search_expenses(bob, 'coffee')[0], [])
+
+    def test_index_follows_writes(self):
+        expense = Expense.objects.get(description='Train ticket')
+        expense.description = 'Bus ticket'
+        expense.save()
+        self.assertEqual((self.search('train'), self.search('bus')), ([], ['Bus ticket']))
+        expense.delete()
+        self.assertEqual(self.search('ticket'), [])
+        import_expenses(self.user, BytesIO(b'Date,Description,Category,Amount\n2025-04-01,Imported teapot,Food,9.00\n'))
+        self.assertEqual(self.search('teapot'), ['Imported teapot'])
+
+    def test_triggers_are_restored_after_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_ai')
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), description='Muffin')
+        self.assertEqual(self.search('muffin'), [])
+        search.ensure_index(sender=None, using='default')
+        self.assertEqual(self.search('muffin'), ['Muffin'])
+
+    def test_search_view_paginates(self):
+        make_expenses(self.user, self.category, 12)
+        response = self.client.get(reverse('search'), {'q': 'expense', 'page_size': 5, 'page': 3})
+        self.assertEqual(len(response.context['expenses']), 2)
+        self.assertFalse(response.context['has_next'])
+        response = self.client.get(reverse('search'), {'q': 'coffee', 'category': self.category.id, 'start': '2025-01-06'})
+        self.assertContains(response, 'Coffee with coffee cake')
+        self.assertNotContains(response, 'Coffee beans')
+        self.assertContains(self.client.get(reverse('dashboard')), f'action="{reverse("search")}"')
+
+    def test_search_view_rejects_bad_filters(self):
+        make_expenses(self.user, self.category, 3)
+        response = self.client.get(reverse('search'), {'q': 'expense', 'page': '9' * 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page'], search.MAX_PAGE)
+        response = self.client.get(reverse('search'), {'q': 'expense', 'end': '9999-12-31'})
+        self.assertEqual(len(response.context['expenses']), 3)
+        for params, error in [
+            ({'category': '9' * 30}, 'Choose one of your categories.'),
+            ({'start': '2025-02-30'}, "&#x27;From&#x27; must be a valid date."),
+            ({'start': '2025-03-01', 'end': '2025-01-01'}, "&#x27;From&#x27; must not be after &#x27;To&#x27;."),
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse('search'), {'q': 'expense', **params})
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, error)
+                self.assertEqual(response.context['expenses'], [])
+
+    def test_admin_search_uses_index_and_category(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:expenses_expense_changelist'), {'q': 'travel'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(reverse('admin:expenses_expense_changelist'), {'q': 'coff'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class AnalyticsApiTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.travel = Category.objects.create(user=self.user, name='Travel')
+        for category, amount, day, description in [
+            (self.category, '10.00', date(2025, 1, 31), 'Dinner'),
+            (self.category, '5.50', date(2025, 2, 1), 'Lunch'),
+            (self.travel, '40.00', date(2025, 2, 14), 'Train'),
+            (self.category, '2.25', date(2025, 3, 2), 'Coffee'),
+        ]:
+            Expense.objects.create(user=self.user, category=category, amount=Decimal(amount), date=day, description=description)
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        return response, json.loads(response.content)
+
+    def test_monthly_totals_fill_empty_months(self):
+        _, data = self.get('api_monthly_totals', start='2024-12-15', end='2025-03-01')
+        self.assertEqual(data['start'], '2024-12-01')
+        self.assertEqual(data['results'], [
+            {'month': '2024-12', 'total': '0.00', 'count': 0},
+            {'month': '2025-01', 'total': '10.00', 'count': 1},
+            {'month': '2025-02', 'total': '45.50', 'count': 2},
+            {'month': '2025-03', 'total': '2.25', 'count': 1},
+        ])
+        # An open range runs to the first expense, and is capped like an explicit one
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), date=date(1900, 1, 1))
+        response, data = self.get('api_monthly_totals', range='all')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(api.MAX_MONTHS), data['error'])
+
+    def test_category_breakdown_over_partial_months(self):
+        # Jan 31 - Feb 28 (a whole month plus a partial one) and Feb 10 - Mar 5 (two partial months)
+        for params, expected in [
+            ({'start': '2025-01-31', 'end': '2025-02-28'}, [('Travel', '40.00', 1), ('Food', '15.50', 2)]),
+            ({'start': '2025-02-10', 'end': '2025-03-05'}, [('Travel', '40.00', 1), ('Food', '2.25', 1)]),
+            ({'range': 'all'}, [('Travel', '40.00', 1), ('Food', '17.75', 3)]),
+            ({'range': 'all', 'category': self.category.id}, [('Food', '17.75', 3)]),
+        ]:
+            with self.subTest(params=params):
+                _, data = self.get('api_category_breakdown', **params)
+                self.assertEqual([(r['category'], r['total'], r['count']) for r in data['results']], expected)
+
+    def test_daily_series_and_top_expenses(self):
+        _, data = self.get('api_daily_series', start='2025-01-31', end='2025-02-02', fields='date,total')
+        self.assertEqual(data['results'], [
+            {'date': '2025-01-31', 'total': '10.00'}, {'date': '2025-02-01', 'total': '5.50'}, {'date': '2025-02-02', 'total': '0.00'},
+        ])
+        _, data = self.get('api_top_expenses', range='all', limit=2, fields='description,amount')
+        self.assertEqual(data['results'], [{'description': 'Train', 'amount': '40.00'}, {'description': 'Dinner', 'amount': '10.00'}])
+
+    def test_bad_parameters(self):
+        for name, params in [
+            ('api_monthly_totals', {'start': '2025-13-01'}),
+            ('api_category_breakdown', {'start': '2025-03-01', 'end': '2025-01-01'}),
+            ('api_daily_series', {'range': 'all'}),
+            ('api_top_expenses', {'limit': '1000'}),
+            ('api_top_expenses', {'fields': 'amount,password'}),
+            ('api_monthly_totals', {'start': '0001-01-01', 'end': '2025-01-01'}),
+            ('api_monthly_totals', {'start': '9999-01-01', 'end': '9999-12-15'}),
+            ('api_category_breakdown', {'end': '9999-12-31'}),
+            ('api_daily_series', {'start': '9999-12-30', 'end': '9999-12-31'}),
+            ('api_top_expenses', {'range': 'all', 'category': '9' * 30}),
+            ('api_category_breakdown', {'category': '²'}),
+            ('api_top_expenses', {'limit': '²'}),
+        ]:
+            with self.subTest(name=name, params=params):
+                response, data = self.get(name, **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', data)
+        self.client.logout()
+        self.assertEqual(self.get('api_top_expenses')[0].status_code, 401)
+
+    def test_conditional_get_and_gzip(self):
+        url = reverse('api_monthly_totals')
+        params = {'start': '2025-01-01', 'end': '2025-12-31'}
+        first = self.client.get(url, params, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        with self.assertNumQueries(2):  # the session and user; no aggregation
+            again = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), date=date(2025, 6, 1))
+        changed = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+
+class TrendReportTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.travel = Category.objects.create(user=self.user, name='Travel')
+        for category, amount, day in [
+            (self.category, '10.00', date(2025, 1, 5)),
+            (self.category, '20.00', date(2025, 3, 5)),
+            (self.travel, '40.00', date(2025, 3, 20)),
+            (self.category, '30.00', date(2024, 6, 1)),
+        ]:
+            Expense.objects.create(user=self.user, category=category, amount=Decimal(amount), date=day)
+
+    def test_monthly_series_deltas_and_rolling_average(self):
+        with self.assertNumQueries(1):
+            report = trends.trend_report(self.user, count=4, window=2, today=date(2025, 4, 10))
+        self.assertEqual(report['labels'], ['2025-01', '2025-02', '2025-03', '2025-04'])
+        self.assertEqual(
+            [(c['name'], c['series']) for c in report['categories']],
+            [('Travel', [0, 0, 40, 0]), ('Food', [10, 0, 20, 0])],
+        )
+        totals = report['totals']
+        self.assertEqual([p['total'] for p in totals], [10, 0, 60, 0])
+        self.assertEqual([p['delta'] for p in totals], [None, -10, 60, -60])
+        self.assertEqual([p['delta_percent'] for p in totals], [None, Decimal('-100.0'), None, Decimal('-100.0')])
+        self.assertEqual([p['rolling'] for p in totals], [Decimal('10.00'), Decimal('5.00'), Decimal('30.00'), Decimal('30.00')])
+        self.assertEqual(totals[2]['by_category'], [40, 20])
+
+    def test_yearly_trend(self):
+        report = trends.trend_report(self.user, granularity=trends.YEAR, count=3, today=date(2025, 4, 10))
+        self.assertEqual(report['labels'], ['2023', '2024', '2025'])
+        self.assertEqual([p['total'] for p in report['totals']], [0, 30, 70])
+
+    def test_trends_view(self):
+        response = self.client.get(reverse('trends'), {'granularity': 'month', 'count': 500, 'window': 'x'})
+        self.assertEqual((response.context['count'], response.context['window']), (120, trends.DEFAULT_WINDOW))
+        self.assertEqual(len(response.context['totals']), 120)
+        self.assertContains(response, 'id="trend-data"')
+
+    def test_ten_years_in_one_query(self):
+        sampledata.generate(users=1, expenses_per_user=20000, days=3650, seed=3, prefix='trend')
+        user = User.objects.get(username='trend0')
+        with self.assertNumQueries(1):
+            report = trends.trend_report(user, count=120)
+        start = date.fromisoformat(report['labels'][0] + '-01')
+        expected = Expense.objects.filter(user=user, date__gte=start).aggregate(total=Sum('amount'))['total']
+        self.assertEqual(sum(p['total'] for p in report['totals']), expected.quantize(Decimal('0.01')))
+
+
+@skipUnless(analytics.numpy_available(), "NumPy is not installed")
+class SpendingInsightsTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        # Three months of four similar expenses, then a month in progress
+        for month in (1, 2, 3):
+            for day, amount in [(5, '10.00'), (15, '12.00'), (25, '14.00'), (28, '11.00')]:
+                Expense.objects.create(user=self.user, category=self.category, amount=Decimal(amount),
+                                       date=date(2025, month, day))
+        self.today = date(2025, 4, 10)
+        self.period = resolve_period({'year': 2025, 'month': 4}, self.today)
+        self.usual = Expense.objects.create(user=self.user, category=self.category, amount=Decimal('12.00'),
+                                            date=date(2025, 4, 2))
+        self.outlier = Expense.objects.create(user=self.user, category=self.category, amount=Decimal('500.00'),
+                                              date=date(2025, 4, 3), description='New phone')
+
+    def test_load_history_in_one_query(self):
+        with self.assertNumQueries(1):
+            dates, category_ids, amounts = analytics.load_history(self.user, before=date(2025, 4, 1))
+        self.assertEqual(len(dates), 12)
+        self.assertEqual(str(dates.min()), '2025-01-05')
+        self.assertEqual(set(category_ids.tolist()), {self.category.id})
+        self.assertAlmostEqual(amounts.sum(), 141.0)
+
+    def test_outlier_flagged_and_forecast(self):
+        insights = analytics.insights(self.user, self.period, self.today)
+        self.assertEqual([(expense, typical) for expense, _, typical in insights['anomalies']],
+                         [(self.outlier, Decimal('11.66'))])
+        forecast, = insights['forecast']
+        self.assertEqual(forecast['category'], 'Food')
+        self.assertAlmostEqual(forecast['typical'], 47.0)
+        # 10 of each month's 47 is usually spent by the 10th
+        self.assertAlmostEqual(forecast['forecast'], 512 + 37.0)
+
+    def test_no_forecast_for_past_months(self):
+        period = resolve_period({'year': 2025, 'month': 3}, self.today)
+        self.assertEqual(analytics.insights(self.user, period, self.today)['forecast'], [])
+
+    def test_seasonal_index_after_two_years(self):
+        import numpy as np
+
+        dates = np.arange('2023-01-01', '2025-01-01', dtype='datetime64[D]')
+        amounts = np.where(dates.astype('datetime64[M]').astype(int) % 12 == 11, 20.0, 10.0)
+        params = analytics.fit(dates, np.ones(len(dates), dtype=int), amounts)
+        self.assertGreater(params['seasonal'][0, 11], 1.5)
+        self.assertLess(params['seasonal'][0, 5], 1)
+
+    def test_fitted_parameters_cached_until_history_changes(self):
+        with mock.patch.object(analytics, 'fit', wraps=analytics.fit) as fit:
+            analytics.insights(self.user, self.period, self.today)
+            analytics.insights(self.user, self.period, self.today)
+            self.assertEqual(fit.call_count, 1)
+            # The current month is not part of the fit
+            Expense.objects.create(user=self.user, category=self.category, amount=Decimal('9.00'),
+                                   date=timezone.now().date())
+            analytics.insights(self.user, self.period, self.today)
+            self.assertEqual(fit.call_count, 1)
+            Expense.objects.create(user=self.user, category=self.category, amount=Decimal('9.00'),
+                                   date=date(2025, 3, 1))
+            analytics.insights(self.user, self.period, self.today)
+            self.assertEqual(fit.call_count, 2)
+
+    def test_report_page_shows_insights(self):
+        with mock.patch('expenses.views.timezone.now', return_value=timezone.make_aware(datetime(2025, 4, 10))):
+            response = self.client.get(reverse('report'))
+        self.assertContains(response, 'Month-end Forecast')
+        self.assertContains(response, 'New phone')
+
+    def test_benchmark(self):
+        results = benchmarks.run_analytics_benchmarks(rows=10000, iterations=1, warmup=0, user=self.user)
+        self.assertEqual(set(results), {'fit', 'load_history', 'insights_cold', 'insights_warm'})
+        self.assertEqual(results['load_history']['queries'], 1)
+
+
+class BudgetTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+        self.travel = Category.objects.create(user=self.user, name='Travel')
+        budgets.set_budget(self.user, self.category, Decimal('100.00'))
+
+    def spent(self, category=None):
+        return Budget.objects.get(category=category or self.category).spent
+
+    def test_counter_follows_create_edit_and_delete(self):
+        expense = Expense.objects.create(user=self.user, category=self.category, amount=Decimal('30.00'), date=self.today)
+        self.assertEqual(self.spent(), Decimal('30.00'))
+        expense.amount = Decimal('45.50')
+        expense.save()
+        self.assertEqual(self.spent(), Decimal('45.50'))
+        # Earlier months and other categories are not counted
+        expense.date = self.today.replace(day=1) - timedelta(days=1)
+        expense.save()
+        self.assertEqual(self.spent(), Decimal('0.00'))
+        expense.date, expense.category = self.today, self.travel
+        expense.save()
+        self.assertEqual(self.spent(), Decimal('0.00'))
+        expense.category = self.category
+        expense.save()
+        self.assertEqual(self.spent(), Decimal('45.50'))
+        expense.delete()
+        self.assertEqual(self.spent(), Decimal('0.00'))
+
+    def test_counter_follows_bulk_import(self):
+        csv_file = BytesIO(f"Date,Description,Category,Amount\n{self.today},Lunch,Food,12.50\n".encode())
+        import_expenses(self.user, csv_file, file_format='csv')
+        self.assertEqual(self.spent(), Decimal('12.50'))
+
+    def test_new_budget_starts_from_this_months_spend(self):
+        Expense.objects.create(user=self.user, category=self.travel, amount=Decimal('80.00'), date=self.today)
+        budgets.set_budget(self.user, self.travel, Decimal('50.00'))
+        budget = Budget.objects.get(category=self.travel)
+        self.assertEqual((budget.spent, budget.is_over, budget.percent), (Decimal('80.00'), True, 100))
+
+    def test_status_is_one_query_and_rolls_over_to_a_new_month(self):
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('25.00'), date=self.today)
+        with self.assertNumQueries(1):
+            status, = budgets.current_budgets(self.user)
+            self.assertEqual((status.category.name, status.spent, status.remaining), ('Food', Decimal('25.00'), Decimal('75.00')))
+
+        next_month = rollups.next_month(self.today)
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('7.00'), date=next_month)
+        status, = budgets.current_budgets(self.user, today=next_month)
+        self.assertEqual((status.month, status.spent), (next_month, Decimal('7.00')))
+
+    def test_reconcile_fixes_drift(self):
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('25.00'), date=self.today)
+        Budget.objects.update(spent=Decimal('999.00'))
+        out = StringIO()
+        call_command('reconcile_budgets', stdout=out)
+        self.assertIn('counted 999.00, actual 25.00', out.getvalue())
+        self.assertEqual(self.spent(), Decimal('25.00'))
+        self.assertEqual(budgets.reconcile(), [])
+
+    def test_budgets_view_sets_and_removes(self):
+        self.client.post(reverse('budgets'), {'category': self.travel.id, 'amount': '60'})
+        self.assertEqual(Budget.objects.get(category=self.travel).amount, Decimal('60.00'))
+        self.client.post(reverse('budgets'), {'category': self.travel.id, 'amount': '0'})
+        self.assertFalse(Budget.objects.filter(category=self.travel).exists())
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, '₹0.00 of ₹100.00')
+
+
+class BulkOperationTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+        self.travel = Category.objects.create(user=self.user, name='Travel')
+        budgets.set_budget(self.user, self.travel, Decimal('500.00'))
+        make_expenses(self.user, self.category, 6, start=self.today.replace(day=1))
+        self.ids = list(Expense.objects.filter(user=self.user).order_by('id').values_list('id', flat=True))
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pass12345')
+        make_expenses(self.bob, Category.objects.create(user=self.bob, name='Food'), 3)
+        self.bobs = list(Expense.objects.filter(user=self.bob).values_list('id', flat=True))
+
+    def test_each_operation_is_one_write_query_scoped_to_the_owner(self):
+        selection = bulk.select(self.user, ids=self.ids[:4] + self.bobs)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk.recategorise(self.user, selection, self.travel), 4)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "expenses_expense"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"user_id" =', updates[0])
+        self.assertEqual(Budget.objects.get(category=self.travel).spent, Decimal('46.00'))
+        self.assertEqual(Expense.objects.filter(user=self.bob, category__name='Food').count(), 3)
+
+        day = self.today.replace(day=1) - timedelta(days=1)
+        self.assertEqual(bulk.change_date(self.user, bulk.select(self.user, ids=self.ids[:2]), day), 2)
+        self.assertEqual(Budget.objects.get(category=self.travel).spent, Decimal('25.00'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk.delete(self.user, bulk.select(self.user, ids=self.ids[3:] + self.bobs)), 3)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('DELETE FROM "expenses_expense"')]), 1)
+        # The previous totals are summed by the database, not read row by row
+        reads = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and '"expenses_expense"' in query['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertIn('GROUP BY', reads[0])
+        self.assertEqual(Budget.objects.get(category=self.travel).spent, Decimal('12.00'))
+        self.assertEqual(Expense.objects.filter(user=self.bob).count(), 3)
+        self.assertEqual(find_mismatches(self.user), [])
+        self.assertEqual(budgets.reconcile(), [])
+
+    def test_category_of_another_user_is_refused(self):
+        with self.assertRaises(ValueError):
+            bulk.recategorise(self.user, bulk.select(self.user, ids=self.ids), Category.objects.get(user=self.bob))
+
+    def test_view_applies_to_selection_or_search_filter(self):
+        response = self.client.post(reverse('bulk_expenses'), {
+            'action': bulk.RECATEGORISE, 'category': self.travel.id, 'ids': self.ids[:2] + self.bobs,
+        }, follow=True)
+        self.assertRedirects(response, reverse('dashboard'))
+        self.assertContains(response, '2 expense(s) moved to Travel.')
+        self.assertEqual(Expense.objects.filter(category=self.travel).count(), 2)
+
+        next_url = reverse('search') + '?q=expense'
+        response = self.client.post(reverse('bulk_expenses'), {
+            'action': bulk.DELETE, 'scope': 'filter', 'q': 'Expense', 'filter_category': self.category.id, 'next': next_url,
+        })
+        self.assertRedirects(response, next_url)
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(find_mismatches(self.user), [])
+
+    def test_view_reports_invalid_requests(self):
+        response = self.client.post(reverse('bulk_expenses'), {'action': bulk.CHANGE_DATE, 'ids': self.ids}, follow=True)
+        self.assertContains(response, 'Choose the new date.')
+        response = self.client.post(reverse('bulk_expenses'), {'action': bulk.DELETE}, follow=True)
+        self.assertContains(response, 'Select at least one expense.')
+        response = self.client.post(reverse('bulk_expenses'), {'action': bulk.DELETE, 'scope': 'filter'}, follow=True)
+        self.assertContains(response, 'Filter the expenses first.')
+        # Ids beyond the range of the column are refused before reaching the database
+        response = self.client.post(reverse('bulk_expenses'), {'action': bulk.DELETE, 'ids': ['9' * 30]}, follow=True)
+        self.assertContains(response, 'Invalid selection.')
+        response = self.client.post(reverse('bulk_expenses'), {
+            'action': bulk.DELETE, 'scope': 'filter', 'filter_category': '9' * 30,
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 6)
+
+
+class CategoryCacheTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.travel = Category.objects.create(user=self.user, name='Travel')
+        self.form = {'amount': '12.00', 'description': 'Bus', 'category': self.travel.id, 'date': '2025-03-04'}
+
+    def test_registration_seeds_defaults_in_one_insert(self):
+        self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('register'), {
+                'username': 'carol', 'email': 'carol@example.com', 'password1': 'x9!kq2LmZ', 'password2': 'x9!kq2LmZ',
+            })
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "expenses_category"')]
+        self.assertEqual(len(inserts), 1)
+        carol = User.objects.get(username='carol')
+        self.assertEqual([name for _, name in categories.user_categories(carol.id)], sorted(categories.DEFAULT_CATEGORIES))
+
+    def test_forms_render_choices_from_the_cache(self):
+        categories.user_categories(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertIn('Food', str(ExpenseForm(user=self.user)['category']))
+        # A submitted category is read once, to check it still exists
+        with self.assertNumQueries(1):
+            form = ExpenseForm(self.form, user=self.user)
+            self.assertTrue(form.is_valid())
+            self.assertEqual(form.cleaned_data['category'].name, 'Travel')
+        expense = form.save(commit=False)
+        expense.user = self.user
+        expense.save()
+        self.assertEqual(Expense.objects.get().category, self.travel)
+
+        bob = User.objects.create_user('bob', password='pass12345')
+        bobs = Category.objects.create(user=bob, name='Secret')
+        self.assertFalse(ExpenseForm(dict(self.form, category=bobs.id), user=self.user).is_valid())
+
+    def test_stale_cache_in_another_process_is_a_form_error(self):
+        cached = categories.user_categories(self.user.id)
+        self.travel.delete()
+        # As in a process whose local cache the deletion did not reach
+        reportcache.get_cache().set(categories._key(self.user.id), cached)
+        response = self.client.post(reverse('dashboard'), self.form)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Select a valid choice.')
+        self.assertFalse(Expense.objects.exists())
+
+    def test_stale_cache_cannot_hide_a_duplicate_name(self):
+        categories.user_categories(self.user.id)
+        # Added by another process: bulk_create sends no signals, so this process's cache keeps the old list
+        Category.objects.bulk_create([Category(user=self.user, name='Rent')])
+        response = self.client.post(reverse('categories'), {'name': 'rent'})
+        self.assertContains(response, 'You already have a category with this name.')
+        response = self.client.post(reverse('rename_category', args=[self.travel.id]), {'name': 'RENT'}, follow=True)
+        self.assertContains(response, 'You already have a category with this name.')
+        self.assertEqual(Category.objects.filter(user=self.user, name__iexact='rent').count(), 1)
+
+    def test_category_changes_invalidate_the_cache(self):
+        self.client.post(reverse('categories'), {'name': 'Rent'})
+        self.assertContains(self.client.get(reverse('dashboard')), '>Rent</option>')
+        response = self.client.post(reverse('categories'), {'name': 'rent'})
+        self.assertContains(response, 'You already have a category with this name.')
+
+        self.client.post(reverse('rename_category', args=[self.travel.id]), {'name': 'Trips'})
+        self.assertEqual([name for _, name in categories.user_categories(self.user.id)], ['Food', 'Rent', 'Trips'])
+
+        Expense.objects.create(user=self.user, category=self.travel, amount=Decimal('9.00'), date=date(2025, 3, 4))
+        response = self.client.post(reverse('delete_category', args=[self.travel.id]), follow=True)
+        self.assertContains(response, 'Category Trips and its 1 expense(s) deleted.')
+        self.assertNotContains(response, 'Trips</span>')
+        self.assertFalse(Expense.objects.exists())
+        self.assertEqual(find_mismatches(self.user), [])
+
+
+class RecurringExpenseTests(ExpensesTestCase):
+    def rule(self, **fields):
+        fields = {'user': self.user, 'category': self.category, 'amount': Decimal('15.00'),
+                  'start_date': date(2025, 1, 31), **fields}
+        return RecurringExpense.objects.create(**fields)
+
+    def dates(self, rule):
+        return [str(day) for day in rule.occurrences.order_by('date').values_list('date', flat=True)]
+
+    def test_monthly_interval_keeps_the_day_and_is_idempotent(self):
+        rule = self.rule(description='Rent')
+        stats = recurring.materialize_due(today=date(2025, 5, 1))
+        self.assertEqual((stats['created'], stats['rules']), (4, 1))
+        self.assertEqual(self.dates(rule), ['2025-01-31', '2025-02-28', '2025-03-31', '2025-04-30'])
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_date, date(2025, 5, 31))
+
+        self.assertEqual(recurring.materialize_due(today=date(2025, 5, 1))['created'], 0)
+        self.assertEqual(Expense.objects.filter(description='Rent').count(), 4)
+        # Rollups are kept up to date through expenses_bulk_changed
+        self.assertEqual(find_mismatches(self.user), [])
+
+    def test_cron_schedule(self):
+        # The 1st and 15th of every month, and every Monday in March
+        schedule = recurring.CronSchedule('0 9 1,15 * *')
+        self.assertEqual(schedule.next_on_or_after(date(2025, 1, 2)), date(2025, 1, 15))
+        mondays = recurring.CronSchedule('0 0 * mar mon')
+        self.assertEqual(mondays.next_on_or_after(date(2025, 1, 1)), date(2025, 3, 3))
+        either = recurring.CronSchedule('0 0 13 * fri')
+        self.assertEqual(either.next_on_or_after(date(2025, 6, 1)), date(2025, 6, 6))
+        with self.assertRaises(ValueError):
+            recurring.CronSchedule('0 0 32 * *')
+
+        rule = self.rule(cron='0 0 1,15 * *', start_date=date(2025, 1, 10))
+        recurring.materialize_due(today=date(2025, 2, 14))
+        self.assertEqual(self.dates(rule), ['2025-01-15', '2025-02-01'])
+
+    def test_end_date_and_weekly_interval(self):
+        rule = self.rule(unit=RecurringExpense.WEEK, interval=2, start_date=date(2025, 1, 1), end_date=date(2025, 1, 31))
+        recurring.materialize_due(today=date(2025, 3, 1))
+        self.assertEqual(self.dates(rule), ['2025-01-01', '2025-01-15', '2025-01-29'])
+        rule.refresh_from_db()
+        self.assertEqual((rule.is_active, rule.next_date), (False, None))
+
+    def test_batches_and_catch_up_limit(self):
+        for _ in range(5):
+            self.rule(unit=RecurringExpense.DAY, start_date=date(2025, 1, 1))
+        # Ten daily occurrences each, at most four per rule and run
+        stats = recurring.materialize_due(today=date(2025, 1, 10), batch_size=2, max_per_rule=4)
+        self.assertEqual((stats['batches'], stats['created'], stats['behind']), (3, 20, 5))
+        stats = recurring.materialize_due(today=date(2025, 1, 10), batch_size=2, max_per_rule=4)
+        self.assertEqual((stats['created'], stats['behind']), (20, 5))
+        stats = recurring.materialize_due(today=date(2025, 1, 10), batch_size=2, max_per_rule=4)
+        self.assertEqual((stats['created'], stats['behind']), (10, 0))
+        self.assertEqual(recurring.materialize_due(today=date(2025, 1, 10))['rules'], 0)
+        self.assertEqual(Expense.objects.count(), 50)
+
+    def test_a_racing_run_never_duplicates(self):
+        rule = self.rule(start_date=date(2025, 1, 1))
+        Expense.objects.create(user=self.user, category=self.category, amount=Decimal('15.00'),
+                               date=date(2025, 1, 1), recurring=rule)
+        # As if the other run inserted its occurrence after this one looked
+        with mock.patch.object(recurring, '_existing_occurrences', return_value=set()):
+            with self.assertLogs('expenses.recurring', 'WARNING'):
+                stats = recurring.materialize_due(today=date(2025, 1, 5))
+        self.assertEqual((stats['created'], stats['conflicts']), (0, 1))
+        self.assertEqual(rule.occurrences.count(), 1)
+
+    def test_reactivated_rule_skips_existing_occurrences_without_blocking_others(self):
+        rule = self.rule(start_date=date(2025, 1, 1))
+        recurring.materialize_due(today=date(2025, 3, 5))
+        RecurringExpense.objects.filter(pk=rule.pk).update(is_active=True, next_date=None)
+        bob = User.objects.create_user('bob', password='pass12345')
+        other = self.rule(user=bob, category=Category.objects.create(user=bob, name='Rent'), start_date=date(2025, 4, 1))
+
+        stats = recurring.materialize_due(today=date(2025, 5, 5))
+        self.assertEqual((stats['created'], stats['conflicts']), (4, 0))
+        self.assertEqual(self.dates(rule), ['2025-01-01', '2025-02-01', '2025-03-01', '2025-04-01', '2025-05-01'])
+        self.assertEqual(self.dates(other), ['2025-04-01', '2025-05-01'])
+        self.assertEqual(find_mismatches(self.user), [])
+
+    def test_large_batch_of_reactivated_rules(self):
+        RecurringExpense.objects.bulk_create([
+            RecurringExpense(user=self.user, category=self.category, amount=Decimal('1.00'), start_date=date(2025, 1, 1))
+            for _ in range(1200)
+        ])
+        self.assertEqual(recurring.materialize_due(today=date(2025, 1, 5), batch_size=1200)['created'], 1200)
+        RecurringExpense.objects.update(next_date=None)
+        stats = recurring.materialize_due(today=date(2025, 2, 5), batch_size=1200)
+        self.assertEqual((stats['batches'], stats['created'], stats['conflicts']), (1, 1200, 0))
+        self.assertEqual(Expense.objects.count(), 2400)
+
+    def test_schedule_ending_past_the_last_date_does_not_abort_the_run(self):
+        huge = self.rule(unit=RecurringExpense.YEAR, interval=10000, start_date=date(2025, 1, 1))
+        normal = self.rule(start_date=date(2025, 1, 1))
+        recurring.materialize_due(today=date(2025, 2, 5))
+        huge.refresh_from_db()
+        self.assertEqual((self.dates(huge), huge.is_active), (['2025-01-01'], False))
+        self.assertEqual(self.dates(normal), ['2025-01-01', '2025-02-01'])
+        daily = recurring.Schedule(RecurringExpense(unit=RecurringExpense.DAY, start_date=date.max))
+        self.assertEqual(daily.occurrences(date.max, date.max, 5), ([date.max], None))
+        with self.assertRaises(ValidationError):
+            RecurringExpense(user=self.user, category=self.category, amount=1, interval=10000).clean()
+
+    def test_invalid_cron_disables_the_rule(self):
+        rule = self.rule(cron='not a schedule')
+        out = StringIO()
+        with self.assertLogs('expenses.recurring', 'WARNING'):
+            call_command('materialize_recurring', '--date', '2025-03-01', stdout=out)
+        rule.refresh_from_db()
+        self.assertFalse(rule.is_active)
+        self.assertIn('0 expenses created from 1 due rules', out.getvalue())
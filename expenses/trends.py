@@ -0,0 +1,101 @@
+from datetime import date
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import MonthlyCategoryTotal
+from .rollups import CENT
+
+# Trend report over the last N months or years. All the data comes from one
+# query on the rollup table (already one row per category and month); the
+# series, deltas and rolling averages are then computed in memory over dense
+# per-period lists, with empty periods filled with zero.
+
+MONTH, YEAR = 'month', 'year'
+DEFAULT_COUNT = {MONTH: 12, YEAR: 5}
+MAX_COUNT = {MONTH: 120, YEAR: 10}
+DEFAULT_WINDOW = 3
+
+ZERO = Decimal('0.00')
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def period_labels(granularity, first, count):
+    """Labels for `count` periods starting at index `first` ('2025-01' for months, '2025' for years)."""
+    if granularity == YEAR:
+        return [str(first + offset) for offset in range(count)]
+    return [f'{(first + offset) // 12}-{(first + offset) % 12 + 1:02d}' for offset in range(count)]
+
+
+def rolling_average(values, window):
+    """Trailing mean over up to `window` values, using a running sum (one pass)."""
+    averages, running = [], ZERO
+    for i, value in enumerate(values):
+        running += value
+        if i >= window:
+            running -= values[i - window]
+        averages.append((running / min(i + 1, window)).quantize(CENT))
+    return averages
+
+
+def deltas(values):
+    """Change from the previous period as (amount, percent); percent is None after an empty period."""
+    changes = [(None, None)]
+    for previous, current in zip(values, values[1:]):
+        percent = ((current - previous) / previous * 100).quantize(Decimal('0.1')) if previous else None
+        changes.append((current - previous, percent))
+    return changes
+
+
+def trend_report(user, granularity=MONTH, count=None, window=DEFAULT_WINDOW, today=None):
+    """
+    Returns the trend over the last `count` months or years, ending with the
+    current one, as a dict with:
+      labels      period labels, oldest first
+      categories  [{'name', 'series', 'total'}], biggest total first
+      totals      one dict per period with 'label', 'total', 'delta',
+                  'delta_percent', 'rolling' (mean of the last `window`
+                  periods) and 'by_category' (in the order of categories)
+    """
+    count = count or DEFAULT_COUNT[granularity]
+    today = today or timezone.now().date()
+    if granularity == YEAR:
+        last = today.year
+        first = last - count + 1
+        start = date(first, 1, 1)
+    else:
+        last = _month_index(today)
+        first = last - count + 1
+        start = date(first // 12, first % 12 + 1, 1)
+
+    rows = (
+        MonthlyCategoryTotal.objects.filter(user=user, month__gte=start, month__lte=today)
+        .values_list('month', 'category__name', 'total')
+    )
+    series = {}
+    for month, name, total in rows:
+        index = (month.year if granularity == YEAR else _month_index(month)) - first
+        series.setdefault(name, [ZERO] * count)[index] += total
+
+    categories = sorted(
+        ({'name': name, 'series': values, 'total': sum(values, ZERO)} for name, values in series.items()),
+        key=lambda category: (-category['total'], category['name']),
+    )
+    totals = [sum(column, ZERO) for column in zip(*series.values())] or [ZERO] * count
+    labels = period_labels(granularity, first, count)
+    rolling = rolling_average(totals, window)
+    changes = deltas(totals)
+    return {
+        'labels': labels,
+        'categories': categories,
+        'totals': [
+            {
+                'label': labels[i], 'total': totals[i], 'delta': changes[i][0], 'delta_percent': changes[i][1],
+                'rolling': rolling[i], 'by_category': [category['series'][i] for category in categories],
+            }
+            for i in range(count)
+        ],
+    }
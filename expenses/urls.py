@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Authentication
@@ -9,18 +9,39 @@ urlpatterns = [
     
     # Core App
     path('', views.dashboard, name='dashboard'),
+    path('expenses/rows/', views.expense_rows, name='expense_rows'),
+    path('search/', views.search_view, name='search'),
     path('edit/<int:expense_id>/', views.edit_expense, name='edit_expense'),
     path('delete/<int:expense_id>/', views.delete_expense, name='delete_expense'),
+    path('expenses/bulk/', views.bulk_expenses, name='bulk_expenses'),
+    path('budgets/', views.budgets_view, name='budgets'),
+    path('categories/', views.categories_view, name='categories'),
+    path('categories/<int:category_id>/rename/', views.rename_category, name='rename_category'),
+    path('categories/<int:category_id>/delete/', views.delete_category, name='delete_category'),
     
     # Reporting & Exporting
     path('report/', views.report_view, name='report'),
+    path('report/trends/', views.trends_view, name='trends'),
     path('export-csv/', views.export_csv, name='export_csv'),
+    path('export/<str:fmt>/', views.export_columnar, name='export_columnar'),
+    path('import/', views.import_expenses, name='import_expenses'),
     
     # Google Drive Integration
     path('upload-to-drive/', views.upload_to_drive, name='upload_to_drive'),
+    path('authorize-drive/', views.authorize_drive, name='authorize_drive'),
     path('oauth2callback', views.oauth2callback, name='oauth2callback'),
 
     path('email-report/', views.email_report, name='email_report'),
+    path('email-digest/', views.toggle_digest, name='toggle_digest'),
+
+    # Background jobs
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+
+    # Read-only JSON API
+    path('api/v1/monthly/', api.monthly_totals, name='api_monthly_totals'),
+    path('api/v1/categories/', api.category_breakdown, name='api_category_breakdown'),
+    path('api/v1/daily/', api.daily_series, name='api_daily_series'),
+    path('api/v1/top/', api.top_expenses, name='api_top_expenses'),
 ]
 
 
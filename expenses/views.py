@@ -1,30 +1,38 @@
-import json
+import functools
+import hashlib
 from datetime import datetime, timedelta
+from asgiref.sync import sync_to_async
 from django.urls import reverse # <-- FIX: Added the missing import
 from django.utils import timezone
-from django.db.models import Sum
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Expense, Category
-from .forms import ExpenseForm, CustomUserCreationForm
-from django.http import HttpResponse
-import csv
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
-from django.utils.html import strip_tags
-
-# Imports for Google Drive API
-import os
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-import io
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count
+from .models import MAX_ID, Budget, Expense, Category, DigestSubscription, Job
+from .forms import BudgetForm, BulkActionForm, CategoryForm, ExpenseForm, CustomUserCreationForm, SearchForm
+from .pagination import get_page_size, paginate_expenses
+from .periods import resolve_period, resolve_range, range_filter
+from . import analytics, budgets, bulk, categories, columnar, drive, exports, imports, jobs, reportcache, search, trends
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, url_has_allowed_host_and_scheme
+
+
+def async_login_required(view):
+    """login_required for async views, which Django 4.2's decorator does not support."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Resolving the lazy user reads the session and database, so not on the event loop
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
 
 
 def register_view(request):
@@ -37,11 +45,7 @@ def register_view(request):
             user = form.save()
             
             # Create some default categories for the new user
-            Category.objects.create(user=user, name='Food')
-            Category.objects.create(user=user, name='Transport')
-            Category.objects.create(user=user, name='Bills')
-            Category.objects.create(user=user, name='Entertainment')
-            Category.objects.create(user=user, name='Other')
+            categories.create_defaults(user)
 
             login(request, user)
             messages.success(request, 'Registration successful. You are now logged in.')
@@ -78,6 +82,27 @@ def logout_view(request):
     return redirect('login')
 
 
+def _is_htmx(request):
+    return request.headers.get('HX-Request') == 'true'
+
+
+def _mutation_response(request, expense=None, created=False):
+    """
+    What an HTMX add / edit / delete returns instead of redirecting to the
+    whole dashboard: the changed row (none after a delete), swapped in by the
+    page, plus out-of-band updates of the flash messages and budget status.
+    """
+    context = {'expense': expense, 'created': created, 'budgets': budgets.current_budgets(request.user)}
+    return render(request, 'expenses/partials/expense_mutation.html', context)
+
+
+def _retarget(response, target, swap):
+    """Makes HTMX swap a response (e.g. a form with errors) somewhere other than the request's target."""
+    response['HX-Retarget'] = target
+    response['HX-Reswap'] = swap
+    return response
+
+
 @login_required
 def dashboard(request):
     """
@@ -90,18 +115,82 @@ def dashboard(request):
             expense.user = request.user
             expense.save()
             messages.success(request, 'Expense added successfully!')
+            if _is_htmx(request):
+                return _mutation_response(request, expense, created=True)
             return redirect('dashboard')
+        if _is_htmx(request):
+            response = render(request, 'expenses/partials/expense_form.html', {'form': form})
+            return _retarget(response, '#add-expense-form', 'outerHTML')
     else:
         form = ExpenseForm(user=request.user)
 
-    expenses = Expense.objects.filter(user=request.user).order_by('-date')
+    page_size = get_page_size(request.GET.get('page_size'))
+    expenses, next_cursor = paginate_expenses(
+        Expense.objects.filter(user=request.user), page_size=page_size
+    )
     
     context = {
         'form': form,
         'expenses': expenses,
+        'next_cursor': next_cursor,
+        'page_size': page_size,
+        'budgets': budgets.current_budgets(request.user),
+        'bulk_form': BulkActionForm(user=request.user),
     }
     return render(request, 'expenses/dashboard.html', context)
 
+
+@login_required
+def expense_rows(request):
+    """Returns the next page of expense table rows for the dashboard's "load more" button."""
+    cursor = request.GET.get('cursor')
+    page_size = get_page_size(request.GET.get('page_size'))
+    expenses, next_cursor = paginate_expenses(
+        Expense.objects.filter(user=request.user), cursor=cursor, page_size=page_size
+    )
+    context = {
+        'expenses': expenses,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+        'page_size': page_size,
+    }
+    return render(request, 'expenses/partials/expense_rows.html', context)
+
+@login_required
+def search_view(request):
+    """Full-text search over the user's expense descriptions, filtered by category and date."""
+    form = SearchForm(request.GET)
+    query = request.GET.get('q', '').strip()
+    page_size = get_page_size(request.GET.get('page_size'))
+    try:
+        page = min(max(1, int(request.GET.get('page', 1))), search.MAX_PAGE)
+    except (ValueError, TypeError):
+        page = 1
+    category_id = None
+    expenses, has_next = [], False
+    if form.is_valid():
+        category_id = form.cleaned_data['category']
+        expenses, has_next = search.search_expenses(
+            request.user, query, category_id=category_id, date_filter=form.date_filter(), page=page, page_size=page_size
+        )
+    params = request.GET.copy()
+    params.pop('page', None)
+    context = {
+        'form': form,
+        'query': query,
+        'expenses': expenses,
+        'categories': categories.user_categories(request.user.id),
+        'category_id': category_id,
+        'start': request.GET.get('start', ''),
+        'end': request.GET.get('end', ''),
+        'page': page,
+        'has_next': has_next,
+        'base_query': params.urlencode(),
+        'bulk_form': BulkActionForm(user=request.user),
+    }
+    return render(request, 'expenses/search.html', context)
+
+
 @login_required
 def edit_expense(request, expense_id):
     """Handles editing an existing expense."""
@@ -111,7 +200,13 @@ def edit_expense(request, expense_id):
         if form.is_valid():
             form.save()
             messages.success(request, 'Expense updated successfully!')
+            if _is_htmx(request):
+                return _mutation_response(request, expense)
             return redirect('dashboard')
+        if _is_htmx(request):
+            # Keep the modal open with the errors rather than replacing the row
+            response = render(request, 'expenses/edit_expense.html', {'form': form, 'expense': expense})
+            return _retarget(response, '#modal-content-target', 'innerHTML')
     else:
         form = ExpenseForm(instance=expense, user=request.user)
     
@@ -125,40 +220,147 @@ def delete_expense(request, expense_id):
     if request.method == 'POST':
         expense.delete()
         messages.success(request, 'Expense deleted successfully!')
+        if _is_htmx(request):
+            return _mutation_response(request)
         return redirect('dashboard')
     return redirect('dashboard')
 
 
 @login_required
-def report_view(request):
-    """
-    Displays a report of expenses, filterable by month and year.
-    """
-    today = timezone.now().date()
-    
-    try:
-        selected_year = int(request.GET.get('year', today.year))
-        selected_month = int(request.GET.get('month', today.month))
-    except (ValueError, TypeError):
-        selected_year = today.year
-        selected_month = today.month
+def bulk_expenses(request):
+    """Recategorises, re-dates or deletes the selected expenses, or all those matching the search filters."""
+    if request.method == 'POST':
+        form = BulkActionForm(request.POST, user=request.user)
+        if form.is_valid():
+            action, selection = form.cleaned_data['action'], form.selection(request.user)
+            try:
+                if action == bulk.RECATEGORISE:
+                    category = form.cleaned_data['category']
+                    count = bulk.recategorise(request.user, selection, category)
+                    messages.success(request, f"{count} expense(s) moved to {category.name}.")
+                elif action == bulk.CHANGE_DATE:
+                    count = bulk.change_date(request.user, selection, form.cleaned_data['date'])
+                    messages.success(request, f"{count} expense(s) moved to {form.cleaned_data['date']:%Y-%m-%d}.")
+                else:
+                    count = bulk.delete(request.user, selection)
+                    messages.success(request, f"{count} expense(s) deleted.")
+            except ValueError as e:
+                messages.error(request, str(e))
+        else:
+            errors = [error for field_errors in form.errors.values() for error in field_errors]
+            messages.error(request, ' '.join(errors))
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('dashboard')
+
+
+@login_required
+def budgets_view(request):
+    """Lists the user's monthly budgets and sets or removes one per category."""
+    if request.method == 'POST':
+        form = BudgetForm(request.POST, user=request.user)
+        if form.is_valid():
+            category, amount = form.cleaned_data['category'], form.cleaned_data['amount']
+            if amount:
+                budgets.set_budget(request.user, category, amount)
+                messages.success(request, f"Budget for {category.name} set to ₹{amount:.2f} a month.")
+            else:
+                Budget.objects.filter(category=category).delete()
+                messages.info(request, f"Budget for {category.name} removed.")
+            return redirect('budgets')
+    else:
+        form = BudgetForm(user=request.user)
+    return render(request, 'expenses/budgets.html', {'form': form, 'budgets': budgets.current_budgets(request.user)})
 
-    expenses_for_period = Expense.objects.filter(
-        user=request.user,
-        date__year=selected_year,
-        date__month=selected_month
+
+@login_required
+def categories_view(request):
+    """Lists the user's categories with their number of expenses and adds new ones."""
+    if request.method == 'POST':
+        form = CategoryForm(request.POST, user=request.user, instance=Category(user=request.user))
+        if form.is_valid():
+            category = form.save()
+            messages.success(request, f"Category {category.name} added.")
+            return redirect('categories')
+    else:
+        form = CategoryForm(user=request.user)
+    counts = dict(
+        Expense.objects.filter(user=request.user).order_by().values('category_id')
+        .annotate(count=Count('id')).values_list('category_id', 'count')
     )
+    rows = [(id, name, counts.get(id, 0)) for id, name in categories.user_categories(request.user.id)]
+    return render(request, 'expenses/categories.html', {'form': form, 'categories': rows})
+
+
+@login_required
+def rename_category(request, category_id):
+    """Renames one of the user's categories."""
+    category = get_object_or_404(Category, id=category_id, user=request.user)
+    if request.method == 'POST':
+        old_name = category.name
+        form = CategoryForm(request.POST, user=request.user, instance=category)
+        if form.is_valid():
+            form.save()
+            messages.success(request, f"Category {old_name} renamed to {category.name}.")
+        else:
+            messages.error(request, ' '.join(form.errors['name']))
+    return redirect('categories')
+
+
+@login_required
+def delete_category(request, category_id):
+    """Deletes one of the user's categories together with its expenses."""
+    category = get_object_or_404(Category, id=category_id, user=request.user)
+    if request.method == 'POST':
+        with transaction.atomic():
+            # One DELETE for the expenses instead of a per-row cascade with signals
+            count = bulk.delete(request.user, bulk.select(request.user, category_id=category.id))
+            category.delete()
+        messages.success(request, f"Category {category.name} and its {count} expense(s) deleted.")
+    return redirect('categories')
 
-    total_expenses = expenses_for_period.aggregate(Sum('amount'))['amount__sum'] or 0
-    category_summary = expenses_for_period.values('category__name').annotate(total=Sum('amount')).order_by('-total')
 
-    chart_labels = [item['category__name'] for item in category_summary]
-    chart_data = [float(item['total']) for item in category_summary]
+@async_login_required
+async def report_view(request):
+    """
+    Displays a report of expenses, filterable by month and year.
+    """
+    today = timezone.now().date()
+    period = resolve_period(request.GET, today)
+    selected_year, selected_month = period.year, period.month
 
-    expense_dates = Expense.objects.filter(user=request.user).dates('date', 'year', order='DESC')
-    available_years = [d.year for d in expense_dates]
+    report = await sync_to_async(reportcache.get_report)(request.user, period)
+    available_years = report['available_years']
     if not available_years or today.year not in available_years:
         available_years.insert(0, today.year)
+
+    # A job queued from this page (email / Drive upload) whose status the page polls
+    job = None
+    try:
+        job_id = int(request.GET.get('job', ''))
+    except ValueError:
+        job_id = None
+    # Anything that is not an id a query can bind is ignored
+    if job_id is not None and 0 < job_id <= MAX_ID:
+        job = await Job.objects.filter(id=job_id, user=request.user).afirst()
+    digest_active = await DigestSubscription.objects.filter(user=request.user, is_active=True).aexists()
+
+    # Let the browser revalidate cheaply unless the page carries one-off content
+    etag = None
+    last_modified = int(reportcache.last_modified(report['version']).timestamp())
+    has_messages = await sync_to_async(lambda: bool(len(messages.get_messages(request))))()
+    if job is None and not has_messages:
+        data_version = await sync_to_async(reportcache.data_version)(request.user.id)
+        etag = quote_etag(hashlib.md5(repr((
+            # The insights use the whole history and, for the forecast, today's date
+            request.user.id, period.start, report['version'], data_version,
+            today, digest_active, request.META.get('CSRF_COOKIE'),
+        )).encode()).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
     
     month_name = datetime(selected_year, selected_month, 1).strftime('%B')
     
@@ -170,151 +372,183 @@ def report_view(request):
     ]
 
     context = {
-        'total_expenses': total_expenses,
-        'category_summary': category_summary,
+        'digest_active': digest_active,
+        'job': job,
+        'total_expenses': report['total_expenses'],
+        'category_summary': report['category_summary'],
         'current_month': f"{month_name} {selected_year}",
-        'chart_labels': json.dumps(chart_labels),
-        'chart_data': json.dumps(chart_data),
+        'chart_labels': report['chart_labels'],
+        'chart_data': report['chart_data'],
         'available_years': available_years,
         'months': months,
         'selected_year': selected_year,
         'selected_month': selected_month,
+        'insights': await sync_to_async(analytics.insights)(request.user, period, today),
+        'columnar_export': columnar.pyarrow_available(),
     }
-    return render(request, 'expenses/report.html', context)
+    # Rendering reads the messages, which may be stored in the session
+    response = await sync_to_async(render)(request, 'expenses/report.html', context)
+    if etag:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Cached copies are per user and must always be revalidated
+        response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
-@login_required
-def email_report(request):
-    """Prepares and sends the expense report via email."""
+@async_login_required
+async def email_report(request):
+    """Queues the expense report email for the worker and returns straight away."""
     user = request.user
     if not user.email:
         messages.error(request, "Your profile doesn't have an email address configured.")
         return redirect('report')
 
-    today = timezone.now().date()
-    
+    period = resolve_period(request.GET)
+    job = await jobs.aenqueue('email_report', user, {'year': period.year, 'month': period.month})
+    messages.info(request, f"Your expense report is being sent to {user.email}.")
+    return redirect(f"{reverse('report')}?year={period.year}&month={period.month}&job={job.id}")
+
+
+@login_required
+def toggle_digest(request):
+    """Subscribes the user to (or unsubscribes them from) the monthly report email."""
+    if request.method == 'POST':
+        subscription, created = DigestSubscription.objects.get_or_create(user=request.user)
+        if not created:
+            subscription.is_active = not subscription.is_active
+            subscription.save(update_fields=['is_active'])
+        if subscription.is_active:
+            messages.success(request, "You will receive your expense report by email every month.")
+        else:
+            messages.info(request, "You will no longer receive monthly report emails.")
+    return redirect('report')
+
+
+@login_required
+def job_status(request, job_id):
+    """Returns the status fragment for a background job; it keeps polling until the job finishes."""
+    job = get_object_or_404(Job, id=job_id, user=request.user)
+    return render(request, 'expenses/partials/job_status.html', {'job': job})
+
+
+def _int_param(params, name, default, maximum):
+    """Reads a positive integer parameter, clamped to `maximum`, falling back to `default`."""
     try:
-        year = int(request.GET.get('year', today.year))
-        month = int(request.GET.get('month', today.month))
-    except (ValueError, TypeError):
-        year = today.year
-        month = today.month
+        value = int(params.get(name) or default)
+    except ValueError:
+        value = default
+    return max(1, min(value, maximum))
 
-    expenses = Expense.objects.filter(user=user, date__year=year, date__month=month)
-    total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-    category_summary = expenses.values('category__name').annotate(total=Sum('amount')).order_by('-total')
-    
-    month_name = datetime(year, month, 1).strftime('%B %Y')
 
-    email_context = {
-        'user': user,
-        'category_summary': category_summary,
-        'total_expenses': total_expenses,
-        'report_month': month_name,
+@login_required
+def trends_view(request):
+    """Shows per-category spending over the last N months or years with deltas and rolling averages."""
+    granularity = trends.YEAR if request.GET.get('granularity') == trends.YEAR else trends.MONTH
+    count = _int_param(request.GET, 'count', trends.DEFAULT_COUNT[granularity], trends.MAX_COUNT[granularity])
+    window = _int_param(request.GET, 'window', trends.DEFAULT_WINDOW, count)
+
+    report = trends.trend_report(request.user, granularity, count, window)
+    chart = {
+        'labels': report['labels'],
+        'categories': [{'name': c['name'], 'data': [float(v) for v in c['series']]} for c in report['categories']],
+        'rolling': [float(period['rolling']) for period in report['totals']],
     }
-    
-    html_message = render_to_string('expenses/email/report_email.html', email_context)
-    plain_message = strip_tags(html_message)
-    subject = f'Your Expense Report for {month_name}'
-    
-    try:
-        send_mail(
-            subject,
-            plain_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        messages.success(request, f"Your expense report for {month_name} has been sent to {user.email}.")
-    except Exception as e:
-        messages.error(request, f"An error occurred while sending the email: {e}")
+    context = {
+        **report,
+        'chart': chart,
+        'granularity': granularity,
+        'count': count,
+        'window': window,
+        'count_choices': [3, 6, 12, 24, 60, 120] if granularity == trends.MONTH else [2, 3, 5, 10],
+    }
+    return render(request, 'expenses/trends.html', context)
+
 
-    return redirect(f"{reverse('report')}?year={year}&month={month}")
+@async_login_required
+async def export_csv(request):
+    """Streams the user's expenses for a month, a date range or all time as a CSV file."""
+    date_range = resolve_range(request.GET)
+    expenses = Expense.objects.filter(user=request.user, **range_filter(date_range))
+
+    if isinstance(request, ASGIRequest):
+        content = exports.astream_csv(exports.aexpense_rows(expenses))
+    else:
+        # A WSGI server would consume an async iterator whole before sending anything
+        content = exports.stream_csv(exports.expense_rows(expenses))
+    response = StreamingHttpResponse(content, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="expense_report_{date_range.label}.csv"'
+    return response
 
 
 @login_required
-def export_csv(request):
-    today = timezone.now().date()
-    try:
-        year = int(request.GET.get('year', today.year))
-        month = int(request.GET.get('month', today.month))
-    except (ValueError, TypeError):
-        year = today.year
-        month = today.month
-    
-    expenses = Expense.objects.filter(user=request.user, date__year=year, date__month=month)
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="expense_report_{year}-{month:02d}.csv"'
+def export_columnar(request, fmt):
+    """
+    Streams expenses as Parquet or Arrow for analytics tools, with the same
+    range parameters as the CSV export. Staff can export every user's
+    expenses with scope=all.
+    """
+    if fmt not in columnar.FORMATS:
+        raise Http404("Unknown export format.")
+    if not columnar.pyarrow_available():
+        messages.error(request, "Parquet and Arrow exports need pyarrow installed on the server.")
+        return redirect('report')
 
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Description', 'Category', 'Amount'])
-    for expense in expenses:
-        writer.writerow([expense.date, expense.description, expense.category.name, expense.amount])
-    return response
+    date_range = resolve_range(request.GET)
+    expenses = Expense.objects.filter(**range_filter(date_range))
+    label = date_range.label
+    if request.GET.get('scope') == 'all':
+        if not request.user.is_staff:
+            raise PermissionDenied
+        label += '_all_users'
+    else:
+        expenses = expenses.filter(user=request.user)
 
+    options = columnar.FORMATS[fmt]
+    response = StreamingHttpResponse(columnar.stream(expenses, fmt), content_type=options['content_type'])
+    response['Content-Disposition'] = f'attachment; filename="expense_report_{label}.{options["extension"]}"'
+    return response
 
-# --- Google Drive Integration ---
-SCOPES = ['https://www.googleapis.com/auth/drive.file']
-os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 @login_required
-def upload_to_drive(request):
-    creds = None
-    # ... (rest of the Google Drive code is unchanged)
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            with open('token.json', 'w') as token:
-                token.write(creds.to_json())
+def import_expenses(request):
+    """Imports expenses from an uploaded CSV (same columns as the export) or OFX file."""
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, "Please choose a CSV or OFX file to import.")
         else:
-            return redirect('authorize_drive')
-
-    try:
-        service = build('drive', 'v3', credentials=creds)
-        
-        today = timezone.now().date()
-        try:
-            year = int(request.GET.get('year', today.year))
-            month = int(request.GET.get('month', today.month))
-        except(ValueError, TypeError):
-            year = today.year
-            month = today.month
-            
-        expenses = Expense.objects.filter(user=request.user, date__year=year, date__month=month)
-
-        csv_buffer = io.StringIO()
-        writer = csv.writer(csv_buffer)
-        writer.writerow(['Date', 'Description', 'Category', 'Amount'])
-        for expense in expenses:
-            writer.writerow([expense.date, expense.description, expense.category.name, expense.amount])
-        
-        csv_buffer.seek(0)
+            try:
+                result = imports.import_expenses(
+                    request.user, upload, name=upload.name,
+                    create_categories=bool(request.POST.get('create_categories')),
+                )
+            except ValueError as e:
+                messages.error(request, f"Could not read the file: {e}")
+            else:
+                messages.success(request, f"Imported {result.created} expenses.")
+    return render(request, 'expenses/import.html', {'result': result})
 
-        file_name = f'expense_report_{year}-{month:02d}.csv'
-        file_metadata = {'name': file_name}
-        media = MediaIoBaseUpload(io.BytesIO(csv_buffer.getvalue().encode()), mimetype='text/csv')
 
-        file = service.files().create(body=file_metadata, media_body=media, fields='id,name').execute()
-        
-        messages.success(request, f"Successfully uploaded '{file.get('name')}' to your Google Drive.")
+# --- Google Drive Integration ---
+# The Google client libraries are only imported inside expenses.drive when needed
 
-    except Exception as e:
-        messages.error(request, f"An error occurred: {e}")
+@async_login_required
+async def upload_to_drive(request):
+    """Queues an upload of the month's CSV export to Google Drive."""
+    if not drive.is_authorized():
+        return redirect('authorize_drive')
 
-    return redirect(f"{reverse('report')}?year={year}&month={month}")
+    period = resolve_period(request.GET)
+    job = await jobs.aenqueue('drive_upload', request.user, {'year': period.year, 'month': period.month})
+    messages.info(request, "Your upload to Google Drive has been queued.")
+    return redirect(f"{reverse('report')}?year={period.year}&month={period.month}&job={job.id}")
 
 
 @login_required
 def authorize_drive(request):
-    flow = InstalledAppFlow.from_client_secrets_file(
-        'client_secret.json', SCOPES,
-        redirect_uri=request.build_absolute_uri(reverse('oauth2callback'))
-    )
+    flow = drive.authorization_flow(request.build_absolute_uri(reverse('oauth2callback')))
     authorization_url, state = flow.authorization_url(
         access_type='offline',
         prompt='consent'
@@ -326,19 +560,12 @@ def authorize_drive(request):
 @login_required
 def oauth2callback(request):
     state = request.session['google_oauth_state']
-    flow = InstalledAppFlow.from_client_secrets_file(
-        'client_secret.json', SCOPES, state=state,
-        redirect_uri=request.build_absolute_uri(reverse('oauth2callback'))
-    )
+    flow = drive.authorization_flow(request.build_absolute_uri(reverse('oauth2callback')), state=state)
     
     authorization_response = request.build_absolute_uri()
     flow.fetch_token(authorization_response=authorization_response)
-
-    credentials = flow.credentials
-    with open('token.json', 'w') as token:
-        token.write(credentials.to_json())
+    drive.save_credentials(flow.credentials)
 
     # After getting token, we need to pass the original filters back to the upload function
     # For now, we'll just redirect to the general upload, which will use the current month/year
     return redirect('upload_to_drive')
-